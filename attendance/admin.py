@@ -1,8 +1,19 @@
 from django.contrib import admin
-from .models import AttendanceRecord
+from .models import AttendanceRecord, AttendanceSummary, CheckIn
 
 @admin.register(AttendanceRecord)
 class AttendanceRecordAdmin(admin.ModelAdmin):
     list_display = ('student', 'date', 'batch', 'status')
     list_filter = ('date', 'batch', 'status')
     search_fields = ('student__username', 'student__first_name', 'student__last_name')
+
+@admin.register(AttendanceSummary)
+class AttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'batch', 'month', 'present', 'absent')
+    list_filter = ('month', 'batch')
+    search_fields = ('student__username', 'student__first_name', 'student__last_name')
+
+@admin.register(CheckIn)
+class CheckInAdmin(admin.ModelAdmin):
+    list_display = ('student', 'date', 'batch', 'created_at')
+    list_filter = ('date', 'batch')
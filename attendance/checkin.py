@@ -0,0 +1,147 @@
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .marking import record_attendance
+from .models import CheckIn
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_SALT = 'attendance.checkin'
+ROSTER_CACHE_KEY = 'attendance:checkin-roster:{batch_id}'
+SEEN_CACHE_KEY = 'attendance:checkin-seen:{date}:{student_id}'
+FLUSH_CHUNK_SIZE = 2000
+
+
+class CheckInError(ValueError):
+    """
+    A check-in that can't be accepted; the message is shown to the student.
+    """
+
+
+def _window(now=None):
+    return int((now or time.time()) // settings.ATTENDANCE_CHECKIN_TOKEN_SECONDS)
+
+
+def _signature(batch_id, window):
+    return salted_hmac(CHECKIN_SALT, f'{batch_id}.{window}').hexdigest()[:20]
+
+
+def make_checkin_token(batch_id, now=None):
+    """
+    Token for the batch's QR code in the current time window
+    (ATTENDANCE_CHECKIN_TOKEN_SECONDS long).
+    """
+    window = _window(now)
+    return f'{batch_id}.{window}.{_signature(batch_id, window)}'
+
+
+def read_checkin_token(token, now=None):
+    """
+    Return the batch id of a token signed for the current or previous window.
+    Pure HMAC check, no database or cache access.
+    """
+    try:
+        batch_id, window, signature = token.split('.')
+        batch_id, window = int(batch_id), int(window)
+    except (AttributeError, ValueError):
+        raise CheckInError('This is not a valid check-in code.')
+    if not constant_time_compare(signature, _signature(batch_id, window)):
+        raise CheckInError('This is not a valid check-in code.')
+    if window not in (_window(now), _window(now) - 1):
+        raise CheckInError('This check-in code has expired. Scan the code on the screen again.')
+    return batch_id
+
+
+def _roster(batch_id, refresh=False):
+    """
+    User ids of the batch's students, cached so a burst of check-ins costs
+    one query per process.
+    """
+    key = ROSTER_CACHE_KEY.format(batch_id=batch_id)
+    roster = None if refresh else cache.get(key)
+    if roster is None:
+        from students.models import StudentProfile
+        roster = set(StudentProfile.objects.filter(batch_id=batch_id).values_list('user_id', flat=True))
+        cache.set(key, roster, timeout=settings.ATTENDANCE_CHECKIN_ROSTER_CACHE_SECONDS)
+    return roster
+
+
+def record_check_in(student_id, token, now=None):
+    """
+    Buffer a student's check-in from a scanned token: one INSERT into CheckIn,
+    no read of the attendance tables. Repeat scans on the same day are
+    answered from the cache. Returns False if the student had already
+    checked in today.
+    """
+    batch_id = read_checkin_token(token, now)
+    # Re-read a cached roster once before turning away a newly enrolled student
+    if student_id not in _roster(batch_id) and student_id not in _roster(batch_id, refresh=True):
+        raise CheckInError('You are not enrolled in this batch.')
+    date = timezone.localdate()
+    seen_key = SEEN_CACHE_KEY.format(date=date, student_id=student_id)
+    if not cache.add(seen_key, batch_id, timeout=86400):
+        return False
+    try:
+        CheckIn.objects.bulk_create(
+            [CheckIn(batch_id=batch_id, student_id=student_id, date=date)], ignore_conflicts=True
+        )
+    except Exception:
+        # Let the student scan again
+        cache.delete(seen_key)
+        raise
+    return True
+
+
+def flush_check_ins(batch_id=None):
+    """
+    Move buffered check-ins into AttendanceRecord as PRESENT, with one
+    record_attendance bulk upsert per (batch, date). Students who left the
+    batch since scanning are dropped. Returns the number of check-ins flushed.
+
+    Each chunk is claimed with SKIP LOCKED inside its transaction, so the
+    worker and a teacher closing check-in never write the same rows twice.
+    """
+    from batches.models import Batch
+    from students.models import StudentProfile
+
+    pending = CheckIn.objects.order_by('pk')
+    if batch_id is not None:
+        pending = pending.filter(batch_id=batch_id)
+    flushed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                pending.select_for_update(skip_locked=True)
+                .values_list('pk', 'batch_id', 'date', 'student_id')[:FLUSH_CHUNK_SIZE]
+            )
+            if not rows:
+                break
+            groups = defaultdict(set)
+            for _, row_batch_id, date, student_id in rows:
+                groups[(row_batch_id, date)].add(student_id)
+            batches = Batch.objects.in_bulk({key[0] for key in groups})
+            members = set(StudentProfile.objects.filter(
+                batch_id__in=batches, user_id__in={row[3] for row in rows}
+            ).values_list('batch_id', 'user_id'))
+
+            # Same batch order in every flusher, so their batch locks can't deadlock
+            for (row_batch_id, date), student_ids in sorted(groups.items()):
+                statuses = {
+                    student_id: 'PRESENT'
+                    for student_id in student_ids if (row_batch_id, student_id) in members
+                }
+                if row_batch_id in batches and statuses:
+                    record_attendance(batches[row_batch_id], date, statuses)
+            CheckIn.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        flushed += len(rows)
+
+    if flushed:
+        logger.info(f"Flushed {flushed} attendance check-ins.")
+    return flushed
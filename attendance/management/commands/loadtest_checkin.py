@@ -0,0 +1,92 @@
+import secrets
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from attendance.checkin import flush_check_ins, make_checkin_token
+from attendance.models import AttendanceRecord
+from batches.models import Batch
+from core.models import User
+from students.models import StudentProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a class checking in through the QR flow at once: concurrent POSTs to the '
+        'check-in endpoint, then one flush. Synthetic users and records are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=300, help='Students scanning the code')
+        parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous requests')
+
+    def handle(self, *args, **options):
+        prefix = f'checkin-load-{secrets.token_hex(4)}'
+        batch = Batch.objects.create(name=prefix, start_date=date.today())
+        try:
+            self._run(batch, prefix, options['students'], options['concurrency'])
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+            batch.delete()
+
+    def _run(self, batch, prefix, students, concurrency):
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}-{i}', is_student=True) for i in range(students)], batch_size=1000
+        )
+        StudentProfile.objects.bulk_create([StudentProfile(user=user, batch=batch) for user in users], batch_size=1000)
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        url = reverse('attendance_check_in')
+        token = make_checkin_token(batch.pk)
+        query_counts = []
+
+        def scan(client):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.post(url, {'t': token})
+                elapsed = time.perf_counter() - started
+            query_counts.append(len(queries))
+            return response.status_code, elapsed
+
+        self.stdout.write(f'{students} students checking in, {concurrency} at a time...')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(scan, clients))
+        wall = time.perf_counter() - started
+        connections.close_all()
+
+        latencies = sorted(elapsed for _, elapsed in results)
+        failures = sum(1 for status, _ in results if status != 200)
+        self.stdout.write(
+            f'burst: {students / wall:.0f} req/s over {wall:.2f}s, '
+            f'p50 {statistics.median(latencies) * 1000:.1f} ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, '
+            f'max {latencies[-1] * 1000:.1f} ms, '
+            f'{max(query_counts)} queries/request max, {failures} failed'
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            flushed = flush_check_ins(batch_id=batch.pk)
+            elapsed = time.perf_counter() - started
+        recorded = AttendanceRecord.objects.filter(
+            batch=batch, date=timezone.localdate(), status='PRESENT'
+        ).count()
+        self.stdout.write(f'flush: {flushed} check-ins in {elapsed * 1000:.1f} ms / {len(queries)} queries')
+
+        if failures or recorded != students:
+            self.stdout.write(self.style.ERROR(f'{recorded} of {students} students recorded present'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {students} students recorded present.'))
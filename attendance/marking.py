@@ -0,0 +1,54 @@
+from django.db import transaction
+
+from batches.models import Batch
+
+from .models import AttendanceRecord
+from .signals import attendance_marked
+
+VALID_STATUSES = {choice for choice, _ in AttendanceRecord.STATUS_CHOICES}
+
+
+def record_attendance(batch, date, statuses):
+    """
+    Save a batch's attendance for one day with a single bulk upsert.
+    `statuses` maps student (user) id -> 'PRESENT' / 'ABSENT'; unknown values
+    are skipped. Status changes are worked out in memory against one read of
+    the day's existing records and announced through `attendance_marked`.
+    Writers for the same batch (mark form, offline sync, check-in flush) are
+    serialized on the batch row, so two of them never both see a record as new.
+    Returns {student_id: (old_status, new_status)} for the records that changed.
+    """
+    date = AttendanceRecord._meta.get_field('date').to_python(date)
+    statuses = {student_id: status for student_id, status in statuses.items() if status in VALID_STATUSES}
+    if not statuses:
+        return {}
+
+    with transaction.atomic():
+        Batch.objects.select_for_update().filter(pk=batch.pk).values_list('pk', flat=True).first()
+        existing = {}
+        previous_batches = {}
+        for student_id, status, batch_id in AttendanceRecord.objects.filter(
+            date=date, student_id__in=statuses
+        ).values_list('student_id', 'status', 'batch_id'):
+            existing[student_id] = status
+            if batch_id != batch.pk:
+                previous_batches[student_id] = batch_id
+        AttendanceRecord.objects.bulk_create(
+            [
+                AttendanceRecord(date=date, batch=batch, student_id=student_id, status=status)
+                for student_id, status in statuses.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['date', 'student'],
+            update_fields=['status', 'batch'],
+        )
+        changes = {
+            student_id: (existing.get(student_id), status)
+            for student_id, status in statuses.items()
+            if existing.get(student_id) != status or student_id in previous_batches
+        }
+        if changes:
+            attendance_marked.send(
+                sender=AttendanceRecord, batch=batch, date=date, changes=changes, previous_batches=previous_batches
+            )
+    return changes
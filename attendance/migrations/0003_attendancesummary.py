@@ -0,0 +1,50 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+
+def populate_summaries(apps, schema_editor):
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    AttendanceSummary = apps.get_model('attendance', 'AttendanceSummary')
+
+    rows = [
+        AttendanceSummary(student_id=row['student_id'], batch_id=row['batch_id'], month=row['month'],
+                          present=row['present'], absent=row['absent'])
+        for row in AttendanceRecord.objects.annotate(month=TruncMonth('date'))
+        .values('student_id', 'batch_id', 'month')
+        .annotate(present=Count('id', filter=Q(status='PRESENT')), absent=Count('id', filter=Q(status='ABSENT')))
+        .order_by()
+    ]
+    AttendanceSummary.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_initial'),
+        ('batches', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('present', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='batches.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['batch', 'month'], name='attendancesummary_batch_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'batch', 'month'), name='attendancesummary_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -14,5 +14,82 @@ class AttendanceRecord(models.Model):
     class Meta:
         unique_together = ('date', 'student')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so signals can tell real changes from resubmissions,
+        # and the stored (date, batch, status) so summaries can move an edited record's count
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_summary_key = (
+            instance.__dict__.get('date'), instance.__dict__.get('batch_id'), instance.__dict__.get('status')
+        )
+        return instance
+
     def __str__(self):
         return f"{self.student.username} - {self.date} - {self.status}"
+
+
+class AttendanceSummary(models.Model):
+    """
+    Present/absent counts per student, batch and month, maintained by
+    attendance.summaries on every record write.
+    """
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='attendance_summaries')
+    batch = models.ForeignKey('batches.Batch', on_delete=models.CASCADE, related_name='attendance_summaries')
+    month = models.DateField(help_text='First day of the month')
+    present = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'batch', 'month'], name='attendancesummary_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['batch', 'month'], name='attendancesummary_batch_idx'),
+        ]
+
+    @property
+    def total(self):
+        return self.present + self.absent
+
+    @property
+    def percentage(self):
+        return round(self.present * 100 / self.total) if self.total else None
+
+    def __str__(self):
+        return f"{self.student.username} - {self.month:%b %Y} - {self.present}/{self.total}"
+
+
+class CheckIn(models.Model):
+    """
+    Append-only buffer of QR self check-ins. The check-in endpoint only
+    inserts here; attendance.checkin.flush_check_ins turns the rows into
+    PRESENT records with one bulk upsert per batch and day, then deletes them.
+    """
+    batch = models.ForeignKey('batches.Batch', on_delete=models.CASCADE, related_name='check_ins')
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='check_ins')
+    date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'date'], name='checkin_student_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.date} - {self.batch.name}"
+
+
+class AttendanceSubmission(models.Model):
+    """
+    Client-generated key of every synced attendance submission, so an
+    offline queue can be replayed any number of times and apply once.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    batch = models.ForeignKey('batches.Batch', on_delete=models.CASCADE, related_name='attendance_submissions')
+    date = models.DateField()
+    submitted_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key} - {self.batch.name} - {self.date}"
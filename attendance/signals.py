@@ -0,0 +1,39 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import AttendanceRecord
+from .summaries import apply_summary_deltas, summary_deltas
+
+# Sent by attendance.marking.record_attendance after a bulk upsert, which fires
+# no post_save. Arguments: batch, date, changes ({student_id: (old_status, new_status)},
+# old_status None for new records) and previous_batches ({student_id: old batch id}
+# for records that moved batch). Sent inside the marking transaction.
+attendance_marked = Signal()
+
+# --- ATTENDANCE SUMMARIES ---
+
+@receiver(post_save, sender=AttendanceRecord)
+def update_summary_on_record_save(sender, instance, **kwargs):
+    date = AttendanceRecord._meta.get_field('date').to_python(instance.date)
+    new = (date, instance.batch_id, instance.status)
+    old = getattr(instance, '_loaded_summary_key', None)
+    if old != new:
+        apply_summary_deltas(summary_deltas([(instance.student_id, old, new)]))
+    instance._loaded_summary_key = new
+
+@receiver(post_delete, sender=AttendanceRecord)
+def update_summary_on_record_delete(sender, instance, **kwargs):
+    old = getattr(instance, '_loaded_summary_key', None) or (instance.date, instance.batch_id, instance.status)
+    apply_summary_deltas(summary_deltas([(instance.student_id, old, None)]))
+
+@receiver(attendance_marked)
+def update_summaries_on_bulk_mark(sender, batch, date, changes, previous_batches=None, **kwargs):
+    previous_batches = previous_batches or {}
+    apply_summary_deltas(summary_deltas(
+        (
+            student_id,
+            (date, previous_batches.get(student_id, batch.pk), old_status) if old_status else None,
+            (date, batch.pk, new_status),
+        )
+        for student_id, (old_status, new_status) in changes.items()
+    ))
@@ -0,0 +1,118 @@
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf, TruncMonth
+
+from .models import AttendanceRecord, AttendanceSummary
+
+logger = logging.getLogger(__name__)
+
+
+def _delta(status):
+    return (1, 0) if status == 'PRESENT' else (0, 1)
+
+
+def summary_deltas(moves):
+    """
+    Turn record moves into per-summary count changes.
+    `moves` is an iterable of (student_id, old, new) where old/new are
+    (date, batch_id, status) tuples, or None for a created/deleted record.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for student_id, old, new in moves:
+        for values, sign in ((old, -1), (new, 1)):
+            if values is None:
+                continue
+            date, batch_id, status = values
+            present, absent = _delta(status)
+            delta = deltas[(student_id, batch_id, date.replace(day=1))]
+            delta[0] += sign * present
+            delta[1] += sign * absent
+    return {key: tuple(delta) for key, delta in deltas.items() if any(delta)}
+
+
+def apply_summary_deltas(deltas):
+    """
+    Apply {(student_id, batch_id, month): (present, absent)} changes with F()
+    updates. Missing rows are created in one insert, then keys sharing the
+    same batch, month and change are updated together, so a whole batch's
+    submit costs a handful of queries however many students it has.
+    """
+    if not deltas:
+        return
+    new_rows = [
+        AttendanceSummary(student_id=student_id, batch_id=batch_id, month=month)
+        for (student_id, batch_id, month), (present, absent) in deltas.items()
+        if present > 0 or absent > 0
+    ]
+    groups = defaultdict(list)
+    for (student_id, batch_id, month), change in deltas.items():
+        groups[(batch_id, month, change)].append(student_id)
+
+    with transaction.atomic():
+        if new_rows:
+            AttendanceSummary.objects.bulk_create(new_rows, ignore_conflicts=True)
+        for (batch_id, month, (present, absent)), student_ids in groups.items():
+            AttendanceSummary.objects.filter(
+                batch_id=batch_id, month=month, student_id__in=student_ids
+            ).update(present=F('present') + present, absent=F('absent') + absent)
+
+
+def rebuild_attendance_summaries():
+    """
+    Recompute every summary from AttendanceRecord with one grouped query.
+    Returns the number of rows written.
+    """
+    rows = [
+        AttendanceSummary(
+            student_id=row['student_id'], batch_id=row['batch_id'], month=row['month'],
+            present=row['present'], absent=row['absent']
+        )
+        for row in AttendanceRecord.objects.annotate(month=TruncMonth('date'))
+        .values('student_id', 'batch_id', 'month')
+        .annotate(
+            present=Count('id', filter=Q(status='PRESENT')),
+            absent=Count('id', filter=Q(status='ABSENT'))
+        )
+        .order_by()
+    ]
+    with transaction.atomic():
+        AttendanceSummary.objects.all().delete()
+        AttendanceSummary.objects.bulk_create(rows, batch_size=1000)
+    logger.info(f"Rebuilt {len(rows)} attendance summaries")
+    return len(rows)
+
+
+def _with_rate(summaries):
+    return summaries.alias(total=F('present') + F('absent')).alias(
+        rate=Cast('present', FloatField()) * 100 / NullIf('total', 0)
+    )
+
+
+def attendance_totals(summaries):
+    """
+    Present/absent totals and percentage over a set of summary rows
+    (one aggregate over O(months) rows).
+    """
+    totals = summaries.aggregate(present=Sum('present'), absent=Sum('absent'))
+    present, absent = totals['present'] or 0, totals['absent'] or 0
+    return {
+        'present': present,
+        'absent': absent,
+        'percentage': round(present * 100 / (present + absent)) if present + absent else None,
+    }
+
+
+def low_attendance(month, threshold, limit=20):
+    """
+    Students whose attendance in `month` is below `threshold` percent,
+    lowest first.
+    """
+    return (
+        _with_rate(AttendanceSummary.objects.filter(month=month))
+        .filter(rate__lt=threshold)
+        .select_related('student', 'batch')
+        .order_by('rate', 'student__username')[:limit]
+    )
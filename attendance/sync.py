@@ -0,0 +1,103 @@
+import logging
+from collections import defaultdict
+from datetime import date as date_cls
+
+from django.conf import settings
+from django.db import transaction
+
+from .marking import VALID_STATUSES, record_attendance
+from .models import AttendanceSubmission
+
+logger = logging.getLogger(__name__)
+
+APPLIED = 'applied'
+DUPLICATE = 'duplicate'
+
+
+class SyncPayloadError(ValueError):
+    """
+    The request body isn't a usable sync payload (rejected as a whole).
+    """
+
+
+def _parse(submission):
+    """
+    Validate one submission dict; returns (key, batch_id, date, statuses).
+    """
+    if not isinstance(submission, dict):
+        raise ValueError('Submission must be an object')
+    key = str(submission.get('key') or '')
+    if not key or len(key) > 64:
+        raise ValueError('Missing or overlong key')
+    try:
+        batch_id = int(submission.get('batch'))
+        date = date_cls.fromisoformat(str(submission.get('date')))
+        statuses = {
+            int(student_id): status
+            for student_id, status in (submission.get('statuses') or {}).items()
+        }
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError('Invalid batch, date or statuses')
+    if not statuses or not set(statuses.values()) <= VALID_STATUSES:
+        raise ValueError('Invalid statuses')
+    return key, batch_id, date, statuses
+
+
+def apply_submissions(submissions, user):
+    """
+    Apply a queue of offline attendance submissions in one request:
+    {'key', 'batch', 'date', 'statuses': {student_id: status}} each.
+    Keys already seen are skipped, submissions for the same batch and day
+    are merged in order (later wins) and each (batch, day) is written with
+    one record_attendance bulk upsert. Students outside the batch are ignored.
+    Returns {key: 'applied' | 'duplicate' | error message}; the client drops
+    every key it gets an answer for.
+    """
+    from batches.models import Batch
+    from students.models import StudentProfile
+
+    if not isinstance(submissions, list):
+        raise SyncPayloadError('"submissions" must be a list')
+    if len(submissions) > settings.ATTENDANCE_SYNC_MAX_SUBMISSIONS:
+        raise SyncPayloadError(f'At most {settings.ATTENDANCE_SYNC_MAX_SUBMISSIONS} submissions per request')
+
+    results = {}
+    parsed = []
+    for submission in submissions:
+        try:
+            parsed.append(_parse(submission))
+        except ValueError as e:
+            key = submission.get('key') if isinstance(submission, dict) else None
+            if key:
+                results[str(key)] = str(e)
+
+    seen = set(AttendanceSubmission.objects.filter(
+        key__in=[key for key, *_ in parsed]
+    ).values_list('key', flat=True))
+    batches = Batch.objects.in_bulk({batch_id for _, batch_id, _, _ in parsed})
+    members = set(StudentProfile.objects.filter(batch_id__in=batches).values_list('batch_id', 'user_id'))
+
+    merged = defaultdict(dict)
+    new_keys = []
+    for key, batch_id, date, statuses in parsed:
+        if key in seen or key in results:
+            results.setdefault(key, DUPLICATE)
+            continue
+        if batch_id not in batches:
+            results[key] = 'Unknown batch'
+            continue
+        merged[(batch_id, date)].update(
+            (student_id, status) for student_id, status in statuses.items() if (batch_id, student_id) in members
+        )
+        new_keys.append(AttendanceSubmission(key=key, batch_id=batch_id, date=date, submitted_by=user))
+        results[key] = APPLIED
+
+    with transaction.atomic():
+        for (batch_id, date), statuses in merged.items():
+            record_attendance(batches[batch_id], date, statuses)
+        # A concurrent replay of the same key re-applies identical statuses, which changes nothing
+        AttendanceSubmission.objects.bulk_create(new_keys, ignore_conflicts=True)
+
+    if new_keys:
+        logger.info(f"Synced {len(new_keys)} offline attendance submissions for {len(merged)} batch days")
+    return results
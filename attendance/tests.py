@@ -1,3 +1,445 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from unittest import mock
+from datetime import date
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from core.models import User
+from batches.models import Batch
+from students.models import StudentProfile
+from notifications.models import NotificationOutbox
+from .checkin import flush_check_ins, make_checkin_token
+from .marking import record_attendance
+from .models import AttendanceRecord, AttendanceSubmission, AttendanceSummary, CheckIn
+from .summaries import rebuild_attendance_summaries
 
-# Create your tests here.
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class MarkAttendanceTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create(username='teacher', is_teacher=True)
+        self.client.force_login(self.teacher)
+        self.day = date(2026, 1, 5)
+
+    def _batch(self, name, size):
+        batch = Batch.objects.create(name=name, start_date=self.day)
+        for i in range(size):
+            user = User.objects.create(username=f'{name}-{i}', is_student=True)
+            StudentProfile.objects.create(user=user, batch=batch)
+        return batch
+
+    def _submit(self, batch, absent=()):
+        data = {'date': self.day.isoformat()}
+        for user_id in batch.students.values_list('user_id', flat=True):
+            data[f'status_{user_id}'] = 'ABSENT' if user_id in absent else 'PRESENT'
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('mark_attendance', args=[batch.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small = self._batch('small', 3)
+        large = self._batch('large', 40)
+
+        self.assertEqual(self._submit(small), self._submit(large))
+        self.assertEqual(AttendanceRecord.objects.filter(batch=large, date=self.day).count(), 40)
+
+    def test_resubmission_updates_status_and_alerts_new_absences_once(self):
+        batch = self._batch('b', 5)
+        absent = set(batch.students.values_list('user_id', flat=True)[:2])
+        self._submit(batch)
+        self._submit(batch, absent=absent)
+        self._submit(batch, absent=absent)
+
+        self.assertEqual(
+            set(AttendanceRecord.objects.filter(status='ABSENT').values_list('student_id', flat=True)),
+            absent
+        )
+        self.assertEqual(AttendanceRecord.objects.count(), 5)
+        # Both new absences coalesce into one queued multicast; the unchanged resubmit sends nothing
+        alerts = NotificationOutbox.objects.filter(title='Attendance Alert')
+        self.assertEqual(alerts.count(), 1)
+        self.assertEqual(set(alerts.get().target_ids), absent)
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False, ATTENDANCE_CHECKIN_TOKEN_SECONDS=30)
+class CheckInTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.batch = Batch.objects.create(name='b', start_date=date.today())
+
+    def _students(self, count, start=0):
+        users = []
+        for i in range(start, start + count):
+            user = User.objects.create(username=f'student-{i}', is_student=True)
+            StudentProfile.objects.create(user=user, batch=self.batch)
+            users.append(user)
+        return users
+
+    def _scan(self, user, token):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('attendance_check_in'), {'t': token})
+        self.assertEqual(response.status_code, 200)
+        return response.context['result'], len(queries)
+
+    def test_burst_is_buffered_then_flushed_in_one_upsert(self):
+        users = self._students(60)
+        token = make_checkin_token(self.batch.pk)
+        query_counts = []
+        for user in users:
+            result, queries = self._scan(user, token)
+            self.assertTrue(result['ok'])
+            query_counts.append(queries)
+        # Roster read once; after that every scan is session + user + buffer insert
+        self.assertEqual(len(set(query_counts[1:])), 1)
+        self.assertEqual(CheckIn.objects.count(), 60)
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+        result, _ = self._scan(users[0], token)
+        self.assertEqual(result['message'], 'You have already checked in today.')
+
+        with CaptureQueriesContext(connection) as flush_queries:
+            self.assertEqual(flush_check_ins(), 60)
+        small = self._students(3, start=60)
+        for user in small:
+            self._scan(user, token)
+        with CaptureQueriesContext(connection) as small_flush_queries:
+            flush_check_ins()
+        self.assertEqual(len(flush_queries), len(small_flush_queries))
+        self.assertEqual(
+            AttendanceRecord.objects.filter(batch=self.batch, date=timezone.localdate(), status='PRESENT').count(), 63
+        )
+        self.assertFalse(CheckIn.objects.exists())
+
+    def test_forged_expired_and_foreign_tokens_are_rejected(self):
+        user = self._students(1)[0]
+        other = Batch.objects.create(name='other', start_date=date.today())
+        token = make_checkin_token(self.batch.pk)
+        for bad_token in (
+            token[:-1] + ('0' if token[-1] != '0' else '1'),
+            make_checkin_token(self.batch.pk, now=time.time() - 120),
+            make_checkin_token(other.pk),
+        ):
+            result, _ = self._scan(user, bad_token)
+            self.assertFalse(result['ok'])
+        self.assertFalse(CheckIn.objects.exists())
+
+        # The previous window's code is still accepted while the screen refreshes
+        result, _ = self._scan(user, make_checkin_token(self.batch.pk, now=time.time() - 30))
+        self.assertTrue(result['ok'])
+
+    def test_marking_page_shows_buffered_check_ins_without_writing_them(self):
+        scanned, marked = self._students(2)
+        today = timezone.localdate()
+        record_attendance(self.batch, today, {scanned.pk: 'ABSENT', marked.pk: 'ABSENT'})
+        self._scan(scanned, make_checkin_token(self.batch.pk))
+
+        self.client.force_login(User.objects.create(username='teacher', is_teacher=True))
+        response = self.client.get(reverse('mark_attendance', args=[self.batch.pk]), {'date': today.isoformat()})
+        self.assertEqual(response.context['attendance_map'], {scanned.pk: 'PRESENT', marked.pk: 'ABSENT'})
+        self.assertEqual(CheckIn.objects.count(), 1)
+        self.assertEqual(AttendanceRecord.objects.get(student=scanned).status, 'ABSENT')
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class SyncAttendanceTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create(username='teacher', is_teacher=True))
+        self.batch = Batch.objects.create(name='b', start_date=date(2026, 1, 1))
+        self.students = []
+        for i in range(3):
+            user = User.objects.create(username=f'student-{i}', is_student=True)
+            StudentProfile.objects.create(user=user, batch=self.batch)
+            self.students.append(user.pk)
+
+    def _sync(self, submissions):
+        response = self.client.post(
+            reverse('sync_attendance'), json.dumps({'submissions': submissions}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_replayed_queue_applies_each_key_once(self):
+        first, second = self.students[:2]
+        queue = [
+            {'key': 'k1', 'batch': self.batch.pk, 'date': '2026-01-05', 'statuses': {first: 'PRESENT', second: 'PRESENT'}},
+            {'key': 'k2', 'batch': self.batch.pk, 'date': '2026-01-05', 'statuses': {first: 'ABSENT'}},
+            {'key': 'k3', 'batch': self.batch.pk, 'date': '2026-01-06', 'statuses': {first: 'PRESENT'}},
+            {'key': 'k4', 'batch': self.batch.pk, 'date': 'not-a-date', 'statuses': {first: 'PRESENT'}},
+        ]
+        self.assertEqual(
+            self._sync(queue),
+            {'k1': 'applied', 'k2': 'applied', 'k3': 'applied', 'k4': 'Invalid batch, date or statuses'}
+        )
+        # Later submissions for the same day win
+        self.assertEqual(AttendanceRecord.objects.get(student_id=first, date=date(2026, 1, 5)).status, 'ABSENT')
+
+        # The teacher corrects the day online; replaying the old queue must not undo it
+        AttendanceRecord.objects.filter(student_id=first, date=date(2026, 1, 5)).update(status='PRESENT')
+        self.assertEqual(self._sync(queue[:3]), {'k1': 'duplicate', 'k2': 'duplicate', 'k3': 'duplicate'})
+        self.assertEqual(AttendanceRecord.objects.get(student_id=first, date=date(2026, 1, 5)).status, 'PRESENT')
+        self.assertEqual(AttendanceRecord.objects.count(), 3)
+        self.assertEqual(AttendanceSubmission.objects.count(), 3)
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class AbsenceAlertTests(TestCase):
+    def setUp(self):
+        self.day = date(2026, 1, 5)
+        self.batch = Batch.objects.create(name='b', start_date=self.day)
+        self.students = []
+        for i in range(3):
+            user = User.objects.create(username=f's{i}', is_student=True)
+            StudentProfile.objects.create(user=user, batch=self.batch)
+            self.students.append(user)
+
+    def _alerts(self):
+        return NotificationOutbox.objects.filter(title='Attendance Alert')
+
+    def _mark(self, student, status):
+        record, _ = AttendanceRecord.objects.get_or_create(
+            batch=self.batch, student=student, date=self.day, defaults={'status': status}
+        )
+        if record.status != status:
+            record.status = status
+        record.save()
+        return record
+
+    def _commit_mark(self, student, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._mark(student, status)
+
+    def test_alert_fires_only_on_a_change_to_absent(self):
+        self._commit_mark(self.students[0], 'PRESENT')
+        self.assertFalse(self._alerts().exists())
+
+        self._commit_mark(self.students[0], 'ABSENT')
+        self.assertEqual(self._alerts().count(), 1)
+        # Saving again, or reloading and saving, is not a new absence
+        self._commit_mark(self.students[0], 'ABSENT')
+        with self.captureOnCommitCallbacks(execute=True):
+            AttendanceRecord.objects.get(student=self.students[0]).save()
+        self.assertEqual(self._alerts().count(), 1)
+
+        self._commit_mark(self.students[0], 'PRESENT')
+        self._commit_mark(self.students[0], 'ABSENT')
+        self.assertEqual(self._alerts().count(), 2)
+
+        # A record created as ABSENT alerts too
+        self._commit_mark(self.students[1], 'ABSENT')
+        self.assertEqual(list(self._alerts().order_by('pk').values_list('target_ids', flat=True)), [
+            [self.students[0].pk], [self.students[0].pk], [self.students[1].pk]
+        ])
+
+    def test_one_outbox_row_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for student in self.students:
+                    self._mark(student, 'ABSENT')
+        self.assertEqual(self._alerts().count(), 1)
+        self.assertEqual(sorted(self._alerts().get().target_ids), [student.pk for student in self.students])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._mark(self.students[0], 'PRESENT')
+                self._mark(self.students[0], 'ABSENT')
+        self.assertEqual(self._alerts().count(), 2)
+        self.assertEqual(self._alerts().order_by('pk').last().target_ids, [self.students[0].pk])
+
+        # A rolled-back transaction queues nothing
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self._mark(self.students[1], 'PRESENT')
+                self._mark(self.students[1], 'ABSENT')
+                raise RuntimeError
+        self.assertEqual(self._alerts().count(), 2)
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class AttendanceMatrixTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create(username='teacher', is_teacher=True)
+        self.client.force_login(self.teacher)
+
+    def _batch(self, name, size, days):
+        batch = Batch.objects.create(name=name, start_date=date(2026, 1, 1))
+        students = []
+        for i in range(size):
+            user = User.objects.create(username=f'{name}-{i}', is_student=True)
+            StudentProfile.objects.create(user=user, batch=batch)
+            students.append(user)
+        for day in days:
+            AttendanceRecord.objects.bulk_create([
+                AttendanceRecord(batch=batch, student=user, date=day, status='ABSENT' if i % 3 == 0 else 'PRESENT')
+                for i, user in enumerate(students)
+            ])
+        return batch, students
+
+    def _view(self, batch, month='2026-01'):
+        return self.client.get(reverse('view_attendance', args=[batch.pk]), {'month': month})
+
+    def test_page_costs_eight_queries_whatever_the_batch_size(self):
+        small, _ = self._batch('small', 2, [date(2026, 1, 5)])
+        large, _ = self._batch('large', 60, [date(2026, 1, day) for day in range(5, 25)] + [date(2026, 2, 2)])
+        for batch in (small, large):
+            # Session, user, batch, latest month, neighbouring months, day totals, cells, names
+            with self.assertNumQueries(8):
+                response = self._view(batch)
+            self.assertEqual(response.status_code, 200)
+
+        rows = self._view(large).context['rows']
+        self.assertEqual(len(rows), 60)
+        self.assertEqual(rows[0]['statuses'], 'A' * 20)
+        self.assertEqual(self._view(large).context['next_month'], date(2026, 2, 2))
+
+    def test_students_who_left_are_listed_for_one_more_query(self):
+        batch, students = self._batch('b', 3, [date(2026, 1, 5), date(2026, 1, 6)])
+        StudentProfile.objects.filter(user=students[1]).update(batch=None)
+        with self.assertNumQueries(9):
+            response = self._view(batch)
+        self.assertEqual([row['name'] for row in response.context['rows']], ['b-0', 'b-1', 'b-2'])
+        self.assertEqual(response.context['columns'][0]['absent'], 1)
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class AttendanceSummaryTests(TestCase):
+    def setUp(self):
+        self.batch = Batch.objects.create(name='a', start_date=date(2026, 1, 1))
+        self.other = Batch.objects.create(name='b', start_date=date(2026, 1, 1))
+        self.students = []
+        for i in range(4):
+            user = User.objects.create(username=f's{i}', is_student=True)
+            StudentProfile.objects.create(user=user, batch=self.batch)
+            self.students.append(user)
+
+    def _summaries(self):
+        # Rows emptied by edits and deletes stay at zero; a rebuild drops them
+        return set(AttendanceSummary.objects.exclude(present=0, absent=0).values_list(
+            'student_id', 'batch_id', 'month', 'present', 'absent'
+        ))
+
+    def assertMatchesRebuild(self):
+        maintained = self._summaries()
+        rebuild_attendance_summaries()
+        self.assertEqual(maintained, self._summaries())
+
+    def test_single_saves_and_deletes(self):
+        s0, s1 = self.students[:2]
+        record = AttendanceRecord.objects.create(batch=self.batch, student=s0, date=date(2026, 1, 5), status='PRESENT')
+        AttendanceRecord.objects.create(batch=self.batch, student=s1, date='2026-01-31', status='ABSENT')
+        record.status = 'ABSENT'
+        record.save()
+        record.date = date(2026, 2, 1)
+        record.save()
+        record.save()
+        AttendanceRecord.objects.get(pk=record.pk).delete()
+        AttendanceRecord.objects.create(batch=self.other, student=s0, date=date(2026, 2, 3), status='PRESENT')
+        self.assertEqual(
+            AttendanceSummary.objects.get(student=s1, batch=self.batch, month=date(2026, 1, 1)).absent, 1
+        )
+        self.assertMatchesRebuild()
+
+    def test_bulk_marking_and_a_student_moving_batch(self):
+        statuses = {user.pk: 'PRESENT' for user in self.students}
+        record_attendance(self.batch, date(2026, 1, 5), statuses)
+        record_attendance(self.batch, date(2026, 1, 6), {**statuses, self.students[0].pk: 'ABSENT'})
+        # Resubmitting with one change, then the same day again unchanged
+        record_attendance(self.batch, date(2026, 1, 6), {**statuses, self.students[1].pk: 'ABSENT'})
+        record_attendance(self.batch, date(2026, 1, 6), {**statuses, self.students[1].pk: 'ABSENT'})
+        self.assertMatchesRebuild()
+
+        # The student moves and is marked in the new batch for a day the old one already recorded
+        StudentProfile.objects.filter(user=self.students[2]).update(batch=self.other)
+        record_attendance(self.other, date(2026, 1, 6), {self.students[2].pk: 'ABSENT'})
+        record_attendance(self.other, date(2026, 1, 7), {self.students[2].pk: 'PRESENT'})
+        self.assertEqual(
+            AttendanceRecord.objects.get(student=self.students[2], date=date(2026, 1, 6)).batch, self.other
+        )
+        AttendanceRecord.objects.filter(student=self.students[3], date=date(2026, 1, 5)).delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(
+            AttendanceSummary.objects.get(student=self.students[2], batch=self.other).absent, 1
+        )
+
+
+@skipUnlessDBFeature('has_select_for_update')
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class ConcurrentMarkingTests(TransactionTestCase):
+    """
+    Attendance writers and check-in flushers running side by side. Needs a
+    database with row locks (PostgreSQL); SQLite runs writers one at a time
+    anyway.
+    """
+
+    def setUp(self):
+        self.day = date(2026, 1, 5)
+        self.batch = Batch.objects.create(name='b', start_date=self.day)
+        self.user = User.objects.create(username='s0', is_student=True)
+        StudentProfile.objects.create(user=self.user, batch=self.batch)
+
+    def test_second_writer_waits_and_sees_the_first_writers_record(self):
+        first_read, release = threading.Event(), threading.Event()
+        results = {}
+        bulk_create = AttendanceRecord.objects.bulk_create
+
+        def pausing_bulk_create(*args, **kwargs):
+            if threading.current_thread().name == 'first':
+                first_read.set()
+                release.wait(5)
+            return bulk_create(*args, **kwargs)
+
+        def writer():
+            try:
+                results[threading.current_thread().name] = record_attendance(
+                    self.batch, self.day, {self.user.pk: 'PRESENT'}
+                )
+            finally:
+                connection.close()
+
+        with mock.patch.object(AttendanceRecord.objects, 'bulk_create', pausing_bulk_create):
+            first = threading.Thread(target=writer, name='first')
+            second = threading.Thread(target=writer, name='second')
+            first.start()
+            self.assertTrue(first_read.wait(5))
+            second.start()
+            second.join(0.5)
+            # Blocked on the batch lock while the first writer is mid-transaction
+            self.assertTrue(second.is_alive())
+            release.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertEqual(results, {'first': {self.user.pk: (None, 'PRESENT')}, 'second': {}})
+        summary = AttendanceSummary.objects.get(student=self.user)
+        self.assertEqual((summary.present, summary.absent), (1, 0))
+
+    def test_flush_skips_check_ins_claimed_by_another_flusher(self):
+        CheckIn.objects.create(batch=self.batch, student=self.user, date=self.day)
+        claimed, release = threading.Event(), threading.Event()
+
+        def other_flusher():
+            try:
+                with transaction.atomic():
+                    list(CheckIn.objects.select_for_update())
+                    claimed.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        other = threading.Thread(target=other_flusher)
+        other.start()
+        self.assertTrue(claimed.wait(5))
+        try:
+            self.assertEqual(flush_check_ins(), 0)
+        finally:
+            release.set()
+            other.join(5)
+        self.assertFalse(AttendanceRecord.objects.exists())
+        self.assertEqual(flush_check_ins(), 1)
@@ -5,5 +5,10 @@ urlpatterns = [
     path('', views.attendance_dashboard, name='attendance_dashboard'),
     path('mark/<int:batch_id>/', views.mark_attendance, name='mark_attendance'),
     path('view/<int:batch_id>/', views.view_attendance, name='view_attendance'),
+    path('sync/', views.sync_attendance, name='sync_attendance'),
     path('my-attendance/', views.student_attendance, name='student_attendance'),
+    path('check-in/', views.check_in, name='attendance_check_in'),
+    path('check-in/<int:batch_id>/', views.checkin_display, name='attendance_checkin_display'),
+    path('check-in/<int:batch_id>/token/', views.checkin_token, name='attendance_checkin_token'),
+    path('check-in/<int:batch_id>/close/', views.checkin_close, name='attendance_checkin_close'),
 ]
@@ -1,11 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from .models import AttendanceRecord
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from .models import AttendanceRecord, AttendanceSummary, CheckIn
+from .marking import record_attendance
+from .summaries import attendance_totals, low_attendance
+from .checkin import CheckInError, flush_check_ins, make_checkin_token, record_check_in
+from .sync import SyncPayloadError, apply_submissions
 from batches.models import Batch
 from students.models import StudentProfile
 from django.utils import timezone
-from datetime import datetime
+from django.conf import settings
+from datetime import datetime, timedelta
+from django.db.models import Count, Max, Min, Q, Sum
+from core.models import User
+import json
 
 def is_teacher(user):
     return user.is_authenticated and user.is_teacher
@@ -13,32 +24,54 @@ def is_teacher(user):
 @login_required
 @user_passes_test(is_teacher)
 def attendance_dashboard(request):
-    batches = Batch.objects.all()
-    return render(request, 'attendance/attendance_dashboard.html', {'batches': batches})
+    month = timezone.now().date().replace(day=1)
+    batches = list(Batch.objects.annotate(student_count=Count('students')))
+
+    # This month's rates come from the monthly summaries, not the daily records
+    monthly = {
+        row['batch_id']: row
+        for row in AttendanceSummary.objects.filter(month=month)
+        .values('batch_id')
+        .annotate(present=Sum('present'), absent=Sum('absent'))
+        .order_by()
+    }
+    for batch in batches:
+        row = monthly.get(batch.pk)
+        total = row['present'] + row['absent'] if row else 0
+        batch.month_percentage = round(row['present'] * 100 / total) if total else None
+
+    return render(request, 'attendance/attendance_dashboard.html', {
+        'batches': batches,
+        'month': month,
+        'low_attendance': low_attendance(month, settings.ATTENDANCE_LOW_THRESHOLD),
+        'low_threshold': settings.ATTENDANCE_LOW_THRESHOLD,
+    })
 
 @login_required
 @user_passes_test(is_teacher)
 def mark_attendance(request, batch_id):
     batch = get_object_or_404(Batch, pk=batch_id)
-    students = batch.students.all()
+    students = batch.students.select_related('user')
     date = request.GET.get('date', timezone.now().date().isoformat())
     
     if request.method == 'POST':
         date = request.POST.get('date')
-        for student in students:
-            status = request.POST.get(f'status_{student.user.id}')
-            AttendanceRecord.objects.update_or_create(
-                batch=batch,
-                student=student.user,
-                date=date,
-                defaults={'status': status}
-            )
+        # One bulk upsert; absence alerts go out as a single batched send
+        student_ids = students.values_list('user_id', flat=True)
+        record_attendance(batch, date, {
+            student_id: request.POST.get(f'status_{student_id}')
+            for student_id in student_ids
+        })
         messages.success(request, 'Attendance marked successfully.')
         return redirect('attendance_dashboard')
 
-    # Fetch existing attendance for this date
-    existing_records = AttendanceRecord.objects.filter(batch=batch, date=date)
-    attendance_map = {record.student.id: record.status for record in existing_records}
+    # Fetch existing attendance for this date; QR check-ins still waiting
+    # in the buffer show as present without being written here
+    attendance_map = dict(
+        AttendanceRecord.objects.filter(batch=batch, date=date).values_list('student_id', 'status')
+    )
+    for student_id in CheckIn.objects.filter(batch=batch, date=date).values_list('student_id', flat=True):
+        attendance_map[student_id] = 'PRESENT'
 
     return render(request, 'attendance/mark_attendance.html', {
         'batch': batch,
@@ -47,24 +80,186 @@ def mark_attendance(request, batch_id):
         'attendance_map': attendance_map
     })
 
+@login_required
+@user_passes_test(is_teacher)
+@require_POST
+def sync_attendance(request):
+    """
+    JSON batch endpoint for the offline queue (static/js/attendance-queue.js):
+    {"submissions": [{"key", "batch", "date", "statuses": {student_id: status}}, ...]}.
+    Replies {"results": {key: "applied" | "duplicate" | error}}.
+    """
+    try:
+        payload = json.loads(request.body)
+        results = apply_submissions(payload.get('submissions'), request.user)
+    except (ValueError, AttributeError) as e:
+        message = str(e) if isinstance(e, SyncPayloadError) else 'Invalid JSON payload'
+        return JsonResponse({'status': 'error', 'message': message}, status=400)
+    return JsonResponse({'status': 'success', 'results': results})
+
+def _parse_month(value, default):
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except (TypeError, ValueError):
+        return default.replace(day=1)
+
+def _attendance_matrix(batch, start, end):
+    """
+    Students x class-days grid for one month of a batch.
+    Column totals come from one grouped query and the cells from one narrow
+    query, packed into a short status string per student ('P', 'A' or '-').
+    """
+    columns = list(
+        AttendanceRecord.objects.filter(batch=batch, date__gte=start, date__lt=end)
+        .values('date')
+        .annotate(
+            present=Count('id', filter=Q(status='PRESENT')),
+            absent=Count('id', filter=Q(status='ABSENT'))
+        )
+        .order_by('date')
+    )
+    position = {column['date']: i for i, column in enumerate(columns)}
+
+    cells = {}
+    for student_id, day, status in AttendanceRecord.objects.filter(
+        batch=batch, date__gte=start, date__lt=end
+    ).values_list('student_id', 'date', 'status'):
+        row = cells.setdefault(student_id, ['-'] * len(columns))
+        row[position[day]] = status[0]
+
+    # Current members first, then anyone recorded this month who has since moved
+    people = list(batch.students.values_list('user_id', 'user__first_name', 'user__last_name', 'user__username'))
+    missing = set(cells) - {person[0] for person in people}
+    if missing:
+        people += list(User.objects.filter(pk__in=missing).values_list('id', 'first_name', 'last_name', 'username'))
+
+    rows = []
+    for user_id, first_name, last_name, username in people:
+        statuses = ''.join(cells.get(user_id, ['-'] * len(columns)))
+        rows.append({
+            'name': f'{first_name} {last_name}'.strip() or username,
+            'statuses': statuses,
+            'present': statuses.count('P'),
+            'absent': statuses.count('A'),
+        })
+    rows.sort(key=lambda row: row['name'].lower())
+    return columns, rows
+
 @login_required
 @user_passes_test(is_teacher)
 def view_attendance(request, batch_id):
     batch = get_object_or_404(Batch, pk=batch_id)
-    records = AttendanceRecord.objects.filter(batch=batch).order_by('-date')
-    return render(request, 'attendance/view_attendance.html', {'batch': batch, 'records': records})
+    records = AttendanceRecord.objects.filter(batch=batch)
+
+    latest = records.aggregate(latest=Max('date'))['latest'] or timezone.now().date()
+    start = _parse_month(request.GET.get('month'), latest)
+    end = (start + timedelta(days=32)).replace(day=1)
+
+    # Keyset navigation: jump to the nearest month that actually has records
+    nearby = records.aggregate(
+        previous=Max('date', filter=Q(date__lt=start)),
+        next=Min('date', filter=Q(date__gte=end))
+    )
+    columns, rows = _attendance_matrix(batch, start, end)
+
+    return render(request, 'attendance/view_attendance.html', {
+        'batch': batch,
+        'month': start,
+        'columns': columns,
+        'rows': rows,
+        'previous_month': nearby['previous'],
+        'next_month': nearby['next'],
+    })
+
+HISTORY_PAGE_SIZE = 30
 
 @login_required
 def student_attendance(request):
     if not request.user.is_student:
         return redirect('dashboard')
-    
-    records = AttendanceRecord.objects.filter(student=request.user).order_by('-date')
-    total_present = records.filter(status='PRESENT').count()
-    total_absent = records.filter(status='ABSENT').count()
-    
+
+    # Totals and the month table read one summary row per month
+    summaries = AttendanceSummary.objects.filter(student=request.user)
+    months = summaries.select_related('batch').order_by('-month')
+    totals = attendance_totals(summaries)
+
+    # Raw history a page at a time, keyed on the last date shown (no COUNT/OFFSET)
+    records = AttendanceRecord.objects.filter(student=request.user).select_related('batch').order_by('-date')
+    before = request.GET.get('before')
+    if before:
+        try:
+            records = records.filter(date__lt=datetime.strptime(before, '%Y-%m-%d').date())
+        except ValueError:
+            pass
+    records = list(records[:HISTORY_PAGE_SIZE + 1])
+    next_before = records[HISTORY_PAGE_SIZE - 1].date if len(records) > HISTORY_PAGE_SIZE else None
+
     return render(request, 'attendance/student_attendance.html', {
-        'records': records,
-        'total_present': total_present,
-        'total_absent': total_absent
+        'records': records[:HISTORY_PAGE_SIZE],
+        'months': months,
+        'total_present': totals['present'],
+        'total_absent': totals['absent'],
+        'percentage': totals['percentage'],
+        'next_before': next_before,
+        'is_first_page': not before,
     })
+
+@login_required
+@user_passes_test(is_teacher)
+def checkin_display(request, batch_id):
+    batch = get_object_or_404(Batch, pk=batch_id)
+    return render(request, 'attendance/checkin_display.html', {
+        'batch': batch,
+        'refresh_seconds': settings.ATTENDANCE_CHECKIN_TOKEN_SECONDS,
+    })
+
+@login_required
+@user_passes_test(is_teacher)
+def checkin_token(request, batch_id):
+    """
+    Current QR token for the teacher's screen (polled), with today's count.
+    """
+    today = timezone.localdate()
+    token = make_checkin_token(batch_id)
+    checked_in = (
+        CheckIn.objects.filter(batch_id=batch_id, date=today).count()
+        + AttendanceRecord.objects.filter(batch_id=batch_id, date=today, status='PRESENT').count()
+    )
+    return JsonResponse({
+        'token': token,
+        'url': request.build_absolute_uri(f"{reverse('attendance_check_in')}?t={token}"),
+        'checked_in': checked_in,
+    })
+
+@login_required
+@user_passes_test(is_teacher)
+@require_POST
+def checkin_close(request, batch_id):
+    batch = get_object_or_404(Batch, pk=batch_id)
+    flushed = flush_check_ins(batch_id=batch.pk)
+    messages.success(request, f'Check-in closed. {flushed} student(s) marked present.')
+    return redirect(f"{reverse('mark_attendance', args=[batch.pk])}?date={timezone.localdate().isoformat()}")
+
+@login_required
+def check_in(request):
+    """
+    Student end of the QR flow; the code opens this page with ?t=<token>.
+    The POST only validates the signed token and appends to the CheckIn
+    buffer, so a whole class can scan at once.
+    """
+    if not request.user.is_student:
+        return redirect('dashboard')
+
+    token = request.POST.get('t') or request.GET.get('t', '')
+    result = None
+    if request.method == 'POST':
+        try:
+            created = record_check_in(request.user.pk, token)
+            result = {
+                'ok': True,
+                'message': 'You are checked in.' if created else 'You have already checked in today.',
+            }
+        except CheckInError as e:
+            result = {'ok': False, 'message': str(e)}
+
+    return render(request, 'attendance/check_in.html', {'token': token, 'result': result})
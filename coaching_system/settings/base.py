@@ -102,6 +102,24 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# Cache
+# Shared Redis cache when REDIS_URL is set (required with several gunicorn workers
+# plus the notification worker); per-process memory cache otherwise.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -126,3 +144,50 @@ FIREBASE_SERVICE_ACCOUNT_KEY = os.environ.get(
     "FIREBASE_SERVICE_ACCOUNT_KEY", 
     str(BASE_DIR / 'firebase-key.json') 
 )
+
+# PUSH NOTIFICATION OUTBOX
+# Signals write to the outbox; `manage.py run_notification_worker` delivers.
+NOTIFICATION_OUTBOX_BATCH_SIZE = int(os.environ.get("NOTIFICATION_OUTBOX_BATCH_SIZE", 50))
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", 5))
+NOTIFICATION_OUTBOX_BACKOFF_SECONDS = int(os.environ.get("NOTIFICATION_OUTBOX_BACKOFF_SECONDS", 30))
+NOTIFICATION_OUTBOX_MAX_BACKOFF_SECONDS = int(os.environ.get("NOTIFICATION_OUTBOX_MAX_BACKOFF_SECONDS", 3600))
+NOTIFICATION_WORKER_INTERVAL_SECONDS = int(os.environ.get("NOTIFICATION_WORKER_INTERVAL_SECONDS", 5))
+# Deliver right after commit in a background thread (handy without a worker).
+NOTIFICATION_OUTBOX_EAGER = os.environ.get("NOTIFICATION_OUTBOX_EAGER", "False") == "True"
+# Dotted path of the push transport and how many 500-token slices to send at once
+NOTIFICATION_TRANSPORT = os.environ.get("NOTIFICATION_TRANSPORT", "notifications.transports.FirebaseTransport")
+NOTIFICATION_FANOUT_CONCURRENCY = int(os.environ.get("NOTIFICATION_FANOUT_CONCURRENCY", 4))
+# Seconds a cached batch -> token list may live (entries are also invalidated on change);
+# only cached with REDIS_URL, since every process must see the invalidation
+NOTIFICATION_AUDIENCE_CACHE_TIMEOUT = int(os.environ.get("NOTIFICATION_AUDIENCE_CACHE_TIMEOUT", 3600))
+# Identical notifications (same audience, category, object and text) inside this window are sent once
+NOTIFICATION_DEDUP_WINDOW_SECONDS = int(os.environ.get("NOTIFICATION_DEDUP_WINDOW_SECONDS", 600))
+# Max per-user notifications (alerts) per student per hour, counted when delivered;
+# batch and all-student broadcasts are not capped (0 disables)
+NOTIFICATION_HOURLY_CAP = int(os.environ.get("NOTIFICATION_HOURLY_CAP", 10))
+# Deliver batch / all-student notifications through FCM topics (batch-<id>, all-students)
+NOTIFICATION_USE_TOPICS = os.environ.get("NOTIFICATION_USE_TOPICS", "False") == "True"
+# save-token only rewrites an unchanged token when last_used_at is older than this;
+# otherwise the ping is buffered in Redis (REDIS_URL; written directly without it)
+# and flushed in bulk by the worker
+NOTIFICATION_TOKEN_WRITE_INTERVAL_SECONDS = int(os.environ.get("NOTIFICATION_TOKEN_WRITE_INTERVAL_SECONDS", 86400))
+NOTIFICATION_HEARTBEAT_FLUSH_SECONDS = int(os.environ.get("NOTIFICATION_HEARTBEAT_FLUSH_SECONDS", 300))
+
+# FEE RECEIPTS
+# Render processes per web process, shared by bulk receipt exports (1 = render in the request)
+FEE_RECEIPT_RENDER_WORKERS = int(os.environ.get("FEE_RECEIPT_RENDER_WORKERS", 2))
+
+# ATTENDANCE
+# Monthly attendance % below which a student shows on the teacher's low-attendance list
+ATTENDANCE_LOW_THRESHOLD = int(os.environ.get("ATTENDANCE_LOW_THRESHOLD", 75))
+# QR self check-in: seconds each signed QR token is shown for (the previous one is still accepted),
+# how often the worker flushes buffered check-ins, and how long a batch roster is cached
+ATTENDANCE_CHECKIN_TOKEN_SECONDS = int(os.environ.get("ATTENDANCE_CHECKIN_TOKEN_SECONDS", 30))
+ATTENDANCE_CHECKIN_FLUSH_SECONDS = int(os.environ.get("ATTENDANCE_CHECKIN_FLUSH_SECONDS", 15))
+ATTENDANCE_CHECKIN_ROSTER_CACHE_SECONDS = int(os.environ.get("ATTENDANCE_CHECKIN_ROSTER_CACHE_SECONDS", 300))
+# Queued offline submissions accepted per /attendance/sync/ request
+ATTENDANCE_SYNC_MAX_SUBMISSIONS = int(os.environ.get("ATTENDANCE_SYNC_MAX_SUBMISSIONS", 50))
+
+# EXAMS
+# Hours a marks-import error report stays downloadable before it is purged
+EXAMS_IMPORT_REPORT_RETENTION_HOURS = int(os.environ.get("EXAMS_IMPORT_REPORT_RETENTION_HOURS", 24))
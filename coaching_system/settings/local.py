@@ -32,3 +32,6 @@ STORAGES = {
 
 # Email Backend for Development (Console)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Deliver push notifications without running the outbox worker locally
+NOTIFICATION_OUTBOX_EAGER = True
@@ -0,0 +1,34 @@
+from django.db.models import Func, IntegerField
+
+
+class DaysBetween(Func):
+    """
+    Whole days from `start` to `end` (end - start) as an integer, computed in
+    the database. Django has no portable date difference in days, so each
+    backend gets its own SQL.
+    """
+    arity = 2
+    output_field = IntegerField()
+
+    def __init__(self, start, end, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # MySQL / MariaDB
+        return super().as_sql(compiler, connection, template='DATEDIFF(%(expressions)s)', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS integer)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='((%(expressions)s)::date)',
+            arg_joiner=')::date - (',
+            **extra_context
+        )
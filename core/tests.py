@@ -1,3 +1,48 @@
-from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from django.db import connection
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+from django.db.models import Value
+from django.test import TestCase, override_settings
+
+from core.models import User
+from students.models import StudentProfile
+from .expressions import DaysBetween
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class DaysBetweenTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='s1', is_student=True)
+        StudentProfile.objects.create(user=user, date_of_join=date(2024, 2, 28))
+
+    def _days(self, end):
+        return StudentProfile.objects.annotate(
+            days=DaysBetween('date_of_join', Value(end))
+        ).values_list('days', flat=True).get()
+
+    def test_whole_days_on_the_configured_database(self):
+        self.assertEqual(self._days(date(2024, 2, 28)), 0)
+        # Leap day, month and year boundaries, and an end before the start
+        self.assertEqual(self._days(date(2024, 3, 1)), 2)
+        self.assertEqual(self._days(date(2025, 1, 1)), 308)
+        self.assertEqual(self._days(date(2024, 2, 1)), -27)
+
+    def _sql(self, expression, compiler_connection):
+        query = StudentProfile.objects.annotate(days=expression).values('days').query
+        compiler = query.get_compiler(connection=compiler_connection)
+        return expression.resolve_expression(query), compiler
+
+    def test_postgresql_subtracts_dates(self):
+        # Compiled against an unconnected PostgreSQL wrapper; no server needed
+        postgresql = PostgreSQLDatabaseWrapper({**connection.settings_dict, 'NAME': 'unused'}, alias='postgresql')
+        expression, compiler = self._sql(DaysBetween('date_of_join', Value(date(2024, 3, 1))), postgresql)
+        sql, params = expression.as_postgresql(compiler, postgresql)
+        self.assertEqual(sql, '((%s)::date - ("students_studentprofile"."date_of_join")::date)')
+        self.assertEqual(list(params), [date(2024, 3, 1)])
+
+    def test_mysql_uses_datediff(self):
+        expression, compiler = self._sql(DaysBetween('date_of_join', Value(date(2024, 3, 1))), connection)
+        # The generic as_sql is the MySQL / MariaDB form
+        sql, _ = expression.as_sql(compiler, connection)
+        self.assertRegex(sql, r'^DATEDIFF\(%s, \S+date_of_join\S*\)$')
@@ -3,7 +3,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.contrib.auth import login
 from django.db import models
-from django.db.models import Sum
+from django.utils import timezone
 from django.views.decorators.cache import never_cache
 from django.http import HttpResponse
 from django.template.loader import render_to_string
@@ -13,7 +13,8 @@ from .forms import AnnouncementForm
 from students.models import StudentProfile
 from batches.models import Batch
 from exams.models import Exam
-from fees.models import FeePayment
+from fees.rollups import revenue_summary
+from attendance.summaries import attendance_totals
 from students.forms import PublicRegistrationForm
 
 def is_teacher(user):
@@ -25,21 +26,24 @@ def dashboard(request):
         total_students = StudentProfile.objects.count()
         active_batches = Batch.objects.count()
         upcoming_exams = Exam.objects.order_by('date')[:5]
-        total_fees = FeePayment.objects.aggregate(Sum('amount'))['amount__sum'] or 0
+        # Totals come from the FeeRollup table, not a scan of every payment
+        revenue = revenue_summary(timezone.now().date())
         recent_announcements = Announcement.objects.order_by('-created_at')[:5]
         
         context = {
             'total_students': total_students,
             'active_batches': active_batches,
             'upcoming_exams': upcoming_exams,
-            'total_fees': total_fees,
+            'total_fees': revenue['all_time'],
+            'revenue': revenue,
             'recent_announcements': recent_announcements,
         }
         return render(request, 'core/teacher_dashboard.html', context)
     elif request.user.is_student:
-        # Check if student profile exists (it should, but safety first)
-        if hasattr(request.user, 'student_profile'):
-            student_profile = request.user.student_profile
+        # Check if student profile exists (it should, but safety first).
+        # The fee status is annotated in the same query (same SQL rule as the fee list and reminders).
+        student_profile = StudentProfile.objects.with_fee_status().select_related('batch').filter(user=request.user).first()
+        if student_profile:
             batch = student_profile.batch
             recent_announcements = Announcement.objects.filter(
                 models.Q(target_type='ALL') | 
@@ -47,7 +51,6 @@ def dashboard(request):
             ).distinct().order_by('-created_at')[:5]
             
             # Fetch upcoming exams for the student's batch
-            from django.utils import timezone
             upcoming_exams = Exam.objects.filter(
                 batch=batch, 
                 date__gte=timezone.now().date()
@@ -55,20 +58,10 @@ def dashboard(request):
             next_exam = upcoming_exams.first() if upcoming_exams.exists() else None
 
             # Fee Reminder Logic
-            from datetime import timedelta
-            today = timezone.now().date()
-            join_date = student_profile.date_of_join
-            days_since_join = (today - join_date).days
-            
-            fee_due = False
-            if days_since_join > 30:
-                last_payment = FeePayment.objects.filter(student=request.user).order_by('-date').first()
-                if not last_payment:
-                    fee_due = True
-                else:
-                    days_since_payment = (today - last_payment.date).days
-                    if days_since_payment > 30:
-                        fee_due = True
+            fee_due = student_profile.is_due
+
+            # Overall attendance from the monthly summaries (one row per month)
+            attendance = attendance_totals(request.user.attendance_summaries.all())
 
             context = {
                 'student': student_profile,
@@ -76,6 +69,7 @@ def dashboard(request):
                 'recent_announcements': recent_announcements,
                 'next_exam': next_exam,
                 'fee_due': fee_due,
+                'attendance': attendance,
             }
             return render(request, 'core/student_dashboard.html', context)
         else:
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Exam, Mark
+from .models import BatchResults, Exam, ExamStats, Mark, ReportCard
 
 @admin.register(Exam)
 class ExamAdmin(admin.ModelAdmin):
@@ -12,3 +12,18 @@ class MarkAdmin(admin.ModelAdmin):
     list_display = ('student', 'exam', 'marks_obtained')
     list_filter = ('exam__batch', 'exam__subject')
     search_fields = ('student__username', 'exam__title')
+
+@admin.register(ExamStats)
+class ExamStatsAdmin(admin.ModelAdmin):
+    list_display = ('exam', 'count', 'mean', 'median', 'highest', 'version', 'computed_version', 'computed_at')
+    exclude = ('ranks',)
+
+@admin.register(BatchResults)
+class BatchResultsAdmin(admin.ModelAdmin):
+    list_display = ('batch', 'version', 'published_at')
+
+@admin.register(ReportCard)
+class ReportCardAdmin(admin.ModelAdmin):
+    list_display = ('student', 'batch', 'version', 'built_at')
+    list_filter = ('batch',)
+    search_fields = ('student__username',)
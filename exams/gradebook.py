@@ -0,0 +1,116 @@
+import tempfile
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from students.models import StudentProfile
+
+from .models import Exam, Mark
+
+GRADEBOOK_PAGE_SIZE = 50
+# Students pivoted per marks query when exporting the whole batch
+EXPORT_CHUNK_SIZE = 500
+
+
+def gradebook_exams(batch_id):
+    """
+    The batch's exams in column order (oldest first), one query.
+    """
+    return list(Exam.objects.filter(batch_id=batch_id).select_related('subject').order_by('date', 'pk'))
+
+
+def gradebook_students(batch_id):
+    """
+    (user id, display name) of the batch's students in row order, as a
+    queryset that can be paginated or sliced.
+    """
+    return StudentProfile.objects.filter(batch_id=batch_id).order_by(
+        'user__first_name', 'user__last_name', 'user__username', 'user_id'
+    ).values_list('user_id', 'user__first_name', 'user__last_name', 'user__username')
+
+
+def _percentage(obtained, possible):
+    if not possible:
+        return None
+    return (obtained * 100 / possible).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
+
+
+def pivot_marks(exams, students):
+    """
+    Rows of the students x exams matrix for `students` (values from
+    gradebook_students), built in memory from one marks query:
+    [{'student_id', 'name', 'marks': [Decimal or None per exam], 'percentage'}].
+    The percentage is over the exams the student has marks for.
+    """
+    students = list(students)
+    columns = {exam.pk: index for index, exam in enumerate(exams)}
+    marks = defaultdict(lambda: [None] * len(exams))
+    for student_id, exam_id, obtained in Mark.objects.filter(
+        exam_id__in=columns, student_id__in=[student[0] for student in students]
+    ).values_list('student_id', 'exam_id', 'marks_obtained'):
+        marks[student_id][columns[exam_id]] = obtained
+
+    rows = []
+    for student_id, first_name, last_name, username in students:
+        row = marks[student_id]
+        taken = [(obtained, exam.total_marks) for obtained, exam in zip(row, exams) if obtained is not None]
+        rows.append({
+            'student_id': student_id,
+            'name': f'{first_name} {last_name}'.strip() or username,
+            'marks': row,
+            'percentage': _percentage(sum(o for o, _ in taken), sum(t for _, t in taken)) if taken else None,
+        })
+    return rows
+
+
+def write_gradebook_xlsx(batch, output):
+    """
+    Write the batch's full gradebook to `output` with openpyxl's write-only
+    mode: rows go straight to a temporary sheet file and students are pivoted
+    EXPORT_CHUNK_SIZE at a time, so memory stays flat for any batch size.
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    exams = gradebook_exams(batch.pk)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title='Gradebook')
+    sheet.freeze_panes = 'C2'
+
+    header = ['Student', 'Username'] + [
+        f'{exam.title} ({exam.date:%d %b}, /{exam.total_marks})' for exam in exams
+    ] + ['Percentage']
+    bold = Font(bold=True)
+    header_cells = []
+    for title in header:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = bold
+        header_cells.append(cell)
+    sheet.append(header_cells)
+
+    students = gradebook_students(batch.pk)
+    start = 0
+    while True:
+        chunk = list(students[start:start + EXPORT_CHUNK_SIZE])
+        if not chunk:
+            break
+        usernames = {student[0]: student[3] for student in chunk}
+        for row in pivot_marks(exams, chunk):
+            sheet.append(
+                [row['name'], usernames[row['student_id']]]
+                + [float(obtained) if obtained is not None else None for obtained in row['marks']]
+                + [float(row['percentage']) if row['percentage'] is not None else None]
+            )
+        start += EXPORT_CHUNK_SIZE
+    workbook.save(output)
+
+
+def gradebook_xlsx_file(batch):
+    """
+    The exported workbook as an open temporary file, rewound and ready to be
+    streamed by a FileResponse (which closes it, deleting the file).
+    """
+    output = tempfile.TemporaryFile()
+    write_gradebook_xlsx(batch, output)
+    output.seek(0)
+    return output
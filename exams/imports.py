@@ -0,0 +1,294 @@
+import csv
+import io
+import logging
+import re
+import tempfile
+import uuid
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .marking import parse_marks, record_marks
+from .models import Exam
+from .report_cards import publish_results
+
+logger = logging.getLogger(__name__)
+
+# Errors kept for the page; the downloadable report has all of them
+MAX_REPORTED_ERRORS = 500
+ERROR_REPORT_PREFIX = 'imports/marks'
+
+# Accepted header names (case-insensitive) for each column
+COLUMN_ALIASES = {
+    'student': ('student', 'username', 'user'),
+    'marks': ('marks', 'marks_obtained', 'score', 'obtained'),
+}
+# Characters Excel doesn't allow in sheet names
+_SHEET_TITLE_INVALID = re.compile(r'[\\/*?:\[\]]')
+
+
+class ImportFileError(ValueError):
+    """
+    The upload can't be read at all (unknown format or encoding, corrupt
+    workbook).
+    """
+
+
+def sheet_title(exam):
+    """
+    Sheet name for an exam in a marks workbook: its id, then as much of the
+    title as fits Excel's 31 characters. The id alone identifies the exam.
+    """
+    return f'{exam.pk} {_SHEET_TITLE_INVALID.sub(" ", exam.title)}'[:31].strip()
+
+
+def error_report_path(name):
+    """
+    Storage path of the error report called `name` (its file name without
+    the extension, as linked from the import page).
+    """
+    return f'{ERROR_REPORT_PREFIX}/{name}.csv'
+
+
+def purge_error_reports(max_age=None, now=None):
+    """
+    Delete stored error reports older than `max_age` (default
+    EXAMS_IMPORT_REPORT_RETENTION_HOURS). Returns the number deleted.
+    """
+    max_age = max_age or timedelta(hours=settings.EXAMS_IMPORT_REPORT_RETENTION_HOURS)
+    cutoff = (now or timezone.now()) - max_age
+    try:
+        _, names = default_storage.listdir(ERROR_REPORT_PREFIX)
+    except FileNotFoundError:
+        return 0
+    deleted = 0
+    for name in names:
+        path = f'{ERROR_REPORT_PREFIX}/{name}'
+        try:
+            if default_storage.get_modified_time(path) < cutoff:
+                default_storage.delete(path)
+                deleted += 1
+        except FileNotFoundError:
+            # Removed by a concurrent sweep
+            continue
+    return deleted
+
+
+def _match_exam(name, exams):
+    """
+    The exam a sheet holds: by the leading id of sheet_title(), otherwise by
+    its full title (case-insensitive, only if no other exam shares it).
+    """
+    by_id = {exam.pk: exam for exam in exams}
+    leading = re.match(r'\s*(\d+)\b', name)
+    if leading and int(leading.group(1)) in by_id:
+        return by_id[int(leading.group(1))]
+    titled = [exam for exam in exams if exam.title.strip().lower() == name.strip().lower()]
+    return titled[0] if len(titled) == 1 else None
+
+
+def _csv_rows(text):
+    try:
+        yield from csv.reader(text)
+    except UnicodeDecodeError:
+        raise ImportFileError('The CSV is not UTF-8 encoded. Save it as "CSV UTF-8" and upload it again.')
+    except csv.Error as e:
+        raise ImportFileError(f'The CSV could not be read: {e}')
+
+
+def _read_sheets(upload, filename, all_sheets):
+    """
+    Yield (sheet name, row iterator) without loading the file whole: csv
+    reads line by line and openpyxl's read-only mode streams each sheet.
+    A CSV is a single sheet named after the file; `all_sheets` False reads
+    only the workbook's active sheet.
+    """
+    name = filename.lower()
+    if name.endswith('.csv'):
+        text = io.TextIOWrapper(getattr(upload, 'file', upload), encoding='utf-8-sig', newline='')
+        yield filename, _csv_rows(text)
+    elif name.endswith('.xlsx'):
+        import openpyxl
+        from openpyxl.utils.exceptions import InvalidFileException
+        try:
+            workbook = openpyxl.load_workbook(upload, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError):
+            raise ImportFileError('The file is not a valid .xlsx workbook.')
+        try:
+            for sheet in (workbook.worksheets if all_sheets else [workbook.active]):
+                yield sheet.title, sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        raise ImportFileError('Upload a .csv or .xlsx file.')
+
+
+def _map_header(header):
+    mapping = {}
+    for index, name in enumerate(header):
+        name = str(name or '').strip().lower().replace(' ', '_')
+        for column, aliases in COLUMN_ALIASES.items():
+            if name in aliases and column not in mapping:
+                mapping[column] = index
+    missing = [column for column in ('student', 'marks') if column not in mapping]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    return mapping
+
+
+def _cell(row, index):
+    if index >= len(row) or row[index] is None:
+        return ''
+    value = row[index]
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def import_marks(upload, filename, batch, exam=None, skip_invalid=False, dry_run=False):
+    """
+    Import marks from a CSV/XLSX upload with `student` (username) and
+    `marks` columns.
+    With `exam`, the CSV or the workbook's active sheet holds that exam's
+    marks. Without it, every sheet of the workbook is one of the batch's
+    exams, matched by sheet_title() or exam title.
+    Usernames resolve through one prefetched map of the batch's students,
+    values are checked with parse_marks against the exam's total marks, and
+    each exam is saved with one record_marks upsert; the batch's report cards
+    are then rebuilt once. Rows are streamed, so memory is bounded by the
+    batch's roster, not the file. Any invalid row cancels the import unless
+    `skip_invalid` is set; `dry_run` writes nothing.
+    Returns a report dict: sheets, rows, imported (marks written, or that
+    would be), committed, error_count, errors (sheet, row number, message)
+    capped at MAX_REPORTED_ERRORS, and error_report: the name of a stored CSV
+    with every error (see error_report_path), or None.
+    """
+    report = {
+        'sheets': 0, 'rows': 0, 'imported': 0, 'error_count': 0, 'errors': [],
+        'dry_run': dry_run, 'committed': False, 'error_report': None,
+    }
+    exams = [exam] if exam else list(Exam.objects.filter(batch=batch))
+    students = {
+        username.lower(): user_id
+        for user_id, username in batch.students.values_list('user_id', 'user__username')
+    }
+    parsed = []  # (exam, {student_id: Decimal})
+    # Spills to disk past 1 MB, so a file full of errors stays cheap too
+    error_file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+', newline='')
+    error_writer = csv.writer(error_file)
+    error_writer.writerow(['sheet', 'row', 'student', 'marks', 'error'])
+
+    def add_error(sheet, number, message, student='', marks=''):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append((sheet, number, message))
+        error_writer.writerow([sheet, number, student, marks, message])
+
+    try:
+        seen_exams = set()
+        for name, rows in _read_sheets(upload, filename, all_sheets=exam is None):
+            sheet_exam = exam or _match_exam(name, exams)
+            if sheet_exam is None:
+                add_error(name, '', f"No exam of {batch.name} matches sheet '{name}'")
+                continue
+            if sheet_exam.pk in seen_exams:
+                add_error(name, '', f"Another sheet already holds {sheet_exam.title}")
+                continue
+            seen_exams.add(sheet_exam.pk)
+            report['sheets'] += 1
+
+            mapping = None
+            raw_marks = {}
+            lines = {}  # student id -> (row number, student, marks) for error messages
+            for number, row in enumerate(rows, start=1):
+                if mapping is None:
+                    try:
+                        mapping = _map_header(row)
+                    except ValueError as e:
+                        add_error(name, number, str(e))
+                        break
+                    continue
+                if not any(cell not in (None, '') for cell in row):
+                    continue
+                report['rows'] += 1
+                student, marks = _cell(row, mapping['student']), _cell(row, mapping['marks'])
+                student_id = students.get(student.lower())
+                if student_id is None:
+                    add_error(name, number, f"No student '{student}' in {batch.name}", student, marks)
+                elif student_id in raw_marks:
+                    add_error(name, number, f"'{student}' appears twice in the sheet", student, marks)
+                else:
+                    raw_marks[student_id] = marks
+                    lines[student_id] = (number, student, marks)
+            else:
+                # No header error, so a missing header means no rows at all
+                if mapping is None:
+                    add_error(name, '', 'The sheet is empty.')
+            if mapping is None:
+                continue
+
+            valid, errors = parse_marks(sheet_exam, raw_marks)
+            for student_id, message in sorted(errors.items(), key=lambda item: lines[item[0]][0]):
+                number, student, marks = lines[student_id]
+                add_error(name, number, message, student, marks)
+            parsed.append((sheet_exam, valid))
+            report['imported'] += len(valid)
+
+        report['committed'] = (
+            not dry_run and bool(parsed) and (skip_invalid or not report['error_count'])
+        )
+        if report['committed']:
+            with transaction.atomic():
+                for sheet_exam, valid in parsed:
+                    record_marks(sheet_exam, valid)
+                publish_results(batch.pk)
+
+        if report['error_count']:
+            error_file.seek(0)
+            report['error_report'] = uuid.uuid4().hex
+            default_storage.save(error_report_path(report['error_report']), File(error_file))
+            # Older reports are only kept for a while; sweep them as new ones arrive
+            purge_error_reports()
+    finally:
+        error_file.close()
+
+    logger.info(
+        f"Marks import {filename} for {batch.name}: {report['sheets']} sheets, {report['rows']} rows, "
+        f"{report['imported']} marks, {report['error_count']} errors, committed={report['committed']}"
+    )
+    return report
+
+
+def write_import_template(batch, output):
+    """
+    A workbook with one sheet per exam of the batch, named by sheet_title()
+    and listing every student's username, ready to be filled in and imported.
+    """
+    import openpyxl
+
+    usernames = list(batch.students.order_by('user__username').values_list('user__username', flat=True))
+    workbook = openpyxl.Workbook(write_only=True)
+    for exam in Exam.objects.filter(batch=batch).order_by('date', 'pk'):
+        sheet = workbook.create_sheet(title=sheet_title(exam))
+        sheet.append(['username', 'marks'])
+        for username in usernames:
+            sheet.append([username, None])
+    if not workbook.worksheets:
+        workbook.create_sheet(title='No exams')
+    workbook.save(output)
+
+
+def import_template_file(batch):
+    """
+    The template workbook as an open temporary file, rewound and ready to be
+    streamed by a FileResponse.
+    """
+    output = tempfile.TemporaryFile()
+    write_import_template(batch, output)
+    output.seek(0)
+    return output
@@ -0,0 +1,63 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from batches.models import Batch
+from exams.imports import ImportFileError, error_report_path, import_marks
+from exams.models import Exam
+
+
+class Command(BaseCommand):
+    help = (
+        "Import exam marks (username, marks) from a CSV or XLSX file: one exam with --exam, "
+        "or a workbook with one sheet per exam of --batch"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file to import')
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--exam', type=int, help='Exam id the file holds marks for')
+        target.add_argument('--batch', type=int, help='Batch id whose exams the workbook sheets hold')
+        parser.add_argument('--skip-invalid', action='store_true', help='Import valid rows even if some rows have errors')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; write nothing')
+
+    def handle(self, *args, **options):
+        exam = None
+        try:
+            if options['exam']:
+                exam = Exam.objects.select_related('batch').get(pk=options['exam'])
+                batch = exam.batch
+            else:
+                batch = Batch.objects.get(pk=options['batch'])
+        except (Exam.DoesNotExist, Batch.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as upload:
+                report = import_marks(
+                    upload,
+                    options['path'],
+                    batch,
+                    exam=exam,
+                    skip_invalid=options['skip_invalid'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for sheet, row_number, message in report['errors']:
+            self.stdout.write(self.style.ERROR(f"{sheet} row {row_number or '-'}: {message}"))
+        if report['error_count'] > len(report['errors']):
+            self.stdout.write(f"... and {report['error_count'] - len(report['errors'])} more errors")
+        if report['error_report']:
+            self.stdout.write(f"Error report saved to {error_report_path(report['error_report'])}")
+
+        summary = (
+            f"{report['sheets']} sheets, {report['rows']} rows, {report['error_count']} errors, "
+            f"{report['imported']} valid marks in {time.perf_counter() - started:.2f}s"
+        )
+        if report['committed']:
+            self.stdout.write(self.style.SUCCESS(f"Imported: {summary}."))
+        elif report['dry_run']:
+            self.stdout.write(f"[dry run] {summary}; nothing written.")
+        else:
+            self.stdout.write(self.style.WARNING(f"Nothing imported ({summary}); fix the errors or pass --skip-invalid."))
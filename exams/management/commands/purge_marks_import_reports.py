@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from exams.imports import purge_error_reports
+
+
+class Command(BaseCommand):
+    help = 'Delete marks-import error reports older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=settings.EXAMS_IMPORT_REPORT_RETENTION_HOURS,
+            help='Delete reports older than this many hours'
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_error_reports(max_age=timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} marks import error reports.'))
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from exams.models import Exam
+from exams.stats import compute_exam_stats, invalidate_exam_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached ExamStats of every exam (or only stale ones with --stale)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale', action='store_true', help='Only exams whose marks changed since the last computation')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        exams = Exam.objects.all()
+        if options['stale']:
+            exams = exams.exclude(stats__computed_version=F('stats__version'))
+        computed = 0
+        for exam_id in exams.values_list('pk', flat=True).iterator():
+            if not options['stale']:
+                invalidate_exam_stats(exam_id)
+            compute_exam_stats(exam_id)
+            computed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed stats for {computed} exams in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,68 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import Mark
+from .signals import marks_saved
+
+# Mark.marks_obtained is DecimalField(max_digits=5, decimal_places=2)
+MAX_STORABLE_MARKS = Decimal('999.99')
+
+
+def parse_marks(exam, raw_marks):
+    """
+    Validate submitted marks in memory against `exam.total_marks`.
+    `raw_marks` maps student (user) id -> the submitted string; blank values
+    are skipped. Returns ({student_id: Decimal}, {student_id: error message}).
+    """
+    marks, errors = {}, {}
+    for student_id, value in raw_marks.items():
+        value = (value or '').strip()
+        if not value:
+            continue
+        try:
+            marks_obtained = Decimal(value)
+        except InvalidOperation:
+            marks_obtained = None
+        if marks_obtained is None or not marks_obtained.is_finite():
+            errors[student_id] = 'Enter a number.'
+        elif marks_obtained < 0:
+            errors[student_id] = 'Marks cannot be negative.'
+        elif marks_obtained > min(exam.total_marks, MAX_STORABLE_MARKS):
+            errors[student_id] = f'Marks cannot exceed {min(exam.total_marks, MAX_STORABLE_MARKS)}.'
+        elif marks_obtained != marks_obtained.quantize(Decimal('0.01')):
+            errors[student_id] = 'Use at most two decimal places.'
+        else:
+            marks[student_id] = marks_obtained
+    return marks, errors
+
+
+def record_marks(exam, marks):
+    """
+    Save an exam's marks ({student_id: Decimal}) with a single bulk upsert.
+    Returns {student_id: (old_marks, new_marks)} for the marks that changed,
+    worked out against one read of the exam's existing marks.
+    """
+    if not marks:
+        return {}
+    with transaction.atomic():
+        existing = dict(
+            Mark.objects.filter(exam=exam, student_id__in=marks).values_list('student_id', 'marks_obtained')
+        )
+        Mark.objects.bulk_create(
+            [
+                Mark(exam=exam, student_id=student_id, marks_obtained=marks_obtained)
+                for student_id, marks_obtained in marks.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['exam', 'student'],
+            update_fields=['marks_obtained'],
+        )
+        changes = {
+            student_id: (existing.get(student_id), marks_obtained)
+            for student_id, marks_obtained in marks.items()
+            if existing.get(student_id) != marks_obtained
+        }
+        if changes:
+            marks_saved.send(sender=Mark, exam=exam, changes=changes)
+    return changes
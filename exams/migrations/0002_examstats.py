@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamStats',
+            fields=[
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='exams.exam')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('computed_version', models.PositiveIntegerField(blank=True, null=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('median', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('highest', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('lowest', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('percentiles', models.JSONField(blank=True, default=dict)),
+                ('ranks', models.JSONField(blank=True, default=list)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'exam stats',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('batches', '0001_initial'),
+        ('core', '0001_initial'),
+        ('exams', '0002_examstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchResults',
+            fields=[
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='results', serialize=False, to='batches.batch')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'batch results',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportCard',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='report_card', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('data', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_cards', to='batches.batch')),
+            ],
+        ),
+    ]
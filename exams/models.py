@@ -21,3 +21,72 @@ class Mark(models.Model):
 
     def __str__(self):
         return f"{self.student.username} - {self.exam.title}: {self.marks_obtained}"
+
+class ExamStats(models.Model):
+    """
+    Cached statistics and rank list of one exam, maintained by exams.stats.
+    Writers bump `version` whenever the exam's marks change; the row is
+    current only while `computed_version == version`, so a recompute racing
+    a write can never be mistaken for fresh.
+    """
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    version = models.PositiveIntegerField(default=0)
+    computed_version = models.PositiveIntegerField(null=True, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    mean = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    median = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    highest = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    lowest = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    # {"25": marks, "50": ..., "75": ..., "90": ...}
+    percentiles = models.JSONField(default=dict, blank=True)
+    # [[student_id, marks, rank, percentile], ...] best first
+    ranks = models.JSONField(default=list, blank=True)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'exam stats'
+
+    @property
+    def is_current(self):
+        return self.computed_version == self.version
+
+    def rank_of(self, student_id):
+        """
+        (rank, percentile) of a student, or None if they have no mark.
+        """
+        if not hasattr(self, '_rank_map'):
+            self._rank_map = {row[0]: (row[2], row[3]) for row in self.ranks}
+        return self._rank_map.get(student_id)
+
+    def __str__(self):
+        return f"Stats for {self.exam_id} (v{self.version})"
+
+class BatchResults(models.Model):
+    """
+    Results version of a batch: bumped whenever marks of one of its exams
+    change. Report cards built from an older version are stale.
+    """
+    batch = models.OneToOneField('batches.Batch', on_delete=models.CASCADE, primary_key=True, related_name='results')
+    version = models.PositiveIntegerField(default=0)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'batch results'
+
+    def __str__(self):
+        return f"Results of batch {self.batch_id} (v{self.version})"
+
+class ReportCard(models.Model):
+    """
+    Precomputed report card of a student (exam results with percentage,
+    rank and class context, plus per-subject trends), built for a whole batch
+    at once by exams.report_cards.
+    """
+    student = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='report_card')
+    batch = models.ForeignKey('batches.Batch', on_delete=models.CASCADE, related_name='report_cards')
+    version = models.PositiveIntegerField(default=0)
+    data = models.JSONField(default=dict)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Report card of {self.student_id} (v{self.version})"
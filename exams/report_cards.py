@@ -0,0 +1,143 @@
+import logging
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BatchResults, Mark, ReportCard
+from .stats import exam_stats_for
+
+logger = logging.getLogger(__name__)
+
+
+def invalidate_report_cards(batch_id):
+    """
+    Mark every report card of a batch stale (one F() UPDATE, creating the
+    version row the first time). Runs in the writer's transaction.
+    """
+    if batch_id is None:
+        return
+    rows = BatchResults.objects.filter(batch_id=batch_id)
+    if rows.update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            BatchResults.objects.create(batch_id=batch_id, version=1)
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(version=F('version') + 1)
+
+
+def _percentage(marks, total):
+    return round(float(marks) * 100 / total, 1) if total else None
+
+
+def _card(exam_rows, student_id, stats):
+    """
+    Report card data of one student from their (chronological) mark rows.
+    """
+    exams = []
+    subjects = defaultdict(list)
+    scored = total = 0
+    for exam_id, marks, title, date, total_marks, subject in exam_rows:
+        exam_stats = stats[exam_id]
+        rank = exam_stats.rank_of(student_id)
+        percentage = _percentage(marks, total_marks)
+        exams.append({
+            'title': title,
+            'subject': subject or 'General',
+            'date': date.strftime('%b %d, %Y'),
+            'marks': float(marks),
+            'total': total_marks,
+            'percentage': percentage,
+            'rank': rank[0] if rank else None,
+            'of': exam_stats.count,
+            'class_average': float(exam_stats.mean) if exam_stats.mean is not None else None,
+            'highest': float(exam_stats.highest) if exam_stats.highest is not None else None,
+        })
+        subjects[subject or 'General'].append(percentage)
+        scored += marks
+        total += total_marks
+
+    trends = []
+    for name, percentages in sorted(subjects.items()):
+        trends.append({
+            'subject': name,
+            'percentages': percentages,
+            'average': round(sum(percentages) / len(percentages), 1),
+            'change': round(percentages[-1] - percentages[-2], 1) if len(percentages) > 1 else None,
+        })
+    exams.reverse()  # latest first
+    return {'overall': _percentage(scored, total), 'exams': exams, 'subjects': trends}
+
+
+def build_report_cards(batch_id, student_ids=None):
+    """
+    Build the report card of every student in a batch (or only `student_ids`
+    of it): one query for all their marks, one for the exam stats
+    (recomputing only stale ones) and a bulk upsert of the cards, whatever
+    the batch size. Cards are tagged with the batch's results version read
+    at the start, so a build racing a marks change leaves them stale rather
+    than wrong. Returns the number of cards built.
+    """
+    from students.models import StudentProfile
+
+    results, _ = BatchResults.objects.get_or_create(batch_id=batch_id)
+    version = results.version
+    members = StudentProfile.objects.filter(batch_id=batch_id)
+    marks = Mark.objects.filter(student__student_profile__batch_id=batch_id)
+    if student_ids is not None:
+        members = members.filter(user_id__in=student_ids)
+        marks = marks.filter(student_id__in=student_ids)
+
+    rows = defaultdict(list)
+    for student_id, *row in marks.order_by('exam__date', 'exam_id').values_list(
+        'student_id', 'exam_id', 'marks_obtained', 'exam__title', 'exam__date', 'exam__total_marks', 'exam__subject__name'
+    ):
+        rows[student_id].append(row)
+    stats = exam_stats_for({row[0] for student_rows in rows.values() for row in student_rows})
+
+    cards = [
+        ReportCard(
+            student_id=student_id, batch_id=batch_id, version=version,
+            data=_card(rows.get(student_id, []), student_id, stats)
+        )
+        for student_id in members.values_list('user_id', flat=True)
+    ]
+    ReportCard.objects.bulk_create(
+        cards,
+        update_conflicts=True,
+        unique_fields=['student'],
+        update_fields=['batch', 'version', 'data', 'built_at'],
+        batch_size=500,
+    )
+    logger.info(f"Built {len(cards)} report cards for batch {batch_id} (v{version})")
+    return len(cards)
+
+
+def publish_results(batch_id):
+    """
+    Build a batch's report cards right away (after marks are saved) so the
+    students opening them next are served precomputed rows.
+    """
+    count = build_report_cards(batch_id)
+    BatchResults.objects.filter(batch_id=batch_id).update(published_at=timezone.now())
+    return count
+
+
+def report_card_for(user):
+    """
+    The student's current report card: one query when it is fresh. A stale
+    card rebuilds the student's whole batch once (its classmates' cards are
+    stale too); a missing one, e.g. after joining a batch, only their own.
+    """
+    card = ReportCard.objects.select_related('batch__results').filter(student=user).first()
+    if card and card.version == card.batch.results.version:
+        return card
+    from students.models import StudentProfile
+    batch_id = StudentProfile.objects.filter(user=user).values_list('batch_id', flat=True).first()
+    if batch_id is None:
+        return None
+    build_report_cards(batch_id, student_ids=None if card else [user.pk])
+    return ReportCard.objects.filter(student=user).first()
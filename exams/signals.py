@@ -0,0 +1,49 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from batches.models import Batch
+from students.models import StudentProfile
+from .models import Exam, Mark, ReportCard
+from .report_cards import invalidate_report_cards
+from .stats import invalidate_exam_stats
+
+# Sent by exams.marking.record_marks after a bulk upsert, which fires no
+# post_save. Arguments: exam, changes ({student_id: (old_marks, new_marks)}).
+# Sent inside the writing transaction.
+marks_saved = Signal()
+
+def _deleted_with(origin, model):
+    return origin is not None and getattr(origin, 'model', type(origin)) is model
+
+@receiver(post_save, sender=Mark)
+def invalidate_results_on_mark_save(sender, instance, **kwargs):
+    invalidate_exam_stats(instance.exam_id)
+    invalidate_report_cards(instance.exam.batch_id)
+
+@receiver(post_delete, sender=Mark)
+def invalidate_results_on_mark_delete(sender, instance, origin=None, **kwargs):
+    # Marks removed with their exam or batch go with its stats and cards
+    if _deleted_with(origin, Exam) or _deleted_with(origin, Batch):
+        return
+    invalidate_exam_stats(instance.exam_id)
+    invalidate_report_cards(instance.exam.batch_id)
+
+@receiver(marks_saved)
+def invalidate_results_on_bulk_save(sender, exam, changes, **kwargs):
+    invalidate_exam_stats(exam.pk)
+    invalidate_report_cards(exam.batch_id)
+
+@receiver(post_save, sender=Exam)
+def invalidate_report_cards_on_exam_save(sender, instance, created, **kwargs):
+    # Title, date, subject and total marks are printed on the cards
+    if not created:
+        invalidate_report_cards(instance.batch_id)
+
+@receiver(post_delete, sender=Exam)
+def invalidate_report_cards_on_exam_delete(sender, instance, origin=None, **kwargs):
+    if not _deleted_with(origin, Batch):
+        invalidate_report_cards(instance.batch_id)
+
+@receiver(post_save, sender=StudentProfile)
+def drop_report_card_on_batch_change(sender, instance, **kwargs):
+    ReportCard.objects.filter(student_id=instance.user_id).exclude(batch_id=instance.batch_id).delete()
@@ -0,0 +1,98 @@
+import logging
+import statistics
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Window
+from django.db.models.functions import PercentRank, Rank
+from django.utils import timezone
+
+from .models import ExamStats, Mark
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (25, 50, 75, 90)
+
+
+def invalidate_exam_stats(exam_id):
+    """
+    Mark an exam's stats stale (one F() UPDATE, creating the row the first
+    time). Runs in the writer's transaction.
+    """
+    rows = ExamStats.objects.filter(exam_id=exam_id)
+    if rows.update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ExamStats.objects.create(exam_id=exam_id, version=1)
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(version=F('version') + 1)
+
+
+def _nearest_rank(ascending, percentile):
+    index = max(0, -(-percentile * len(ascending) // 100) - 1)
+    return ascending[index]
+
+
+def _two_places(value):
+    return value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def compute_exam_stats(exam_id):
+    """
+    Recompute one exam's stats from a single query: ranks and percent ranks
+    come from window functions, and the mean, median and percentiles are
+    taken in Python from the same ordered rows. The result is stored only if
+    no write bumped the version meanwhile.
+    """
+    stats, _ = ExamStats.objects.get_or_create(exam_id=exam_id)
+    version = stats.version
+
+    rows = list(
+        Mark.objects.filter(exam_id=exam_id)
+        .annotate(
+            rank=Window(Rank(), order_by=F('marks_obtained').desc()),
+            percent_rank=Window(PercentRank(), order_by=F('marks_obtained').asc()),
+        )
+        .order_by('-marks_obtained', 'student_id')
+        .values_list('student_id', 'marks_obtained', 'rank', 'percent_rank')
+    )
+    scores = [row[1] for row in rows]
+    ascending = scores[::-1]
+
+    stats.count = len(scores)
+    stats.mean = _two_places(sum(scores) / len(scores)) if scores else None
+    stats.median = _two_places(statistics.median(scores)) if scores else None
+    stats.highest = scores[0] if scores else None
+    stats.lowest = scores[-1] if scores else None
+    stats.percentiles = {
+        str(percentile): float(_nearest_rank(ascending, percentile)) for percentile in PERCENTILES
+    } if scores else {}
+    stats.ranks = [
+        [student_id, float(marks), rank, round(percent_rank * 100)]
+        for student_id, marks, rank, percent_rank in rows
+    ]
+    stats.computed_at = timezone.now()
+    stats.computed_version = version
+
+    fields = ['count', 'mean', 'median', 'highest', 'lowest', 'percentiles', 'ranks', 'computed_at', 'computed_version']
+    stored = ExamStats.objects.filter(exam_id=exam_id, version=version).update(
+        **{field: getattr(stats, field) for field in fields}
+    )
+    if not stored:
+        logger.info(f"Marks of exam {exam_id} changed while computing its stats; they stay stale")
+    return stats
+
+
+def exam_stats_for(exam_ids):
+    """
+    {exam_id: ExamStats} for several exams with one query; only exams whose
+    marks changed since their last computation are recomputed.
+    """
+    exam_ids = list(exam_ids)
+    stats = ExamStats.objects.in_bulk(exam_ids)
+    for exam_id in exam_ids:
+        if exam_id not in stats or not stats[exam_id].is_current:
+            stats[exam_id] = compute_exam_stats(exam_id)
+    return stats
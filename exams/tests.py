@@ -1,3 +1,219 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from math import ceil
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from core.models import User
+from batches.models import Batch
+from students.models import StudentProfile
+from .imports import purge_error_reports, sheet_title
+from .models import Exam, ExamStats, Mark, ReportCard
+from .stats import exam_stats_for
 
-# Create your tests here.
+
+class ExamMarksTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create(username='teacher', is_teacher=True))
+
+    def _exam(self, name, size):
+        batch = Batch.objects.create(name=name, start_date=date(2026, 1, 1))
+        users = User.objects.bulk_create([User(username=f'{name}-{i}', is_student=True) for i in range(size)])
+        StudentProfile.objects.bulk_create([StudentProfile(user=user, batch=batch) for user in users])
+        exam = Exam.objects.create(title=name, batch=batch, date=date(2026, 2, 1), total_marks=100)
+        return exam, [user.pk for user in User.objects.filter(username__startswith=f'{name}-')]
+
+    def _queries(self, method, exam, data=None):
+        url = reverse('exam_marks', args=[exam.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertEqual(response.status_code, 302 if method == 'post' and data else 200)
+        return len(queries)
+
+    def _upsert_statements(self, rows):
+        # Backends with a bound-parameter limit (SQLite: 999) split one bulk_create into several INSERTs.
+        # A save upserts the marks, then the batch's report cards (batch_size=500).
+        statements = 0
+        for model, batch_size in ((Mark, rows), (ReportCard, 500)):
+            fields = [field for field in model._meta.concrete_fields if not field.auto_created]
+            statements += ceil(rows / min(batch_size, connection.ops.bulk_batch_size(fields, [None] * rows)))
+        return statements
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small, small_ids = self._exam('small', 10)
+        large, large_ids = self._exam('large', 500)
+
+        def marks(ids):
+            return {f'marks_{pk}': str(i % 100) for i, pk in enumerate(ids)}
+
+        def post_queries(exam, ids):
+            return self._queries('post', exam, marks(ids)) - self._upsert_statements(len(ids))
+
+        self.assertEqual(post_queries(small, small_ids), post_queries(large, large_ids))
+        self.assertEqual(Mark.objects.filter(exam=large).count(), 500)
+        # Resubmitting updates in place
+        self.assertEqual(post_queries(small, small_ids), post_queries(large, large_ids))
+        self.assertEqual(Mark.objects.count(), 510)
+        self.assertEqual(self._queries('get', small), self._queries('get', large))
+
+    def test_invalid_marks_save_nothing(self):
+        exam, ids = self._exam('b', 3)
+        response = self.client.post(reverse('exam_marks', args=[exam.pk]), {
+            f'marks_{ids[0]}': '80', f'marks_{ids[1]}': '101', f'marks_{ids[2]}': 'abc',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.context['errors']), {ids[1], ids[2]})
+        self.assertFalse(Mark.objects.exists())
+
+    def test_stats_are_cached_until_marks_change(self):
+        exam, ids = self._exam('b', 4)
+        self.client.post(reverse('exam_marks', args=[exam.pk]), {
+            f'marks_{ids[0]}': '90', f'marks_{ids[1]}': '70', f'marks_{ids[2]}': '70', f'marks_{ids[3]}': '40',
+        })
+        stats = exam_stats_for([exam.pk])[exam.pk]
+        self.assertEqual((stats.count, stats.mean, stats.median, stats.highest), (4, 67.5, 70, 90))
+        self.assertEqual([row[2] for row in stats.ranks], [1, 2, 2, 4])
+        self.assertEqual(stats.rank_of(ids[3]), (4, 0))
+
+        # Served from the row: a single SELECT, no recomputation
+        with self.assertNumQueries(1):
+            exam_stats_for([exam.pk])
+
+        Mark.objects.filter(exam=exam, student_id=ids[3]).get().delete()
+        self.assertFalse(ExamStats.objects.get(exam=exam).is_current)
+        stats = exam_stats_for([exam.pk])[exam.pk]
+        self.assertEqual((stats.count, stats.lowest), (3, 70))
+
+    def test_saving_marks_publishes_report_cards_served_in_one_query(self):
+        exam, ids = self._exam('b', 30)
+        self.client.post(reverse('exam_marks', args=[exam.pk]), {f'marks_{pk}': str(50 + i) for i, pk in enumerate(ids)})
+        self.assertEqual(ReportCard.objects.filter(batch=exam.batch).count(), 30)
+
+        student = User.objects.get(pk=ids[0])
+        self.client.force_login(student)
+        # Session, user and the report card
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('student_marks'))
+        result = response.context['card']['exams'][0]
+        self.assertEqual((result['marks'], result['rank'], result['of']), (50.0, 30, 30))
+
+        # A single edit makes the batch's cards stale; the next read rebuilds them
+        Mark.objects.filter(exam=exam, student=student).update(marks_obtained=99)
+        mark = Mark.objects.get(exam=exam, student=student)
+        mark.save()
+        response = self.client.get(reverse('student_marks'))
+        self.assertEqual(response.context['card']['exams'][0]['rank'], 1)
+
+    def test_editing_an_exam_republishes_its_batches_report_cards(self):
+        exam, ids = self._exam('b', 5)
+        self.client.post(reverse('exam_marks', args=[exam.pk]), {f'marks_{pk}': '60' for pk in ids})
+        teacher = User.objects.get(username='teacher')
+
+        def edit_and_view(title, batch):
+            self.client.force_login(teacher)
+            response = self.client.post(reverse('exam_edit', args=[exam.pk]), {
+                'title': title, 'batch': batch.pk, 'date': '2026-02-01', 'total_marks': 100,
+            })
+            self.assertEqual(response.status_code, 302)
+            self.client.force_login(User.objects.get(pk=ids[0]))
+            # Rebuilt by the edit: session, user and the fresh report card
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('student_marks'))
+            return [result['title'] for result in response.context['card']['exams']]
+
+        self.assertEqual(edit_and_view('Renamed', exam.batch), ['Renamed'])
+        # Moved to another batch: the students who sat it still list it, so
+        # the batch it left is republished too
+        other = Batch.objects.create(name='o', start_date=date(2026, 1, 1))
+        self.assertEqual(edit_and_view('Moved', other), ['Moved'])
+
+    def test_gradebook_pivots_each_page_in_constant_queries_and_exports(self):
+        exam, ids = self._exam('b', 60)
+        later = Exam.objects.create(title='later', batch=exam.batch, date=date(2026, 3, 1), total_marks=50)
+        Mark.objects.bulk_create(
+            [Mark(exam=exam, student_id=pk, marks_obtained=80) for pk in ids]
+            + [Mark(exam=later, student_id=pk, marks_obtained=20) for pk in ids[::2]]
+        )
+        url = reverse('batch_gradebook', args=[exam.batch_id])
+        # Session, user, batch, exams, student count, student page, marks
+        with self.assertNumQueries(7):
+            response = self.client.get(url)
+        rows = response.context['rows']
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(rows[0]['marks'], [80, 20])
+        self.assertEqual(str(rows[0]['percentage']), '66.7')
+        self.assertEqual(rows[1]['marks'], [80, None])
+
+        import openpyxl
+        response = self.client.get(reverse('export_gradebook', args=[exam.batch_id]))
+        sheet = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        table = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(len(table), 61)
+        self.assertEqual(table[1][2:], (80, 20, 66.7))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_workbook_import_saves_each_sheet_once_or_reports_errors(self):
+        import openpyxl
+        exam, ids = self._exam('b', 5)
+        second = Exam.objects.create(title='Unit Test 2', batch=exam.batch, date=date(2026, 3, 1), total_marks=20)
+
+        def workbook(bad_rows=()):
+            book = openpyxl.Workbook()
+            first_sheet = book.active
+            first_sheet.title = sheet_title(exam)
+            first_sheet.append(['Username', 'Marks'])
+            for i in range(5):
+                first_sheet.append([f'B-{i}', 60 + i])
+            second_sheet = book.create_sheet('unit test 2')
+            second_sheet.append(['student', 'score'])
+            second_sheet.append(['b-0', 15.5])
+            for row in bad_rows:
+                second_sheet.append(row)
+            output = io.BytesIO()
+            book.save(output)
+            output.seek(0)
+            output.name = 'marks.xlsx'
+            return output
+
+        url = reverse('import_batch_marks', args=[exam.batch_id])
+        report = self.client.post(url, {'file': workbook([['b-1', 25], ['nobody', 3]])}).context['report']
+        self.assertFalse(report['committed'])
+        self.assertEqual(report['errors'], [
+            ('unit test 2', 4, "No student 'nobody' in b"),
+            ('unit test 2', 3, 'Marks cannot exceed 20.'),
+        ])
+        self.assertFalse(Mark.objects.exists())
+        response = self.client.get(reverse('marks_import_errors', args=[report['error_report']]))
+        self.assertIn(b'unit test 2,3,b-1,25,Marks cannot exceed 20.', b''.join(response.streaming_content))
+
+        report = self.client.post(url, {'file': workbook()}).context['report']
+        self.assertTrue(report['committed'])
+        self.assertEqual((report['sheets'], report['imported'], report['error_report']), (2, 6, None))
+        self.assertEqual(Mark.objects.get(exam=exam, student_id=ids[4]).marks_obtained, 64)
+        self.assertEqual(Mark.objects.get(exam=second, student_id=ids[0]).marks_obtained, Decimal('15.5'))
+        self.assertEqual(ReportCard.objects.get(student_id=ids[0]).data['exams'][0]['marks'], 15.5)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_unreadable_uploads_are_reported_and_old_error_reports_purged(self):
+        exam, ids = self._exam('b', 2)
+        for name, content, message in (
+            ('marks.csv', 'username,marks\nJos\xe9,5\n'.encode('cp1252'), 'not UTF-8'),
+            ('marks.xlsx', b'username,marks\n', 'not a valid .xlsx'),
+        ):
+            upload = io.BytesIO(content)
+            upload.name = name
+            response = self.client.post(reverse('import_exam_marks', args=[exam.pk]), {'file': upload})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(message, str(list(response.context['messages'])[-1]))
+        self.assertFalse(Mark.objects.exists())
+
+        upload = io.BytesIO(b'username,marks\nnobody,5\n')
+        upload.name = 'marks.csv'
+        name = self.client.post(reverse('import_exam_marks', args=[exam.pk]), {'file': upload}).context['report']['error_report']
+        self.assertEqual(purge_error_reports(), 0)
+        self.assertEqual(purge_error_reports(now=timezone.now() + timedelta(days=2)), 1)
+        self.assertEqual(self.client.get(reverse('marks_import_errors', args=[name])).status_code, 404)
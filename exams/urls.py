@@ -7,5 +7,12 @@ urlpatterns = [
     path('<int:pk>/edit/', views.exam_edit, name='exam_edit'),
     path('<int:pk>/delete/', views.exam_delete, name='exam_delete'),
     path('<int:exam_id>/marks/', views.exam_marks, name='exam_marks'),
+    path('<int:exam_id>/stats/', views.exam_stats, name='exam_stats'),
+    path('batch/<int:batch_id>/gradebook/', views.batch_gradebook, name='batch_gradebook'),
+    path('batch/<int:batch_id>/gradebook.xlsx', views.export_gradebook, name='export_gradebook'),
+    path('<int:exam_id>/import/', views.import_exam_marks, name='import_exam_marks'),
+    path('batch/<int:batch_id>/import/', views.import_batch_marks, name='import_batch_marks'),
+    path('batch/<int:batch_id>/import-template.xlsx', views.marks_import_template, name='marks_import_template'),
+    path('import-errors/<slug:name>.csv', views.marks_import_errors, name='marks_import_errors'),
     path('my-marks/', views.student_marks, name='student_marks'),
 ]
@@ -1,9 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.http import FileResponse, Http404
+from django.core.files.storage import default_storage
 from .models import Exam, Mark
 from .forms import ExamForm
+from .marking import parse_marks, record_marks
+from .stats import exam_stats_for
+from .report_cards import publish_results, report_card_for
+from .imports import ImportFileError, error_report_path, import_marks, import_template_file
+from .gradebook import GRADEBOOK_PAGE_SIZE, gradebook_exams, gradebook_students, gradebook_xlsx_file, pivot_marks
+from batches.models import Batch
 from students.models import StudentProfile
+from core.models import User
 
 def is_teacher(user):
     return user.is_authenticated and user.is_teacher
@@ -11,9 +21,105 @@ def is_teacher(user):
 @login_required
 @user_passes_test(is_teacher)
 def exam_list(request):
-    exams = Exam.objects.all().order_by('-date')
+    exams = list(Exam.objects.select_related('batch', 'subject').order_by('-date'))
+    # Cached per-exam stats, one query (only exams with changed marks are recomputed)
+    stats = exam_stats_for(exam.pk for exam in exams)
+    for exam in exams:
+        exam.summary = stats[exam.pk]
     return render(request, 'exams/exam_list.html', {'exams': exams})
 
+@login_required
+@user_passes_test(is_teacher)
+def exam_stats(request, exam_id):
+    exam = get_object_or_404(Exam.objects.select_related('batch', 'subject'), pk=exam_id)
+    stats = exam_stats_for([exam.pk])[exam.pk]
+    names = {
+        user_id: f'{first_name} {last_name}'.strip() or username
+        for user_id, first_name, last_name, username in User.objects.filter(
+            pk__in=[row[0] for row in stats.ranks]
+        ).values_list('id', 'first_name', 'last_name', 'username')
+    }
+    rank_list = [
+        {'name': names.get(student_id, '-'), 'marks': marks, 'rank': rank, 'percentile': percentile}
+        for student_id, marks, rank, percentile in stats.ranks
+    ]
+    return render(request, 'exams/exam_stats.html', {'exam': exam, 'stats': stats, 'rank_list': rank_list})
+
+@login_required
+@user_passes_test(is_teacher)
+def batch_gradebook(request, batch_id):
+    batch = get_object_or_404(Batch, pk=batch_id)
+    exams = gradebook_exams(batch.pk)
+    page = Paginator(gradebook_students(batch.pk), GRADEBOOK_PAGE_SIZE).get_page(request.GET.get('page'))
+    # One marks query for the page, pivoted in memory
+    rows = pivot_marks(exams, page.object_list)
+    return render(request, 'exams/gradebook.html', {'batch': batch, 'exams': exams, 'page': page, 'rows': rows})
+
+@login_required
+@user_passes_test(is_teacher)
+def export_gradebook(request, batch_id):
+    batch = get_object_or_404(Batch, pk=batch_id)
+    # Written in write-only mode to a temporary file, then streamed from disk
+    return FileResponse(
+        gradebook_xlsx_file(batch),
+        as_attachment=True,
+        filename=f'gradebook-{batch.name}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+def _import_marks(request, batch, exam=None):
+    report = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Choose a CSV or XLSX file to import.')
+        else:
+            try:
+                report = import_marks(
+                    upload,
+                    upload.name,
+                    batch,
+                    exam=exam,
+                    skip_invalid=bool(request.POST.get('skip_invalid')),
+                    dry_run=bool(request.POST.get('dry_run'))
+                )
+            except ImportFileError as e:
+                messages.error(request, str(e))
+            else:
+                if report['committed']:
+                    messages.success(request, f"Imported {report['imported']} marks.")
+    return render(request, 'exams/import_marks.html', {'batch': batch, 'exam': exam, 'report': report})
+
+@login_required
+@user_passes_test(is_teacher)
+def import_exam_marks(request, exam_id):
+    exam = get_object_or_404(Exam.objects.select_related('batch'), pk=exam_id)
+    return _import_marks(request, exam.batch, exam)
+
+@login_required
+@user_passes_test(is_teacher)
+def import_batch_marks(request, batch_id):
+    return _import_marks(request, get_object_or_404(Batch, pk=batch_id))
+
+@login_required
+@user_passes_test(is_teacher)
+def marks_import_template(request, batch_id):
+    batch = get_object_or_404(Batch, pk=batch_id)
+    return FileResponse(
+        import_template_file(batch),
+        as_attachment=True,
+        filename=f'marks-{batch.name}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+@login_required
+@user_passes_test(is_teacher)
+def marks_import_errors(request, name):
+    path = error_report_path(name)
+    if not default_storage.exists(path):
+        raise Http404
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True, filename='marks-import-errors.csv')
+
 @login_required
 @user_passes_test(is_teacher)
 def exam_create(request):
@@ -30,29 +136,31 @@ def exam_create(request):
 @login_required
 @user_passes_test(is_teacher)
 def exam_marks(request, exam_id):
-    exam = get_object_or_404(Exam, pk=exam_id)
-    students = exam.batch.students.all()
-    
-    if request.method == 'POST':
-        for student in students:
-            marks_obtained = request.POST.get(f'marks_{student.user.id}')
-            if marks_obtained:
-                Mark.objects.update_or_create(
-                    exam=exam,
-                    student=student.user,
-                    defaults={'marks_obtained': marks_obtained}
-                )
-        messages.success(request, 'Marks updated successfully.')
-        return redirect('exam_list')
+    exam = get_object_or_404(Exam.objects.select_related('batch'), pk=exam_id)
+    students = list(exam.batch.students.select_related('user'))
+    errors = {}
 
-    # Fetch existing marks
-    existing_marks = Mark.objects.filter(exam=exam)
-    marks_map = {mark.student.id: mark.marks_obtained for mark in existing_marks}
+    if request.method == 'POST':
+        # Validated in memory, then written with one bulk upsert
+        raw_marks = {student.user_id: request.POST.get(f'marks_{student.user_id}') for student in students}
+        marks, errors = parse_marks(exam, raw_marks)
+        if not errors:
+            record_marks(exam, marks)
+            # Build the batch's report cards now, before students open them
+            publish_results(exam.batch_id)
+            messages.success(request, 'Marks updated successfully.')
+            return redirect('exam_list')
+        messages.error(request, 'Some marks are invalid. Nothing was saved.')
+        marks_map = {student_id: value for student_id, value in raw_marks.items() if value}
+    else:
+        # Fetch existing marks
+        marks_map = dict(Mark.objects.filter(exam=exam).values_list('student_id', 'marks_obtained'))
 
     return render(request, 'exams/exam_marks.html', {
         'exam': exam,
         'students': students,
-        'marks_map': marks_map
+        'marks_map': marks_map,
+        'errors': errors,
     })
 
 @login_required
@@ -60,8 +168,9 @@ def student_marks(request):
     if not request.user.is_student:
         return redirect('dashboard')
     
-    marks = Mark.objects.filter(student=request.user).order_by('-exam__date')
-    return render(request, 'exams/student_marks.html', {'marks': marks})
+    # Precomputed when marks are saved: one query for a fresh card
+    card = report_card_for(request.user)
+    return render(request, 'exams/student_marks.html', {'card': card.data if card else {}})
 
 @login_required
 @user_passes_test(is_teacher)
@@ -70,11 +179,16 @@ def exam_edit(request, pk):
     Allow teachers to edit exams.
     """
     exam = get_object_or_404(Exam, pk=pk)
+    old_batch_id = exam.batch_id
     
     if request.method == 'POST':
         form = ExamForm(request.POST, instance=exam)
         if form.is_valid():
             form.save()
+            # The exam is printed on every card of its batch: rebuild them
+            # once here rather than on each student's next visit
+            for batch_id in {old_batch_id, exam.batch_id}:
+                publish_results(batch_id)
             messages.success(request, 'Exam updated successfully.')
             return redirect('exam_list')
     else:
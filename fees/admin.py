@@ -1,8 +1,26 @@
 from django.contrib import admin
-from .models import FeePayment
+from django.utils import timezone
+from .models import FeePayment, FeeRollup, StudentFeeStatus
 
 @admin.register(FeePayment)
 class FeePaymentAdmin(admin.ModelAdmin):
-    list_display = ('student', 'amount', 'date', 'transaction_id')
-    list_filter = ('date',)
+    list_display = ('student', 'amount', 'date', 'batch', 'transaction_id')
+    list_filter = ('date', 'batch')
     search_fields = ('student__username', 'student__first_name', 'student__last_name', 'transaction_id', 'remarks')
+
+@admin.register(StudentFeeStatus)
+class StudentFeeStatusAdmin(admin.ModelAdmin):
+    list_display = ('student', 'last_payment_date', 'next_due_date', 'days_overdue', 'updated_at')
+    list_filter = ('next_due_date',)
+    search_fields = ('student__username', 'student__first_name', 'student__last_name')
+    readonly_fields = ('student', 'last_payment_date', 'next_due_date', 'updated_at')
+
+    @admin.display(description='Days overdue')
+    def days_overdue(self, obj):
+        return obj.days_overdue_on(timezone.now().date())
+
+@admin.register(FeeRollup)
+class FeeRollupAdmin(admin.ModelAdmin):
+    list_display = ('period', 'period_start', 'batch', 'total', 'payment_count')
+    list_filter = ('period', 'batch')
+    readonly_fields = ('period', 'period_start', 'batch', 'total', 'payment_count')
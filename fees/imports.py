@@ -0,0 +1,247 @@
+import csv
+import datetime
+import io
+import logging
+import re
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import FeePayment
+from .rollups import record_new_payments
+from .status import refresh_fee_status
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 500
+# Errors kept for the report; further ones are only counted
+MAX_REPORTED_ERRORS = 500
+
+# Accepted header names (case-insensitive) for each column
+COLUMN_ALIASES = {
+    'student': ('student', 'username', 'phone', 'phone_number', 'mobile'),
+    'amount': ('amount', 'amount_paid', 'paid'),
+    'date': ('date', 'payment_date', 'paid_on'),
+    'transaction_id': ('transaction_id', 'transaction', 'txn_id', 'reference', 'utr'),
+    'remarks': ('remarks', 'note', 'notes'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+
+
+class ImportFileError(ValueError):
+    """
+    The upload can't be read at all (unknown format or encoding, corrupt
+    workbook, missing columns).
+    """
+
+
+def _normalize_phone(value):
+    digits = re.sub(r'\D', '', str(value))
+    # Match with or without the country code
+    return digits[-10:] if len(digits) >= 10 else digits
+
+
+def _student_lookup():
+    """
+    One query for every student: username and phone -> (user id, batch id).
+    Phones shared by several students map to None so they are reported.
+    """
+    from students.models import StudentProfile
+
+    by_username = {}
+    by_phone = {}
+    for user_id, username, phone, batch_id in StudentProfile.objects.filter(
+        user__is_student=True
+    ).values_list('user_id', 'user__username', 'phone_number', 'batch_id').iterator(chunk_size=2000):
+        by_username[username.lower()] = (user_id, batch_id)
+        if phone:
+            key = _normalize_phone(phone)
+            by_phone[key] = None if key in by_phone else (user_id, batch_id)
+    return by_username, by_phone
+
+
+def _map_header(header):
+    mapping = {}
+    for index, name in enumerate(header):
+        name = str(name or '').strip().lower().replace(' ', '_')
+        for column, aliases in COLUMN_ALIASES.items():
+            if name in aliases and column not in mapping:
+                mapping[column] = index
+    missing = [column for column in ('student', 'amount') if column not in mapping]
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+    return mapping
+
+
+def _read_rows(upload, filename):
+    """
+    Yield (row number, tuple of cells) from a CSV or XLSX file without
+    loading it whole: csv reads line by line and openpyxl's read-only mode
+    streams the sheet.
+    """
+    name = filename.lower()
+    if name.endswith('.csv'):
+        text = io.TextIOWrapper(getattr(upload, 'file', upload), encoding='utf-8-sig', newline='')
+        try:
+            for number, row in enumerate(csv.reader(text), start=1):
+                yield number, row
+        except UnicodeDecodeError:
+            raise ImportFileError('The CSV is not UTF-8 encoded. Save it as "CSV UTF-8" and upload it again.')
+        except csv.Error as e:
+            raise ImportFileError(f'The CSV could not be read: {e}')
+    elif name.endswith('.xlsx'):
+        import openpyxl
+        from openpyxl.utils.exceptions import InvalidFileException
+        try:
+            workbook = openpyxl.load_workbook(upload, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError):
+            raise ImportFileError('The file is not a valid .xlsx workbook.')
+        try:
+            for number, row in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+                yield number, row
+        finally:
+            workbook.close()
+    else:
+        raise ImportFileError('Upload a .csv or .xlsx file.')
+
+
+def _cell(row, mapping, column):
+    index = mapping.get(column)
+    if index is None or index >= len(row) or row[index] is None:
+        return ''
+    value = row[index]
+    return value if isinstance(value, (datetime.date, int, float, Decimal)) else str(value).strip()
+
+
+def _parse_date(value, today):
+    if value in ('', None):
+        return today
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except (TypeError, ValueError):
+            continue
+    raise ValueError(f"Unrecognised date '{value}'")
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(str(value).replace(',', '')).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Invalid amount '{value}'")
+    if amount <= 0:
+        raise ValueError('Amount must be positive')
+    if amount >= Decimal('1e8'):
+        raise ValueError('Amount is too large')
+    return amount
+
+
+def _resolve_student(value, by_username, by_phone):
+    if isinstance(value, datetime.date):
+        raise ValueError(f"Student '{value}' is a date, not a username or phone")
+    if isinstance(value, (int, float, Decimal)):
+        value = str(int(value))
+    match = by_username.get(value.lower())
+    if match:
+        return match
+    key = _normalize_phone(value)
+    if key and key in by_phone:
+        if by_phone[key] is None:
+            raise ValueError(f"Phone '{value}' matches several students")
+        return by_phone[key]
+    raise ValueError(f"No student with username or phone '{value}'")
+
+
+def import_fee_payments(upload, filename, skip_invalid=False, dry_run=False):
+    """
+    Validate and import payments from a CSV/XLSX upload in chunks of
+    IMPORT_CHUNK_SIZE rows.
+    Students are resolved from one prefetched username/phone map, each chunk
+    checks its transaction ids with one query and is written with bulk_create.
+    Everything runs in one transaction: any invalid row rolls the whole file
+    back unless `skip_invalid` is set; `dry_run` always rolls back.
+    Returns a report dict: rows, imported (valid rows written, or that would
+    be), committed, error_count and errors (row number, message), capped at
+    MAX_REPORTED_ERRORS.
+    """
+    today = datetime.date.today()
+    report = {'rows': 0, 'imported': 0, 'error_count': 0, 'errors': [], 'dry_run': dry_run, 'committed': False}
+    by_username, by_phone = _student_lookup()
+    touched_students = set()
+    seen_transactions = set()
+
+    def add_error(number, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append((number, message))
+
+    def flush(chunk):
+        # chunk: [(row number, FeePayment)]
+        transaction_ids = [payment.transaction_id for _, payment in chunk if payment.transaction_id]
+        existing = set(FeePayment.objects.filter(
+            transaction_id__in=transaction_ids
+        ).values_list('transaction_id', flat=True)) if transaction_ids else set()
+        valid = []
+        for number, payment in chunk:
+            if payment.transaction_id in existing:
+                add_error(number, f"Transaction '{payment.transaction_id}' is already recorded")
+            else:
+                valid.append(payment)
+        FeePayment.objects.bulk_create(valid)
+        record_new_payments(valid)
+        touched_students.update(payment.student_id for payment in valid)
+        report['imported'] += len(valid)
+
+    rows = _read_rows(upload, filename)
+    mapping = None
+    with transaction.atomic():
+        chunk = []
+        for number, row in rows:
+            if mapping is None:
+                mapping = _map_header(row)
+                continue
+            if not any(cell not in (None, '') for cell in row):
+                continue
+            report['rows'] += 1
+            try:
+                user_id, batch_id = _resolve_student(_cell(row, mapping, 'student'), by_username, by_phone)
+                transaction_id = str(_cell(row, mapping, 'transaction_id'))
+                if len(transaction_id) > 100:
+                    raise ValueError('Transaction ID is longer than 100 characters')
+                if transaction_id:
+                    if transaction_id in seen_transactions:
+                        raise ValueError(f"Transaction '{transaction_id}' appears twice in the file")
+                    seen_transactions.add(transaction_id)
+                chunk.append((number, FeePayment(
+                    student_id=user_id,
+                    batch_id=batch_id,
+                    amount=_parse_amount(_cell(row, mapping, 'amount')),
+                    date=_parse_date(_cell(row, mapping, 'date'), today),
+                    transaction_id=transaction_id,
+                    remarks=str(_cell(row, mapping, 'remarks')),
+                )))
+            except ValueError as e:
+                add_error(number, str(e))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                flush(chunk)
+                chunk = []
+        if mapping is None:
+            raise ImportFileError('The file is empty.')
+        if chunk:
+            flush(chunk)
+
+        refresh_fee_status(touched_students)
+        report['committed'] = not dry_run and (skip_invalid or not report['error_count'])
+        if not report['committed']:
+            transaction.set_rollback(True)
+
+    logger.info(
+        f"Fee import {filename}: {report['rows']} rows, {report['imported']} imported, "
+        f"{report['error_count']} errors, committed={report['committed']}"
+    )
+    return report
@@ -0,0 +1,112 @@
+import random
+import secrets
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from core.models import User
+from fees.models import FEE_CYCLE_DAYS, FeePayment
+from students.models import StudentProfile
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare StudentProfile.with_fee_status against the old per-row Python fee rule '
+        '(time and query count). Runs inside a rolled-back transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000, help='Synthetic students to insert')
+        parser.add_argument('--dashboard-sample', type=int, default=500, help='Students whose dashboard check is timed')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['students'], options['dashboard_sample'])
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS('Benchmark complete (synthetic rows rolled back).'))
+
+    def _run(self, students, dashboard_sample):
+        today = timezone.now().date()
+        prefix = f'fee-benchmark-{secrets.token_hex(4)}'
+        # bulk_create skips signals, so the read model isn't touched
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}-{i}', is_student=True) for i in range(students)],
+            batch_size=1000,
+        )
+        StudentProfile.objects.bulk_create(
+            [StudentProfile(user=user, date_of_join=today - timedelta(days=random.randint(0, 365))) for user in users],
+            batch_size=1000,
+        )
+        payments = []
+        for user in users:
+            for _ in range(random.randint(0, 3)):
+                payments.append(FeePayment(student=user, amount=500))
+        FeePayment.objects.bulk_create(payments, batch_size=1000)
+        for days_ago in range(0, 90, 15):
+            FeePayment.objects.filter(
+                student__username__startswith=prefix, pk__gt=payments[0].pk + days_ago * len(payments) // 90
+            ).update(date=today - timedelta(days=days_ago))
+        profiles = StudentProfile.objects.filter(user__username__startswith=prefix)
+
+        self.stdout.write(f"{students} students, {len(payments)} payments")
+
+        loop_due, loop_time, loop_queries = self._measure(lambda: self._python_rule(profiles, today))
+        sql_due, sql_time, sql_queries = self._measure(
+            lambda: list(profiles.with_fee_status(today).filter(is_due=True).values_list('pk', flat=True))
+        )
+        self._report('fee list / reminders', loop_time, loop_queries, sql_time, sql_queries)
+        if set(loop_due) != set(sql_due):
+            self.stdout.write(self.style.ERROR(f'  mismatch: {len(loop_due)} vs {len(sql_due)} overdue'))
+        else:
+            self.stdout.write(f'  {len(sql_due)} overdue in both')
+
+        sample = list(users[:dashboard_sample])
+        _, before_time, before_queries = self._measure(lambda: [self._dashboard_before(u, today) for u in sample])
+        _, after_time, after_queries = self._measure(
+            lambda: [StudentProfile.objects.with_fee_status(today).filter(user=u).first().is_due for u in sample]
+        )
+        self._report(f'student dashboard (x{len(sample)})', before_time, before_queries, after_time, after_queries)
+
+    def _measure(self, fn):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+        return result, elapsed, len(queries)
+
+    def _report(self, label, before_time, before_queries, after_time, after_queries):
+        self.stdout.write(
+            f"{label}: before {before_time * 1000:.1f} ms / {before_queries} queries, "
+            f"after {after_time * 1000:.1f} ms / {after_queries} queries"
+        )
+
+    def _python_rule(self, profiles, today):
+        # The loop fee_list ran before the shared queryset method
+        latest_payments = FeePayment.objects.filter(
+            student=OuterRef('user')
+        ).order_by('-date').values('date')[:1]
+        due = []
+        for student in profiles.select_related('user', 'batch').annotate(last_payment_date=Subquery(latest_payments)):
+            if (today - student.date_of_join).days > FEE_CYCLE_DAYS:
+                last_payment_date = student.last_payment_date
+                if not last_payment_date or (today - last_payment_date).days > FEE_CYCLE_DAYS:
+                    due.append(student.pk)
+        return due
+
+    def _dashboard_before(self, user, today):
+        # The profile load plus per-student check core.views.dashboard ran before
+        profile = StudentProfile.objects.get(user=user)
+        if (today - profile.date_of_join).days > FEE_CYCLE_DAYS:
+            last_payment = FeePayment.objects.filter(student=user).order_by('-date').first()
+            return not last_payment or (today - last_payment.date).days > FEE_CYCLE_DAYS
+        return False
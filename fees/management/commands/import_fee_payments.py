@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from fees.imports import ImportFileError, import_fee_payments
+
+
+class Command(BaseCommand):
+    help = 'Import fee payments from a CSV or XLSX file (student, amount, date, transaction_id, remarks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file to import')
+        parser.add_argument('--skip-invalid', action='store_true', help='Import valid rows even if some rows have errors')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; write nothing')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as upload:
+                report = import_fee_payments(
+                    upload,
+                    options['path'],
+                    skip_invalid=options['skip_invalid'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for row_number, message in report['errors']:
+            self.stdout.write(self.style.ERROR(f"Row {row_number}: {message}"))
+        if report['error_count'] > len(report['errors']):
+            self.stdout.write(f"... and {report['error_count'] - len(report['errors'])} more errors")
+
+        summary = (
+            f"{report['rows']} rows, {report['error_count']} errors, "
+            f"{report['imported']} valid payments in {time.perf_counter() - started:.2f}s"
+        )
+        if report['committed']:
+            self.stdout.write(self.style.SUCCESS(f"Imported: {summary}."))
+        elif report['dry_run']:
+            self.stdout.write(f"[dry run] {summary}; nothing written.")
+        else:
+            self.stdout.write(self.style.WARNING(f"Nothing imported ({summary}); fix the errors or pass --skip-invalid."))
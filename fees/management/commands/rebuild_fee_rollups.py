@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from fees.rollups import fee_rollup_drift, rebuild_fee_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the FeeRollup revenue totals from the payments table (repairs drift)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        drift = fee_rollup_drift()
+        if drift:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} rollup rows had drifted from the payments table:'))
+            for (period, period_start, batch_id), (stored, expected) in sorted(drift.items(), key=str)[:20]:
+                self.stdout.write(f'  {period} {period_start} batch {batch_id}: {stored} recorded vs {expected}')
+        rows = rebuild_fee_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rows} fee rollup rows in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,14 @@
+import time
+from django.core.management.base import BaseCommand
+from fees.status import refresh_fee_status
+
+
+class Command(BaseCommand):
+    help = 'Recompute the StudentFeeStatus read model from FeePayment (repairs drift)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rebuilt = refresh_fee_status()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rebuilt} fee status rows in {time.perf_counter() - started:.2f}s.'
+        ))
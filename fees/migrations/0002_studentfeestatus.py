@@ -0,0 +1,57 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:31
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def populate_fee_status(apps, schema_editor):
+    StudentProfile = apps.get_model('students', 'StudentProfile')
+    FeePayment = apps.get_model('fees', 'FeePayment')
+    StudentFeeStatus = apps.get_model('fees', 'StudentFeeStatus')
+    today = timezone.now().date()
+    last_payments = dict(
+        FeePayment.objects.values('student_id').annotate(last=Max('date')).values_list('student_id', 'last')
+    )
+    rows = []
+    for user_id, date_of_join in StudentProfile.objects.values_list('user_id', 'date_of_join').iterator():
+        last_payment = last_payments.get(user_id)
+        start = max(date_of_join, last_payment) if last_payment else date_of_join
+        due = start + timedelta(days=30)
+        rows.append(StudentFeeStatus(
+            student_id=user_id,
+            last_payment_date=last_payment,
+            next_due_date=due,
+            days_overdue=max((today - due).days, 0),
+        ))
+    StudentFeeStatus.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('fees', '0001_initial'),
+        ('students', '0003_studentprofile_fee_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentFeeStatus',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fee_status_record', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_payment_date', models.DateField(blank=True, null=True)),
+                ('next_due_date', models.DateField(db_index=True)),
+                ('days_overdue', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'student fee statuses',
+            },
+        ),
+        migrations.RunPython(populate_fee_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_rollups(apps, schema_editor):
+    FeePayment = apps.get_model('fees', 'FeePayment')
+    FeeRollup = apps.get_model('fees', 'FeeRollup')
+    StudentProfile = apps.get_model('students', 'StudentProfile')
+
+    # Attribute existing payments to the student's current batch
+    FeePayment.objects.update(batch_id=Subquery(
+        StudentProfile.objects.filter(user_id=OuterRef('student_id')).values('batch_id')[:1]
+    ))
+
+    rows = []
+    for row in FeePayment.objects.values('date', 'batch_id').annotate(amount=Sum('amount'), count=Count('id')).order_by():
+        rows.append(FeeRollup(period='DAY', period_start=row['date'], batch_id=row['batch_id'],
+                              total=row['amount'], payment_count=row['count']))
+    for row in FeePayment.objects.annotate(month=TruncMonth('date')).values('month', 'batch_id').annotate(
+        amount=Sum('amount'), count=Count('id')
+    ).order_by():
+        rows.append(FeeRollup(period='MONTH', period_start=row['month'], batch_id=row['batch_id'],
+                              total=row['amount'], payment_count=row['count']))
+    FeeRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('batches', '0001_initial'),
+        ('fees', '0002_studentfeestatus'),
+        ('students', '0003_studentprofile_fee_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feepayment',
+            name='batch',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fee_payments', to='batches.batch'),
+        ),
+        migrations.CreateModel(
+            name='FeeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('DAY', 'Day'), ('MONTH', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='fee_rollups', to='batches.batch')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'batch'), name='feerollup_period_batch_uniq'), models.UniqueConstraint(condition=models.Q(('batch__isnull', True)), fields=('period', 'period_start'), name='feerollup_period_nobatch_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:38
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fees', '0003_feerollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feepayment',
+            name='date',
+            field=models.DateField(default=datetime.date.today),
+        ),
+    ]
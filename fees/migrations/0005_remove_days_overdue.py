@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fees', '0004_feepayment_date_default'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='studentfeestatus',
+            name='days_overdue',
+        ),
+    ]
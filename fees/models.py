@@ -1,14 +1,108 @@
-from django.db import models
-from django.conf import settings
-
-class FeePayment(models.Model):
-    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, limit_choices_to={'is_student': True})
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
-    date = models.DateField(auto_now_add=True)
-    transaction_id = models.CharField(max_length=100, blank=True)
-    remarks = models.TextField(blank=True)
-    # In a real app, we might generate a PDF and store it, or generate it on the fly.
-    # For now, let's just track the record.
-
-    def __str__(self):
-        return f"{self.student.username} - {self.amount} - {self.date}"
+import datetime
+from django.db import models, transaction
+from django.conf import settings
+
+# A student owes the next fee this many days after joining or after their last payment
+FEE_CYCLE_DAYS = 30
+
+class FeePayment(models.Model):
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, limit_choices_to={'is_student': True})
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Defaults to today; bulk imports carry the bank's payment date
+    date = models.DateField(default=datetime.date.today)
+    transaction_id = models.CharField(max_length=100, blank=True)
+    remarks = models.TextField(blank=True)
+    # Batch the student was in when paying; revenue rollups are keyed on it
+    batch = models.ForeignKey('batches.Batch', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='fee_payments')
+    # In a real app, we might generate a PDF and store it, or generate it on the fly.
+    # For now, let's just track the record.
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored student so signals can refresh both sides of a reassignment,
+        # and the stored rollup key/amount so an edit can be reversed out of FeeRollup
+        instance._loaded_student_id = instance.__dict__.get('student_id')
+        instance._loaded_rollup = (
+            instance.__dict__.get('date'),
+            instance.__dict__.get('batch_id'),
+            instance.__dict__.get('amount'),
+        )
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.batch_id is None:
+            from students.models import StudentProfile
+            self.batch_id = StudentProfile.objects.filter(
+                user_id=self.student_id
+            ).values_list('batch_id', flat=True).first()
+        # fees.signals updates the read models in post_save; keep them in this transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.student.username} - {self.amount} - {self.date}"
+
+
+class StudentFeeStatus(models.Model):
+    """
+    Read model of each student's fee position, kept current by fees.signals
+    on FeePayment/StudentProfile writes. Only dates are stored; whether a row
+    is overdue, and by how long, is worked out against today when read.
+    """
+    student = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='fee_status_record')
+    last_payment_date = models.DateField(null=True, blank=True)
+    next_due_date = models.DateField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'student fee statuses'
+
+    def is_due_on(self, today):
+        return self.next_due_date < today
+
+    def days_overdue_on(self, today):
+        return max((today - self.next_due_date).days, 0)
+
+    def status_on(self, today):
+        if not self.is_due_on(today):
+            return "New Student" if self.last_payment_date is None else "Paid"
+        if self.last_payment_date is None:
+            return "Overdue (Never Paid)"
+        return f"Overdue ({(today - self.last_payment_date).days} days)"
+
+    def __str__(self):
+        return f"{self.student.username} - due {self.next_due_date}"
+
+
+class FeeRollup(models.Model):
+    """
+    Running payment totals per day and per month for each batch, maintained
+    with F() increments by fees.signals (see fees.rollups). Rows with no batch
+    hold payments from students outside any batch.
+    """
+    DAY = 'DAY'
+    MONTH = 'MONTH'
+    PERIOD_CHOICES = (
+        (DAY, 'Day'),
+        (MONTH, 'Month'),
+    )
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    # Folded into the batch-less rows before a batch is deleted (fees.signals)
+    batch = models.ForeignKey('batches.Batch', on_delete=models.DO_NOTHING, null=True, blank=True, related_name='fee_rollups')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'batch'], name='feerollup_period_batch_uniq'),
+            models.UniqueConstraint(
+                fields=['period', 'period_start'],
+                condition=models.Q(batch__isnull=True),
+                name='feerollup_period_nobatch_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_period_display()} {self.period_start} - {self.batch or 'No batch'}: {self.total}"
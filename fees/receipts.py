@@ -0,0 +1,208 @@
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from reportlab.lib.pagesizes import A5
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+# Bump when the PDF layout changes so every receipt gets a new key
+RECEIPT_LAYOUT_VERSION = 1
+RECEIPT_PREFIX = 'receipts'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def receipt_data(payment):
+    """
+    Everything printed on a payment's receipt, as plain strings, so it can be
+    hashed for the storage key and sent to a render process.
+    """
+    return {
+        'number': str(payment.pk),
+        'date': payment.date.strftime('%B %d, %Y'),
+        'student': payment.student.get_full_name() or payment.student.username,
+        'transaction_id': payment.transaction_id or '-',
+        'remarks': payment.remarks,
+        'amount': f'{payment.amount:.2f}',
+    }
+
+
+def receipt_key(data):
+    """
+    Content-addressed storage path: a receipt whose printed details change
+    gets a new file, so stored PDFs never need invalidating.
+    """
+    payload = json.dumps([RECEIPT_LAYOUT_VERSION, data], sort_keys=True).encode()
+    digest = hashlib.sha256(payload).hexdigest()
+    return f'{RECEIPT_PREFIX}/{digest[:2]}/{digest}.pdf'
+
+
+def render_receipt_pdf(data):
+    """
+    Draw one receipt with reportlab (pure Python, no system libraries).
+    Module-level and Django-free so it can run in a worker process.
+    """
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A5, invariant=1)
+    width, height = A5
+    pdf.setTitle(f"Receipt #{data['number']}")
+
+    y = height - 25 * mm
+    pdf.setFont('Helvetica-Bold', 18)
+    pdf.drawCentredString(width / 2, y, 'The New Education')
+    y -= 7 * mm
+    pdf.setFont('Helvetica', 10)
+    pdf.setFillGray(0.4)
+    pdf.drawCentredString(width / 2, y, 'Tuition Center Receipt')
+    y -= 8 * mm
+    pdf.setDash(3, 3)
+    pdf.line(15 * mm, y, width - 15 * mm, y)
+    pdf.setDash()
+
+    rows = [
+        ('Receipt No', f"#{data['number']}"),
+        ('Date', data['date']),
+        ('Student Name', data['student']),
+        ('Transaction ID', data['transaction_id']),
+    ]
+    if data['remarks']:
+        rows.append(('Remarks', data['remarks'][:60]))
+    for label, value in rows:
+        y -= 10 * mm
+        pdf.setFont('Helvetica', 10)
+        pdf.setFillGray(0.4)
+        pdf.drawString(15 * mm, y, label)
+        pdf.setFont('Helvetica-Bold', 10)
+        pdf.setFillGray(0)
+        pdf.drawRightString(width - 15 * mm, y, value)
+
+    y -= 16 * mm
+    pdf.setFont('Helvetica-Bold', 12)
+    pdf.drawString(15 * mm, y, 'Amount Paid')
+    pdf.setFont('Helvetica-Bold', 16)
+    pdf.drawRightString(width - 15 * mm, y, f"INR {data['amount']}")
+
+    pdf.setFont('Helvetica', 8)
+    pdf.setFillGray(0.5)
+    pdf.drawCentredString(width / 2, 20 * mm, 'This is a computer generated receipt and does not require a signature.')
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def receipt_pdf_path(payment):
+    """
+    Storage path of the payment's PDF, rendering and storing it on first use.
+    """
+    data = receipt_data(payment)
+    key = receipt_key(data)
+    if not default_storage.exists(key):
+        # save() may pick another name if a concurrent request stored it first; both are identical
+        key = default_storage.save(key, ContentFile(render_receipt_pdf(data)))
+    return key
+
+
+def _render_pool():
+    """
+    Process pool shared by every export in this process, started on first use.
+    Workers are spawned rather than forked: forking a threaded (gthread)
+    worker can copy locks held by other threads into the child.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.FEE_RECEIPT_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def _stored_receipts(payments):
+    """
+    Yield (payment, pdf bytes) in order, reading stored PDFs and rendering the
+    missing ones in a process pool. At most a few renders are in flight, so
+    memory stays flat however many payments are exported.
+    """
+    workers = settings.FEE_RECEIPT_RENDER_WORKERS
+    executor = _render_pool() if workers > 1 else None
+    window = []
+
+    def drain(limit):
+        while len(window) > limit:
+            payment, key, pending = window.pop(0)
+            if pending is None:
+                with default_storage.open(key, 'rb') as stored:
+                    yield payment, stored.read()
+                continue
+            pdf = pending.result() if executor else pending
+            default_storage.save(key, ContentFile(pdf))
+            yield payment, pdf
+
+    try:
+        for payment in payments:
+            data = receipt_data(payment)
+            key = receipt_key(data)
+            if default_storage.exists(key):
+                pending = None
+            elif executor:
+                pending = executor.submit(render_receipt_pdf, data)
+            else:
+                pending = render_receipt_pdf(data)
+            window.append((payment, key, pending))
+            yield from drain(workers * 2)
+        yield from drain(0)
+    finally:
+        # A cancelled download leaves the shared pool running; drop its queued renders
+        if executor:
+            for _, _, pending in window:
+                if pending is not None:
+                    pending.cancel()
+
+
+class _ZipStream:
+    """
+    Write-only file object for zipfile that hands finished bytes to a
+    generator instead of keeping the archive in memory.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_receipts_zip(payments):
+    """
+    Generate a ZIP of the payments' PDF receipts chunk by chunk, for a
+    StreamingHttpResponse.
+    """
+    stream = _ZipStream()
+    # PDFs are already compressed; storing them keeps the CPU on rendering
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for payment, pdf in _stored_receipts(payments):
+            archive.writestr(f'receipt-{payment.pk}-{payment.date:%Y%m%d}.pdf', pdf)
+            yield stream.pop()
+    yield stream.pop()
@@ -0,0 +1,169 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import FeePayment, FeeRollup
+
+logger = logging.getLogger(__name__)
+
+
+def _periods(date):
+    return ((FeeRollup.DAY, date), (FeeRollup.MONTH, date.replace(day=1)))
+
+
+def _bump(period, period_start, batch_id, amount, count):
+    """
+    Add `amount`/`count` to one rollup row with a single F() UPDATE, creating
+    the row the first time its key is seen.
+    """
+    rows = FeeRollup.objects.filter(period=period, period_start=period_start, batch_id=batch_id)
+    changes = {'total': F('total') + amount, 'payment_count': F('payment_count') + count}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            FeeRollup.objects.create(
+                period=period, period_start=period_start, batch_id=batch_id,
+                total=amount, payment_count=count
+            )
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(**changes)
+
+
+def record_payment_change(old, new):
+    """
+    Move a payment's contribution in the rollups. `old` and `new` are
+    (date, batch_id, amount) tuples, or None for a create/delete.
+    Runs in the caller's transaction so payment and totals commit together.
+    """
+    old, new = _normalize(old), _normalize(new)
+    if old == new:
+        return
+    for values, sign in ((old, -1), (new, 1)):
+        if values is None:
+            continue
+        date, batch_id, amount = values
+        for period, period_start in _periods(date):
+            _bump(period, period_start, batch_id, sign * amount, sign)
+
+
+def _normalize(values):
+    # Fields assigned as strings (e.g. date='2026-01-05') are only converted on reload
+    if values is None:
+        return None
+    date, batch_id, amount = values
+    return (
+        FeePayment._meta.get_field('date').to_python(date),
+        batch_id,
+        FeePayment._meta.get_field('amount').to_python(amount),
+    )
+
+
+def record_new_payments(payments):
+    """
+    Add freshly bulk-created payments (which fire no signals) to the rollups,
+    with one F() update per affected (period, start, batch) key.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for payment in payments:
+        for period, period_start in _periods(payment.date):
+            delta = deltas[(period, period_start, payment.batch_id)]
+            delta[0] += payment.amount
+            delta[1] += 1
+    for (period, period_start, batch_id), (amount, count) in deltas.items():
+        _bump(period, period_start, batch_id, amount, count)
+
+
+def fold_batch_rollups(batch_id):
+    """
+    Move a batch's rollups into the batch-less rows (payments of a deleted
+    batch lose their batch too).
+    """
+    with transaction.atomic():
+        rows = FeeRollup.objects.filter(batch_id=batch_id)
+        for rollup in rows:
+            _bump(rollup.period, rollup.period_start, None, rollup.total, rollup.payment_count)
+        rows.delete()
+
+
+def _expected_rollups():
+    """
+    {(period, period_start, batch_id): (total, payment_count)} computed from
+    FeePayment with two grouped queries.
+    """
+    daily = FeePayment.objects.values('date', 'batch_id').annotate(
+        amount=Sum('amount'), count=Count('id')
+    ).order_by()
+    monthly = FeePayment.objects.annotate(month=TruncMonth('date')).values('month', 'batch_id').annotate(
+        amount=Sum('amount'), count=Count('id')
+    ).order_by()
+    expected = {
+        (FeeRollup.DAY, row['date'], row['batch_id']): (row['amount'], row['count']) for row in daily
+    }
+    expected.update(
+        ((FeeRollup.MONTH, row['month'], row['batch_id']), (row['amount'], row['count'])) for row in monthly
+    )
+    return expected
+
+
+def fee_rollup_drift():
+    """
+    Rollup keys whose stored totals differ from the payments table:
+    {(period, period_start, batch_id): (stored, expected)}, where each side is
+    (total, payment_count) or None for a missing row. Empty when in step.
+    """
+    expected = _expected_rollups()
+    stored = {
+        (period, period_start, batch_id): (total, count)
+        for period, period_start, batch_id, total, count in FeeRollup.objects.values_list(
+            'period', 'period_start', 'batch_id', 'total', 'payment_count'
+        )
+        # Rows emptied by edits and deletes are kept at zero
+        if count or total
+    }
+    return {
+        key: (stored.get(key), expected.get(key))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key) != expected.get(key)
+    }
+
+
+def rebuild_fee_rollups():
+    """
+    Recompute every rollup from FeePayment with two grouped queries.
+    Returns the number of rows written.
+    """
+    rows = [
+        FeeRollup(period=period, period_start=period_start, batch_id=batch_id, total=total, payment_count=count)
+        for (period, period_start, batch_id), (total, count) in _expected_rollups().items()
+    ]
+    with transaction.atomic():
+        FeeRollup.objects.all().delete()
+        FeeRollup.objects.bulk_create(rows, batch_size=1000)
+    logger.info(f"Rebuilt {len(rows)} fee rollups")
+    return len(rows)
+
+
+def revenue_summary(today):
+    """
+    All-time, this-month and last-month collections from the monthly rollups
+    (one small aggregate; its size grows with months x batches, not payments).
+    """
+    this_month = today.replace(day=1)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    totals = FeeRollup.objects.filter(period=FeeRollup.MONTH).aggregate(
+        all_time=Sum('total'),
+        this_month=Sum('total', filter=Q(period_start=this_month)),
+        last_month=Sum('total', filter=Q(period_start=last_month)),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['change_percent'] = (
+        round((totals['this_month'] - totals['last_month']) * 100 / totals['last_month'])
+        if totals['last_month'] else None
+    )
+    return totals
@@ -0,0 +1,46 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from batches.models import Batch
+from students.models import StudentProfile
+from .models import FeePayment, StudentFeeStatus
+from .rollups import fold_batch_rollups, record_payment_change
+from .status import refresh_fee_status
+
+# Keep the StudentFeeStatus and FeeRollup read models in step with the rows they
+# are derived from. Each receiver touches only the affected rows, in the caller's
+# transaction (FeePayment.save and deletes are atomic).
+
+@receiver(post_save, sender=FeePayment)
+def update_read_models_on_payment_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_loaded_student_id', None)
+    refresh_fee_status([instance.student_id, previous])
+    instance._loaded_student_id = instance.student_id
+
+    current = (instance.date, instance.batch_id, instance.amount)
+    record_payment_change(getattr(instance, '_loaded_rollup', None), current)
+    instance._loaded_rollup = current
+
+@receiver(post_delete, sender=FeePayment)
+def update_read_models_on_payment_delete(sender, instance, origin=None, **kwargs):
+    record_payment_change(
+        getattr(instance, '_loaded_rollup', (instance.date, instance.batch_id, instance.amount)), None
+    )
+    # Payments removed by deleting their student go with the status row too
+    if origin is not None and getattr(origin, 'model', type(origin)) is not FeePayment:
+        return
+    refresh_fee_status([instance.student_id])
+
+@receiver(post_save, sender=StudentProfile)
+def refresh_status_on_profile_save(sender, instance, **kwargs):
+    # date_of_join drives the first due date
+    refresh_fee_status([instance.user_id])
+
+@receiver(post_delete, sender=StudentProfile)
+def drop_status_on_profile_delete(sender, instance, **kwargs):
+    StudentFeeStatus.objects.filter(student_id=instance.user_id).delete()
+
+@receiver(pre_delete, sender=Batch)
+def fold_rollups_on_batch_delete(sender, instance, **kwargs):
+    # The batch's payments fall back to "no batch" (SET_NULL); move their totals with them
+    fold_batch_rollups(instance.pk)
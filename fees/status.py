@@ -0,0 +1,51 @@
+from django.utils import timezone
+
+from .models import StudentFeeStatus
+
+REFRESH_CHUNK_SIZE = 1000
+
+
+def refresh_fee_status(user_ids=None, today=None):
+    """
+    Recompute StudentFeeStatus rows from FeePayment for the given students
+    (all students when `user_ids` is None). One query reads the profiles
+    through StudentProfile.with_fee_status; rows are upserted in chunks.
+    Returns the number of rows written.
+    """
+    from students.models import StudentProfile
+
+    today = today or timezone.now().date()
+    profiles = StudentProfile.objects.with_fee_status(today)
+    if user_ids is not None:
+        user_ids = [user_id for user_id in set(user_ids) if user_id]
+        if not user_ids:
+            return 0
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    written = 0
+    chunk = []
+    for user_id, last_payment_date, due_date in profiles.values_list(
+        'user_id', 'last_payment_date', 'due_date'
+    ).iterator(chunk_size=REFRESH_CHUNK_SIZE):
+        chunk.append(StudentFeeStatus(
+            student_id=user_id,
+            last_payment_date=last_payment_date,
+            next_due_date=due_date,
+        ))
+        if len(chunk) >= REFRESH_CHUNK_SIZE:
+            written += _upsert(chunk)
+            chunk = []
+    if chunk:
+        written += _upsert(chunk)
+    return written
+
+
+def _upsert(rows):
+    StudentFeeStatus.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['student'],
+        update_fields=['last_payment_date', 'next_due_date', 'updated_at'],
+    )
+    return len(rows)
+
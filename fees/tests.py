@@ -1,3 +1,323 @@
-from django.test import TestCase
+import io
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from unittest import skipUnless
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from core.models import User
+from batches.models import Batch
+from students.models import StudentProfile
+from .imports import ImportFileError, import_fee_payments
+from .rollups import fee_rollup_drift
+from .views import PAGE_SIZE
+from .models import FeePayment, FeeRollup, StudentFeeStatus
+from .receipts import receipt_data, receipt_key
 
-# Create your tests here.
+
+def _student(username, batch=None, phone='', joined=None):
+    user = User.objects.create(username=username, is_student=True)
+    StudentProfile.objects.create(
+        user=user, batch=batch, phone_number=phone, date_of_join=joined or date.today() - timedelta(days=100)
+    )
+    return user
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class FeeImportTests(TestCase):
+    def setUp(self):
+        self.batch = Batch.objects.create(name='b', start_date=date(2026, 1, 1))
+        self.alice = _student('alice', self.batch, phone='+91 98765 43210')
+        self.bob = _student('bob', self.batch, phone='9000000000')
+        self.twin = _student('twin', phone='09000000000')
+
+    def _import(self, text, **options):
+        return import_fee_payments(io.BytesIO(text.encode()), 'payments.csv', **options)
+
+    def test_valid_file_writes_payments_rollups_and_status(self):
+        report = self._import(
+            'Student,Amount,Date,Transaction ID\n'
+            'alice,500,2026-01-05,T1\n'
+            '9876543210,"1,250.50",06/01/2026,T2\n'
+        )
+        self.assertEqual((report['rows'], report['imported'], report['committed']), (2, 2, True))
+        self.assertEqual(FeePayment.objects.filter(student=self.alice, batch=self.batch).count(), 2)
+        month = FeeRollup.objects.get(period=FeeRollup.MONTH, period_start=date(2026, 1, 1), batch=self.batch)
+        self.assertEqual((month.total, month.payment_count), (Decimal('1750.50'), 2))
+        self.assertEqual(
+            FeeRollup.objects.get(period=FeeRollup.DAY, period_start=date(2026, 1, 6), batch=self.batch).total,
+            Decimal('1250.50')
+        )
+        self.assertEqual(StudentFeeStatus.objects.get(student=self.alice).last_payment_date, date(2026, 1, 6))
+
+    def test_an_invalid_row_rolls_the_whole_file_back(self):
+        text = 'student,amount,transaction_id\nalice,500,T1\nbob,-5,T2\nnobody,100,T3\nbob,200,T1\n'
+        report = self._import(text)
+        self.assertFalse(report['committed'])
+        self.assertEqual(report['imported'], 1)
+        self.assertEqual(report['errors'], [
+            (3, 'Amount must be positive'),
+            (4, "No student with username or phone 'nobody'"),
+            (5, "Transaction 'T1' appears twice in the file"),
+        ])
+        self.assertFalse(FeePayment.objects.exists())
+        self.assertFalse(FeeRollup.objects.exists())
+
+    def test_skip_invalid_imports_the_valid_rows(self):
+        FeePayment.objects.create(student=self.bob, amount=100, transaction_id='OLD')
+        report = self._import('student,amount,transaction_id\nalice,500,T1\nbob,abc,\nbob,300,OLD\n', skip_invalid=True)
+        self.assertTrue(report['committed'])
+        self.assertEqual(report['imported'], 1)
+        self.assertEqual(report['errors'], [(3, "Invalid amount 'abc'"), (4, "Transaction 'OLD' is already recorded")])
+        self.assertEqual(FeePayment.objects.count(), 2)
+
+    def test_dry_run_validates_without_writing(self):
+        report = self._import('student,amount\nalice,500\nbob,200\n', dry_run=True)
+        self.assertEqual((report['imported'], report['committed']), (2, False))
+        self.assertFalse(FeePayment.objects.exists())
+        self.assertFalse(FeeRollup.objects.exists())
+        self.assertIsNone(StudentFeeStatus.objects.get(student=self.alice).last_payment_date)
+
+    def test_phone_shared_by_two_students_is_reported(self):
+        report = self._import('phone,amount\n+91 90000 00000,500\n', skip_invalid=True)
+        self.assertEqual(report['errors'], [(2, "Phone '+91 90000 00000' matches several students")])
+        self.assertFalse(FeePayment.objects.exists())
+
+    @skipUnless(find_spec('openpyxl'), 'openpyxl is not installed')
+    def test_date_in_the_student_column_is_a_row_error(self):
+        import openpyxl
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Student', 'Amount'])
+        workbook.active.append([datetime(2026, 1, 5), 500])
+        workbook.active.append(['alice', 500])
+        upload = io.BytesIO()
+        workbook.save(upload)
+        upload.seek(0)
+        report = import_fee_payments(upload, 'payments.xlsx', skip_invalid=True)
+        self.assertEqual(report['errors'], [(2, "Student '2026-01-05 00:00:00' is a date, not a username or phone")])
+        self.assertEqual(report['imported'], 1)
+
+    def test_unreadable_files_raise_import_file_error(self):
+        with self.assertRaisesMessage(ImportFileError, 'not UTF-8'):
+            import_fee_payments(io.BytesIO('student,amount\nJos\xe9,500\n'.encode('cp1252')), 'payments.csv')
+        with self.assertRaisesMessage(ImportFileError, 'not a valid .xlsx'):
+            import_fee_payments(io.BytesIO(b'student,amount\n'), 'payments.xlsx')
+        with self.assertRaisesMessage(ImportFileError, 'Missing column(s): amount'):
+            self._import('student,paid_by\nalice,cash\n')
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class FeeRollupTests(TestCase):
+    def setUp(self):
+        self.batch = Batch.objects.create(name='b', start_date=date(2026, 1, 1))
+        self.other = Batch.objects.create(name='o', start_date=date(2026, 1, 1))
+        self.alice = _student('alice', self.batch)
+
+    def _rollup(self, period, period_start, batch):
+        row = FeeRollup.objects.filter(period=period, period_start=period_start, batch=batch).first()
+        return (row.total, row.payment_count) if row else (Decimal('0'), 0)
+
+    def test_create_edit_and_delete_move_the_totals(self):
+        payment = FeePayment.objects.create(student=self.alice, amount=500, date=date(2026, 1, 5))
+        self.assertEqual(self._rollup(FeeRollup.DAY, date(2026, 1, 5), self.batch), (Decimal('500'), 1))
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 1, 1), self.batch), (Decimal('500'), 1))
+
+        payment.amount = Decimal('750')
+        payment.save()
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 1, 1), self.batch), (Decimal('750'), 1))
+
+        payment.date = date(2026, 2, 10)
+        payment.save()
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 1, 1), self.batch), (Decimal('0'), 0))
+        self.assertEqual(self._rollup(FeeRollup.DAY, date(2026, 2, 10), self.batch), (Decimal('750'), 1))
+
+        payment.batch = self.other
+        payment.save()
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 2, 1), self.batch), (Decimal('0'), 0))
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 2, 1), self.other), (Decimal('750'), 1))
+
+        FeePayment.objects.get(pk=payment.pk).delete()
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 2, 1), self.other), (Decimal('0'), 0))
+        self.assertEqual(fee_rollup_drift(), {})
+
+    def test_values_assigned_as_strings_are_normalised(self):
+        payment = FeePayment.objects.create(student=self.alice, amount='300.50', date='2026-03-04')
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 3, 1), self.batch), (Decimal('300.50'), 1))
+        # Saving again with the same values as strings is not counted as a change
+        payment.date, payment.amount = '2026-03-04', '300.50'
+        payment.save()
+        payment.date = '2026-04-01'
+        payment.save()
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 3, 1), self.batch), (Decimal('0'), 0))
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 4, 1), self.batch), (Decimal('300.50'), 1))
+        self.assertEqual(fee_rollup_drift(), {})
+
+    def test_deleting_a_batch_folds_its_totals_into_the_batchless_rows(self):
+        FeePayment.objects.create(student=self.alice, amount=500, date=date(2026, 1, 5))
+        FeePayment.objects.create(student=_student('carol'), amount=200, date=date(2026, 1, 20))
+        batch_id = self.batch.pk
+        self.batch.delete()
+        self.assertFalse(FeeRollup.objects.filter(batch_id=batch_id).exists())
+        self.assertEqual(self._rollup(FeeRollup.MONTH, date(2026, 1, 1), None), (Decimal('700'), 2))
+        self.assertEqual(fee_rollup_drift(), {})
+
+    def test_rebuild_reports_no_drift_after_mixed_changes(self):
+        bob = _student('bob', self.other)
+        payments = [
+            FeePayment.objects.create(student=student, amount=amount, date=day)
+            for student, amount, day in [
+                (self.alice, 100, date(2026, 1, 31)),
+                (self.alice, 200, date(2026, 2, 1)),
+                (bob, 300, date(2026, 2, 1)),
+                (bob, 400, '2026-02-15'),
+            ]
+        ]
+        payments[0].amount = 150
+        payments[0].save()
+        payments[1].date = '2026-01-15'
+        payments[1].save()
+        payments[2].batch = self.batch
+        payments[2].save()
+        payments[3].delete()
+        FeePayment.objects.filter(pk=payments[0].pk).delete()
+        self.other.delete()
+        FeePayment.objects.create(student=bob, amount=50, date=date(2026, 3, 3))
+
+        self.assertEqual(fee_rollup_drift(), {})
+        out = io.StringIO()
+        call_command('rebuild_fee_rollups', stdout=out)
+        self.assertNotIn('drifted', out.getvalue())
+
+        # Drift is reported when the rollups miss a write (queryset.update fires no signals)
+        FeePayment.objects.filter(pk=payments[2].pk).update(amount=60)
+        out = io.StringIO()
+        call_command('rebuild_fee_rollups', stdout=out)
+        self.assertIn('2 rollup rows had drifted', out.getvalue())
+        self.assertEqual(fee_rollup_drift(), {})
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class FeeStatusTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.alice = _student('alice', joined=self.today - timedelta(days=100))
+
+    def _status(self, user):
+        return StudentFeeStatus.objects.get(student=user)
+
+    def test_payment_writes_refresh_the_status_row(self):
+        status = self._status(self.alice)
+        self.assertEqual(status.next_due_date, self.today - timedelta(days=70))
+        self.assertEqual(status.days_overdue_on(self.today), 70)
+        self.assertEqual(status.status_on(self.today), 'Overdue (Never Paid)')
+
+        payment = FeePayment.objects.create(student=self.alice, amount=500, date=self.today - timedelta(days=40))
+        self.assertEqual(self._status(self.alice).days_overdue_on(self.today), 10)
+
+        payment.date = self.today - timedelta(days=5)
+        payment.save()
+        status = self._status(self.alice)
+        self.assertEqual((status.last_payment_date, status.is_due_on(self.today)), (payment.date, False))
+        self.assertEqual(status.status_on(self.today), 'Paid')
+        # Overdue-ness advances with the calendar without rewriting the row
+        self.assertEqual(status.days_overdue_on(self.today + timedelta(days=40)), 15)
+
+        # Moving the payment to another student refreshes both rows
+        bob = _student('bob')
+        payment.student = bob
+        payment.save()
+        self.assertIsNone(self._status(self.alice).last_payment_date)
+        self.assertEqual(self._status(bob).last_payment_date, payment.date)
+
+        payment.delete()
+        self.assertIsNone(self._status(bob).last_payment_date)
+
+    def test_changing_the_join_date_refreshes_the_status_row(self):
+        profile = self.alice.student_profile
+        profile.date_of_join = self.today - timedelta(days=10)
+        profile.save()
+        self.assertEqual(self._status(self.alice).status_on(self.today), 'New Student')
+
+    def test_fee_list_pages_statuses_and_filters_overdue(self):
+        teacher = User.objects.create(username='teacher', is_teacher=True)
+        for i in range(PAGE_SIZE + 5):
+            _student(f'new{i}', joined=self.today)
+        self.client.force_login(teacher)
+
+        response = self.client.get('/fees/')
+        self.assertEqual(response.context['show'], 'all')
+        page = response.context['status_page']
+        self.assertEqual((page.paginator.count, len(response.context['student_fee_status'])), (PAGE_SIZE + 6, PAGE_SIZE))
+        # Ordered by due date, so overdue students come first
+        self.assertEqual(response.context['student_fee_status'][0]['student'].user, self.alice)
+
+        response = self.client.get('/fees/', {'status_page': 2})
+        self.assertEqual(len(response.context['student_fee_status']), 6)
+
+        response = self.client.get('/fees/', {'show': 'overdue'})
+        self.assertEqual(
+            [item['status'] for item in response.context['student_fee_status']], ['Overdue (Never Paid)']
+        )
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class ReceiptTests(TestCase):
+    def setUp(self):
+        self.alice = _student('alice')
+        self.payment = FeePayment.objects.create(
+            student=self.alice, amount=Decimal('500'), date=date(2026, 1, 5), transaction_id='T1'
+        )
+        self.teacher = User.objects.create(username='teacher', is_teacher=True)
+
+    def test_receipt_key_follows_the_printed_details(self):
+        data = receipt_data(self.payment)
+        self.assertEqual(receipt_key(data), receipt_key(dict(reversed(list(data.items())))))
+        self.assertEqual(receipt_key(data), receipt_key(receipt_data(FeePayment.objects.get(pk=self.payment.pk))))
+        self.assertRegex(receipt_key(data), r'^receipts/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+
+        self.payment.amount = Decimal('600')
+        self.assertNotEqual(receipt_key(receipt_data(self.payment)), receipt_key(data))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_pdf_is_rendered_once_and_only_for_its_owner_or_a_teacher(self):
+        url = f'/fees/receipt/{self.payment.pk}/pdf/'
+        self.client.force_login(_student('bob'))
+        self.assertRedirects(self.client.get(url), '/dashboard/', fetch_redirect_response=False)
+
+        self.client.force_login(self.alice)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+        self.client.force_login(self.teacher)
+        with self.assertNumQueries(3):
+            # Session, user and payment; the stored file is served without rendering
+            response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), pdf)
+
+    def _export(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get('/fees/receipts/export/', {'start': '2026-01-01', 'end': '2026-01-31'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(), FEE_RECEIPT_RENDER_WORKERS=1)
+    def test_zip_export_holds_one_pdf_per_payment_in_range(self):
+        FeePayment.objects.create(student=self.alice, amount=Decimal('250'), date=date(2026, 1, 20))
+        FeePayment.objects.create(student=self.alice, amount=Decimal('250'), date=date(2026, 2, 1))
+        archive = self._export()
+        self.assertEqual(len(archive.namelist()), 2)
+        self.assertEqual(archive.namelist()[0], f'receipt-{self.payment.pk}-20260105.pdf')
+        self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(), FEE_RECEIPT_RENDER_WORKERS=2)
+    def test_zip_export_renders_in_the_spawned_pool(self):
+        for day in range(6, 12):
+            FeePayment.objects.create(student=self.alice, amount=Decimal('100'), date=date(2026, 1, day))
+        self.assertEqual(len(self._export().namelist()), 7)
+        # A second export reads every receipt back from storage
+        self.assertEqual(len(self._export().namelist()), 7)
@@ -4,6 +4,9 @@ from . import views
 urlpatterns = [
     path('', views.fee_list, name='fee_list'),
     path('record/', views.record_payment, name='record_payment'),
+    path('import/', views.import_payments, name='import_payments'),
     path('receipt/<int:pk>/', views.fee_receipt, name='fee_receipt'),
+    path('receipt/<int:pk>/pdf/', views.fee_receipt_pdf, name='fee_receipt_pdf'),
+    path('receipts/export/', views.export_receipts, name='export_receipts'),
     path('my-fees/', views.my_fees, name='my_fees'),
 ]
@@ -1,15 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from .models import FeePayment
+from .models import FeePayment, StudentFeeStatus
 from .forms import FeePaymentForm
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
-from students.models import StudentProfile
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .receipts import receipt_pdf_path, stream_receipts_zip
+from .imports import ImportFileError, import_fee_payments
 
-# import weasyprint # Optional for PDF, but user asked for simple implementation. 
-# We will simulate PDF generation or use a simple HTML print view.
+# PDF receipts are drawn with reportlab (fees.receipts) and kept in default storage.
+
+PAGE_SIZE = 50
 
 def is_teacher(user):
     return user.is_authenticated and user.is_teacher
@@ -17,67 +22,39 @@ def is_teacher(user):
 @login_required
 @user_passes_test(is_teacher)
 def fee_list(request):
-    payments = FeePayment.objects.all().order_by('-date')
-    
-    # Calculate fee status for all students
-    # Calculate fee status for all students
-    student_fee_status = []
-    
-    from django.db.models import OuterRef, Subquery, Max
-    
-    # Optimize: Fetch latest payment date for each student in one go
-    latest_payments = FeePayment.objects.filter(
-        student=OuterRef('user')
-    ).order_by('-date').values('date')[:1]
-    
-    all_students = StudentProfile.objects.all().select_related('user', 'batch').annotate(
-        last_payment_date=Subquery(latest_payments)
-    )
-    
-    today = timezone.now().date()
-    
-    for student in all_students:
-        join_date = student.date_of_join
-        days_since_join = (today - join_date).days
-        last_payment_date = student.last_payment_date
-        
-        is_due = False
-        status = "Paid"
-        due_date = None
-        
-        if days_since_join > 30:
-            if not last_payment_date:
-                is_due = True
-                status = "Overdue (Never Paid)"
-                due_date = join_date + timezone.timedelta(days=30)
-            else:
-                days_since_payment = (today - last_payment_date).days
-                if days_since_payment > 30:
-                    is_due = True
-                    status = f"Overdue ({days_since_payment} days)"
-                    due_date = last_payment_date + timezone.timedelta(days=30)
-                else:
-                    due_date = last_payment_date + timezone.timedelta(days=30)
-        else:
-            status = "New Student"
-            due_date = join_date + timezone.timedelta(days=30)
+    payments = Paginator(
+        FeePayment.objects.select_related('student').order_by('-date', '-pk'),
+        PAGE_SIZE
+    ).get_page(request.GET.get('page'))
 
-        # Create a dummy object for last_payment to keep template compatible if needed, 
-        # or just pass the date. The template uses {{ item.last_payment.date }}.
-        # Let's pass a simple dict or object if needed, but since we only need date in template:
-        last_payment_obj = {'date': last_payment_date} if last_payment_date else None
+    # Fee status comes from the StudentFeeStatus read model; the overdue filter
+    # and ordering run on the next_due_date index and only one page is loaded.
+    today = timezone.now().date()
+    show = request.GET.get('show', 'all')
+    statuses = StudentFeeStatus.objects.select_related(
+        'student__student_profile__batch'
+    ).order_by('next_due_date', 'student_id')
+    if show == 'overdue':
+        statuses = statuses.filter(next_due_date__lt=today)
+    else:
+        show = 'all'
+    status_page = Paginator(statuses, PAGE_SIZE).get_page(request.GET.get('status_page'))
 
+    student_fee_status = []
+    for row in status_page:
         student_fee_status.append({
-            'student': student,
-            'last_payment': last_payment_obj, 
-            'is_due': is_due,
-            'status': status,
-            'due_date': due_date
+            'student': row.student.student_profile,
+            'last_payment': {'date': row.last_payment_date} if row.last_payment_date else None,
+            'is_due': row.is_due_on(today),
+            'status': row.status_on(today),
+            'due_date': row.next_due_date
         })
 
     return render(request, 'fees/fee_list.html', {
         'payments': payments,
-        'student_fee_status': student_fee_status
+        'student_fee_status': student_fee_status,
+        'status_page': status_page,
+        'show': show
     })
 
 @login_required
@@ -93,6 +70,29 @@ def record_payment(request):
         form = FeePaymentForm()
     return render(request, 'fees/fee_form.html', {'form': form})
 
+@login_required
+@user_passes_test(is_teacher)
+def import_payments(request):
+    report = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Choose a CSV or XLSX file to import.')
+        else:
+            try:
+                report = import_fee_payments(
+                    upload,
+                    upload.name,
+                    skip_invalid=bool(request.POST.get('skip_invalid')),
+                    dry_run=bool(request.POST.get('dry_run'))
+                )
+            except ImportFileError as e:
+                messages.error(request, str(e))
+            else:
+                if report['committed']:
+                    messages.success(request, f"Imported {report['imported']} payments.")
+    return render(request, 'fees/import_payments.html', {'report': report})
+
 @login_required
 def fee_receipt(request, pk):
     payment = get_object_or_404(FeePayment, pk=pk)
@@ -102,6 +102,43 @@ def fee_receipt(request, pk):
     
     return render(request, 'fees/receipt.html', {'payment': payment})
 
+@login_required
+def fee_receipt_pdf(request, pk):
+    payment = get_object_or_404(FeePayment.objects.select_related('student'), pk=pk)
+    # Check permissions
+    if not request.user.is_teacher and payment.student != request.user:
+        return redirect('dashboard')
+
+    # Rendered once per receipt content, then served from storage
+    path = receipt_pdf_path(payment)
+    return FileResponse(
+        default_storage.open(path, 'rb'),
+        content_type='application/pdf',
+        filename=f'receipt-{payment.pk}.pdf'
+    )
+
+@login_required
+@user_passes_test(is_teacher)
+def export_receipts(request):
+    today = timezone.now().date()
+    start = parse_date(request.GET.get('start', '')) or today.replace(day=1)
+    end = parse_date(request.GET.get('end', '')) or today
+    if start > end:
+        messages.error(request, 'The start date must be before the end date.')
+        return redirect('fee_list')
+
+    payments = FeePayment.objects.filter(date__range=(start, end)).select_related('student').order_by('date', 'pk')
+    if not payments.exists():
+        messages.info(request, 'No payments in that date range.')
+        return redirect('fee_list')
+
+    response = StreamingHttpResponse(
+        stream_receipts_zip(payments.iterator(chunk_size=200)),
+        content_type='application/zip'
+    )
+    response['Content-Disposition'] = f'attachment; filename="receipts-{start:%Y%m%d}-{end:%Y%m%d}.zip"'
+    return response
+
 @login_required
 def my_fees(request):
     if not request.user.is_student:
@@ -0,0 +1,102 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import FCMToken
+
+# Bumping the version orphans every cached token list at once.
+AUDIENCE_VERSION_KEY = 'notifications:audience:version'
+
+
+def _version():
+    version = cache.get(AUDIENCE_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted version never reuses an old number.
+        cache.add(AUDIENCE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(AUDIENCE_VERSION_KEY)
+    return version
+
+
+def invalidate_audience_cache():
+    """
+    Drop every cached audience. Call after any change to tokens or batch membership
+    that bypasses model signals (e.g. queryset.update()).
+    """
+    try:
+        cache.incr(AUDIENCE_VERSION_KEY)
+    except ValueError:
+        cache.set(AUDIENCE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _cache_enabled():
+    # Tokens change in web processes while the worker resolves audiences; a
+    # per-process memory cache would never see the invalidation.
+    return bool(settings.REDIS_URL) and settings.NOTIFICATION_AUDIENCE_CACHE_TIMEOUT > 0
+
+
+def _batch_key(version, batch_id):
+    return f'notifications:audience:{version}:batch:{batch_id}'
+
+
+def user_tokens(user_ids):
+    """
+    Active tokens for specific users, in one query.
+    """
+    return list(FCMToken.objects.filter(
+        user_id__in=user_ids,
+        is_active=True
+    ).values_list('token', flat=True))
+
+
+def batch_tokens(batch_ids):
+    """
+    Active tokens of every student in `batch_ids`.
+    Cached per batch (with a shared cache); batches missing from the cache are
+    loaded with one join query.
+    """
+    batch_ids = sorted(set(batch_ids))
+    cached = _cache_enabled()
+    version = _version() if cached else None
+    keys = {_batch_key(version, batch_id): batch_id for batch_id in batch_ids}
+    tokens_by_batch = {}
+    if cached:
+        tokens_by_batch = {keys[key]: tokens for key, tokens in cache.get_many(list(keys)).items()}
+
+    missing = [batch_id for batch_id in batch_ids if batch_id not in tokens_by_batch]
+    if missing:
+        fetched = {batch_id: [] for batch_id in missing}
+        rows = FCMToken.objects.filter(
+            is_active=True,
+            user__is_student=True,
+            user__student_profile__batch_id__in=missing,
+        ).values_list('user__student_profile__batch_id', 'token')
+        for batch_id, token in rows:
+            fetched[batch_id].append(token)
+        if cached:
+            cache.set_many(
+                {_batch_key(version, batch_id): tokens for batch_id, tokens in fetched.items()},
+                timeout=settings.NOTIFICATION_AUDIENCE_CACHE_TIMEOUT,
+            )
+        tokens_by_batch.update(fetched)
+
+    return list(dict.fromkeys(
+        token for batch_id in batch_ids for token in tokens_by_batch[batch_id]
+    ))
+
+
+def all_student_tokens():
+    """
+    Active tokens of every registered student, cached like batch audiences.
+    """
+    cached = _cache_enabled()
+    key = f'notifications:audience:{_version()}:all' if cached else None
+    tokens = cache.get(key) if cached else None
+    if tokens is None:
+        tokens = list(FCMToken.objects.filter(
+            is_active=True,
+            user__is_student=True,
+        ).values_list('token', flat=True))
+        if cached:
+            cache.set(key, tokens, timeout=settings.NOTIFICATION_AUDIENCE_CACHE_TIMEOUT)
+    return tokens
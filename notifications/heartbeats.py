@@ -0,0 +1,90 @@
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .models import FCMToken
+
+logger = logging.getLogger(__name__)
+
+# Redis hash of token id -> last ping timestamp. The flush renames it before
+# reading, so pings recorded meanwhile land in a fresh hash.
+HEARTBEAT_BUFFER_KEY = 'notifications:token-heartbeats'
+HEARTBEAT_FLUSHING_KEY = 'notifications:token-heartbeats:flushing'
+FLUSH_CHUNK_SIZE = 1000
+
+_client = None
+
+
+def _heartbeat_client():
+    """
+    Redis client for the buffer, or None without REDIS_URL: a per-process
+    memory cache is invisible to the worker that flushes it.
+    """
+    global _client
+    if not settings.REDIS_URL:
+        return None
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def record_token_heartbeat(token_id, seen_at=None):
+    """
+    Buffer a "token still in use" ping with one HSET instead of writing it.
+    Without a shared Redis the ping is written straight to the token.
+    """
+    seen_at = seen_at or timezone.now()
+    client = _heartbeat_client()
+    if client is None:
+        FCMToken.objects.filter(pk=token_id).update(last_used_at=seen_at)
+        return
+    client.hset(HEARTBEAT_BUFFER_KEY, token_id, seen_at.timestamp())
+
+
+def write_token_heartbeats(pending):
+    """
+    Set each token's last_used_at to its own ping time ({token_id: timestamp}),
+    one CASE UPDATE per chunk. Returns the number of tokens updated.
+    """
+    token_ids = sorted(pending)
+    updated = 0
+    for i in range(0, len(token_ids), FLUSH_CHUNK_SIZE):
+        chunk = token_ids[i:i + FLUSH_CHUNK_SIZE]
+        updated += FCMToken.objects.filter(pk__in=chunk).update(last_used_at=Case(
+            *[
+                When(pk=token_id, then=Value(datetime.fromtimestamp(pending[token_id], tz=dt_timezone.utc)))
+                for token_id in chunk
+            ],
+            output_field=DateTimeField(),
+        ))
+    return updated
+
+
+def flush_token_heartbeats():
+    """
+    Write buffered heartbeats to FCMToken.last_used_at in bulk.
+    Returns the number of tokens updated.
+    """
+    client = _heartbeat_client()
+    if client is None:
+        return 0
+    # A hash left by a flush that died half way is written first; otherwise
+    # take the live hash atomically.
+    if not client.exists(HEARTBEAT_FLUSHING_KEY):
+        if not client.exists(HEARTBEAT_BUFFER_KEY):
+            return 0
+        client.rename(HEARTBEAT_BUFFER_KEY, HEARTBEAT_FLUSHING_KEY)
+
+    pending = {
+        int(token_id): float(seen_at)
+        for token_id, seen_at in client.hgetall(HEARTBEAT_FLUSHING_KEY).items()
+    }
+    updated = write_token_heartbeats(pending)
+    client.delete(HEARTBEAT_FLUSHING_KEY)
+
+    logger.info(f"Flushed {updated} token heartbeats.")
+    return updated
@@ -0,0 +1,98 @@
+import random
+import secrets
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from core.models import User
+from notifications.models import FCMToken
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare FCMToken lookups by the 16-byte token_hash key against the old '
+        'text index on token (index size and latency). Runs inside a rolled-back transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Synthetic tokens to insert')
+        parser.add_argument('--lookups', type=int, default=2000, help='Random lookups to time per key')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['rows'], options['lookups'])
+                raise _Rollback
+        except _Rollback:
+            pass
+        self.stdout.write(self.style.SUCCESS('Benchmark complete (synthetic rows rolled back).'))
+
+    def _run(self, rows, lookups):
+        user = User.objects.create(username=f'benchmark-{secrets.token_hex(4)}')
+        # Real FCM tokens are ~160 characters
+        tokens = [secrets.token_urlsafe(120)[:163] for _ in range(rows)]
+        FCMToken.objects.bulk_create(
+            [FCMToken(user=user, token=t, token_hash=FCMToken.hash_token(t)) for t in tokens],
+            batch_size=1000,
+        )
+        sample = random.sample(tokens, min(lookups, len(tokens)))
+        table = FCMToken._meta.db_table
+
+        hash_index = self._index_on(table, 'token_hash')
+        hash_time = self._time(lambda t: FCMToken.objects.filter(token_hash=FCMToken.hash_token(t)).exists(), sample)
+
+        # Recreate the old unique text index to measure the "before" layout
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE UNIQUE INDEX benchmark_token_text_idx ON {table} (token)')
+        text_time = self._time(lambda t: FCMToken.objects.filter(token=t).exists(), sample)
+
+        self.stdout.write(f"{rows} tokens, {len(sample)} lookups each")
+        self.stdout.write(
+            f"before  token (text, unique):      index={self._size('benchmark_token_text_idx')} x2 (unique + Index)  "
+            f"avg lookup={text_time * 1000:.3f} ms"
+        )
+        self.stdout.write(
+            f"after   token_hash (16-byte key):  index={self._size(hash_index)}  "
+            f"avg lookup={hash_time * 1000:.3f} ms"
+        )
+
+    def _time(self, lookup, sample):
+        started = time.perf_counter()
+        for token in sample:
+            lookup(token)
+        return (time.perf_counter() - started) / len(sample)
+
+    def _index_on(self, table, column):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # UNIQUE columns get an implicit sqlite_autoindex_* that introspection doesn't name
+                cursor.execute(f'PRAGMA index_list({table})')
+                for index_name in [row[1] for row in cursor.fetchall()]:
+                    cursor.execute(f'PRAGMA index_info("{index_name}")')
+                    if [row[2] for row in cursor.fetchall()] == [column]:
+                        return index_name
+                return None
+            constraints = connection.introspection.get_constraints(cursor, table)
+        for name, info in constraints.items():
+            if info['columns'] == [column] and (info['index'] or info['unique']):
+                return name
+        return None
+
+    def _size(self, index_name):
+        if not index_name:
+            return 'n/a'
+        with connection.cursor() as cursor:
+            try:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('SELECT pg_relation_size(%s::regclass)', [index_name])
+                elif connection.vendor == 'sqlite':
+                    cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [index_name])
+                else:
+                    return 'n/a'
+                size = cursor.fetchone()[0]
+            except Exception:
+                return 'n/a'
+        return f'{(size or 0) / 1024:,.0f} KiB'
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from notifications.models import FCMToken
+from notifications.topics import sync_topic_subscriptions
+
+class Command(BaseCommand):
+    help = 'Re-check every FCM token against its batch topics and repair subscription drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-issue every subscription instead of only the diff against recorded topics'
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Tokens processed per pass')
+
+    def handle(self, *args, **options):
+        marked = FCMToken.objects.update(topics_synced=False)
+        self.stdout.write(f"Checking {marked} tokens...")
+
+        totals = {'subscribed': 0, 'unsubscribed': 0, 'failed': 0}
+        last_pk = 0
+        while True:
+            stats = sync_topic_subscriptions(limit=options['chunk_size'], after_pk=last_pk, full=options['full'])
+            for key in totals:
+                totals[key] += stats[key]
+            if stats['processed'] < options['chunk_size']:
+                break
+            last_pk = stats['last_pk']
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Topic subscriptions reconciled: {totals['subscribed']} subscribed, "
+            f"{totals['unsubscribed']} unsubscribed, {totals['failed']} failed."
+        ))
@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+from django_apscheduler.jobstores import DjangoJobStore
+from django_apscheduler import util
+from notifications.outbox import process_outbox
+from notifications.services import suppression_stats
+from notifications.topics import sync_topic_subscriptions
+from notifications.heartbeats import flush_token_heartbeats
+from attendance.checkin import flush_check_ins
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@util.close_old_connections
+def drain_notification_outbox():
+    """
+    Deliver every due outbox entry, one slice at a time.
+    """
+    while True:
+        stats = process_outbox()
+        if any(stats.values()):
+            logger.info(f"Outbox drained: {stats}")
+        if sum(stats.values()) < settings.NOTIFICATION_OUTBOX_BATCH_SIZE:
+            break
+
+
+@util.close_old_connections
+def sync_topics():
+    """
+    Push pending topic (un)subscriptions to FCM in batches.
+    """
+    sync_topic_subscriptions()
+
+
+@util.close_old_connections
+def flush_heartbeats():
+    """
+    Write buffered save-token heartbeats to the database in bulk.
+    """
+    flush_token_heartbeats()
+
+
+@util.close_old_connections
+def flush_attendance_check_ins():
+    """
+    Turn buffered QR check-ins into attendance records.
+    """
+    flush_check_ins()
+
+
+def _jobs(interval):
+    """
+    (id, function, trigger) of every periodic job the worker runs.
+    """
+    jobs = [
+        ("drain_notification_outbox", drain_notification_outbox, IntervalTrigger(seconds=interval)),
+        ("flush_token_heartbeats", flush_heartbeats,
+         IntervalTrigger(seconds=settings.NOTIFICATION_HEARTBEAT_FLUSH_SECONDS)),
+        ("flush_attendance_check_ins", flush_attendance_check_ins,
+         IntervalTrigger(seconds=settings.ATTENDANCE_CHECKIN_FLUSH_SECONDS)),
+    ]
+    if settings.NOTIFICATION_USE_TOPICS:
+        # Before the drain, so new tokens are subscribed by the time --once sends
+        jobs.insert(0, ("sync_topic_subscriptions", sync_topics, IntervalTrigger(seconds=interval)))
+    return jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the background jobs: deliver queued push notifications (with retries and backoff), '
+        'and flush token heartbeats and QR check-ins'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every job once and exit (for cron jobs)')
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.NOTIFICATION_WORKER_INTERVAL_SECONDS,
+            help='Seconds between outbox polls'
+        )
+
+    def handle(self, *args, **options):
+        jobs = _jobs(options['interval'])
+        if options['once']:
+            for job_id, job, _ in jobs:
+                job()
+            self.stdout.write(self.style.SUCCESS(
+                f'Ran {", ".join(job_id for job_id, _, _ in jobs)}. Suppressed so far: {suppression_stats()}'
+            ))
+            return
+
+        scheduler = BlockingScheduler(timezone=settings.TIME_ZONE)
+        scheduler.add_jobstore(DjangoJobStore(), "default")
+        for job_id, job, trigger in jobs:
+            scheduler.add_job(
+                job,
+                trigger=trigger,
+                id=job_id,
+                max_instances=1,
+                coalesce=True,
+                replace_existing=True,
+            )
+
+        self.stdout.write(f"Notification worker started (polling every {options['interval']}s).")
+        try:
+            scheduler.start()
+        except KeyboardInterrupt:
+            scheduler.shutdown()
+            self.stdout.write(self.style.SUCCESS('Notification worker stopped.'))
@@ -1,41 +1,56 @@
+import time
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from core.models import User
-from fees.models import FeePayment
-from notifications.services import send_push_notification
-from datetime import timedelta
+from students.models import StudentProfile
+from notifications.audience import user_tokens
+from notifications.services import dispatch_multicast, get_transport
 
 class Command(BaseCommand):
     help = 'Send push notifications to students with overdue fees'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report who would be reminded without sending anything')
+        parser.add_argument(
+            '--batch',
+            type=int,
+            action='append',
+            dest='batches',
+            help='Only remind students in this batch id (repeatable)'
+        )
+
     def handle(self, *args, **options):
-        today = timezone.now().date()
-        students = User.objects.filter(is_student=True, student_profile__isnull=False)
-        sent_count = 0
+        started = time.perf_counter()
+        overdue = StudentProfile.objects.filter(
+            user__is_student=True
+        ).with_fee_status().filter(is_due=True)
+        if options['batches']:
+            overdue = overdue.filter(batch_id__in=options['batches'])
+
+        user_ids = list(overdue.values_list('user_id', flat=True))
+        tokens = user_tokens(user_ids) if user_ids else []
 
-        for user in students:
-            profile = user.student_profile
-            join_date = profile.date_of_join
-            days_since_join = (today - join_date).days
-            
-            fee_due = False
-            if days_since_join > 30:
-                last_payment = FeePayment.objects.filter(student=user).order_by('-date').first()
-                if not last_payment:
-                    fee_due = True
-                else:
-                    days_since_payment = (today - last_payment.date).days
-                    if days_since_payment > 30:
-                        fee_due = True
+        if options['dry_run']:
+            self.stdout.write(
+                f"[dry run] {len(user_ids)} students overdue, {len(tokens)} devices would be notified "
+                f"({time.perf_counter() - started:.2f}s)."
+            )
+            return
 
-            if fee_due:
-                success = send_push_notification(
-                    [user.id],
-                    title="Fee Payment Reminder",
-                    body="Your monthly fee is due. Please pay as soon as possible to avoid interruptions.",
-                    click_action="/fees/history/"
-                )
-                if success:
-                    sent_count += 1
+        stats = {'success': 0, 'failure': 0, 'deactivated': 0}
+        if tokens:
+            transport = get_transport()
+            if not transport.is_ready():
+                self.stdout.write(self.style.ERROR('Firebase is not configured; no reminders sent.'))
+                return
+            stats = dispatch_multicast(
+                tokens,
+                title="Fee Payment Reminder",
+                body="Your monthly fee is due. Please pay as soon as possible to avoid interruptions.",
+                click_action="/fees/history/",
+                transport=transport,
+            )
 
-        self.stdout.write(self.style.SUCCESS(f'Successfully sent {sent_count} fee reminders.'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Fee reminders: {len(user_ids)} students overdue, {len(tokens)} devices, "
+            f"{stats['success']} delivered, {stats['failure']} failed, "
+            f"{stats['deactivated']} tokens deactivated in {time.perf_counter() - started:.2f}s."
+        ))
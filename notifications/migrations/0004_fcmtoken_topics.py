@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 11:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notificationoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fcmtoken',
+            name='topics',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='fcmtoken',
+            name='topics_synced',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='fcmtoken',
+            index=models.Index(condition=models.Q(('topics_synced', False)), fields=['topics_synced'], name='fcmtoken_topics_dirty_idx'),
+        ),
+    ]
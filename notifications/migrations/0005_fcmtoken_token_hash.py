@@ -0,0 +1,46 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_token_hash(apps, schema_editor):
+    FCMToken = apps.get_model('notifications', 'FCMToken')
+    batch = []
+    for fcm_token in FCMToken.objects.only('id', 'token').iterator(chunk_size=1000):
+        fcm_token.token_hash = hashlib.blake2b(fcm_token.token.encode(), digest_size=16).digest()
+        batch.append(fcm_token)
+        if len(batch) >= 1000:
+            FCMToken.objects.bulk_update(batch, ['token_hash'])
+            batch = []
+    if batch:
+        FCMToken.objects.bulk_update(batch, ['token_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_fcmtoken_topics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fcmtoken',
+            name='token_hash',
+            field=models.BinaryField(editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_token_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='fcmtoken',
+            name='token_hash',
+            field=models.BinaryField(editable=False, max_length=16, unique=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='fcmtoken',
+            name='notificatio_token_23c95b_idx',
+        ),
+        migrations.AlterField(
+            model_name='fcmtoken',
+            name='token',
+            field=models.TextField(),
+        ),
+    ]
@@ -1,5 +1,7 @@
+import hashlib
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class FCMToken(models.Model):
     DEVICE_TYPES = (
@@ -8,11 +10,17 @@ class FCMToken(models.Model):
     )
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='fcm_tokens')
-    token = models.TextField(unique=True)
+    token = models.TextField()
+    # 16-byte BLAKE2b digest of `token`: the compact unique key used for lookups
+    token_hash = models.BinaryField(max_length=16, unique=True, editable=False)
     device_id = models.CharField(max_length=255, null=True, blank=True)
     device_type = models.CharField(max_length=10, choices=DEVICE_TYPES, default='WEB')
     browser = models.CharField(max_length=100, null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # FCM topics this token is subscribed to, and whether that still matches
+    # the owner's batch (see notifications.topics.sync_topic_subscriptions)
+    topics = models.JSONField(default=list, blank=True)
+    topics_synced = models.BooleanField(default=False)
     last_used_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -22,8 +30,67 @@ class FCMToken(models.Model):
         verbose_name_plural = "FCM Tokens"
         indexes = [
             models.Index(fields=['user', 'is_active']),
-            models.Index(fields=['token']),
+            models.Index(
+                fields=['topics_synced'],
+                condition=models.Q(topics_synced=False),
+                name='fcmtoken_topics_dirty_idx',
+            ),
         ]
 
+    @staticmethod
+    def hash_token(token):
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def save(self, *args, **kwargs):
+        self.token_hash = self.hash_token(self.token)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'token' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'token_hash'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username} - {self.device_type} ({self.browser or 'Unknown'})"
+
+
+class NotificationOutbox(models.Model):
+    """
+    A push notification waiting to be delivered.
+    Rows are written in the same transaction as the change that triggered them
+    and drained by the `run_notification_worker` management command.
+    """
+    AUDIENCE_CHOICES = (
+        ('USERS', 'Specific Users'),
+        ('BATCHES', 'Batch Students'),
+        ('ALL_STUDENTS', 'All Students'),
+    )
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+        ('SUPPRESSED', 'Suppressed'),
+    )
+
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES, default='USERS')
+    target_ids = models.JSONField(default=list, blank=True)
+    title = models.CharField(max_length=255)
+    body = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+    click_action = models.CharField(max_length=255, default='/')
+    # Digest of (audience, targets, category, object); repeats inside the dedup window are suppressed
+    dedup_key = models.CharField(max_length=40, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Notification Outbox Entry"
+        verbose_name_plural = "Notification Outbox"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.title} -> {self.get_audience_display()} ({self.status})"
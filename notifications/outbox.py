@@ -0,0 +1,213 @@
+import logging
+import threading
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_notification(audience, target_ids, title, body, data=None, click_action=None,
+                         category=None, object_id=None):
+    """
+    Queue a push notification for background delivery.
+    The outbox row is written inside the caller's transaction, so it only
+    becomes visible to the worker once the triggering change has committed.
+    With a `category`, the worker drops identical repeats (same audience,
+    category, object_id, title and body) inside the dedup window; it also drops recipients
+    over the hourly cap (see _apply_limits).
+    """
+    from .services import notification_dedup_key
+
+    target_ids = list(target_ids or [])
+    entry = NotificationOutbox.objects.create(
+        audience=audience,
+        target_ids=target_ids,
+        title=title,
+        body=body,
+        data=data or {},
+        click_action=click_action or "/",
+        dedup_key=notification_dedup_key(audience, target_ids, category, object_id, title, body) if category else '',
+    )
+    if getattr(settings, 'NOTIFICATION_OUTBOX_EAGER', False):
+        transaction.on_commit(lambda: _deliver_in_background(entry.pk))
+    return entry
+
+
+class _CoalescedNotifications:
+    """
+    Per-transaction buffer of per-user notifications. On commit, users that
+    received identical content are merged into a single outbox entry.
+    """
+
+    def __init__(self):
+        self.groups = {}
+        self.flushed = False
+
+    def add(self, user_id, title, body, data, click_action):
+        key = (title, body, click_action, tuple(sorted((data or {}).items())))
+        self.groups.setdefault(key, []).append(user_id)
+
+    def __call__(self):
+        self.flushed = True
+        for (title, body, click_action, data), user_ids in self.groups.items():
+            enqueue_notification('USERS', sorted(set(user_ids)), title, body, dict(data), click_action)
+
+
+_local = threading.local()
+
+
+def coalesce_user_notification(user_id, title, body, data=None, click_action=None):
+    """
+    Queue a single-user notification, merging it with identical notifications
+    raised in the same transaction so they go out as one multicast.
+    Outside a transaction this is the same as enqueue_notification.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        return enqueue_notification('USERS', [user_id], title, body, data, click_action)
+
+    # Only the on_commit queue holds the buffer strongly: a rollback discards
+    # the queue and the buffer with it, so a dead (or flushed) buffer means
+    # this is a new transaction.
+    buffer = _local.buffer() if getattr(_local, 'buffer', None) else None
+    if buffer is None or buffer.flushed:
+        buffer = _CoalescedNotifications()
+        _local.buffer = weakref.ref(buffer)
+        transaction.on_commit(buffer)
+    buffer.add(user_id, title, body, data, click_action)
+
+
+def _deliver_in_background(entry_id):
+    """
+    Drain a single entry in a daemon thread (development / no-worker setups).
+    """
+    def run():
+        try:
+            process_outbox(entry_ids=[entry_id])
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _claim_entries(limit, entry_ids=None):
+    """
+    Lock a slice of due entries and push their next_attempt_at forward,
+    so concurrent workers don't pick up the same rows while FCM is in flight.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'NOTIFICATION_OUTBOX_BACKOFF_SECONDS', 30))
+    with transaction.atomic():
+        queryset = NotificationOutbox.objects.select_for_update(skip_locked=True).filter(
+            status='PENDING',
+            next_attempt_at__lte=now,
+        )
+        if entry_ids is not None:
+            queryset = queryset.filter(pk__in=entry_ids)
+        entries = list(queryset.order_by('next_attempt_at', 'pk')[:limit])
+        if entries:
+            NotificationOutbox.objects.filter(pk__in=[e.pk for e in entries]).update(
+                next_attempt_at=now + lease
+            )
+    return entries
+
+
+def _apply_limits(entry):
+    """
+    Dedup and hourly-cap checks for an entry's first delivery attempt.
+    They run here rather than at enqueue time so a rolled-back save never
+    claims a window or a slot. Returns 'duplicate' or 'throttled' when
+    nothing is left to send; a partly capped user list is narrowed to its
+    remaining users (stored on the entry, so retries don't count again).
+    The cap applies to per-user notifications only: batch and all-student
+    entries keep their topic / cached-audience delivery and cost no
+    per-student counters.
+    """
+    from .services import is_duplicate_notification, throttle_recipients
+
+    if entry.dedup_key and is_duplicate_notification(entry.dedup_key, entry.pk):
+        return 'duplicate'
+    if not settings.NOTIFICATION_HOURLY_CAP or entry.audience != 'USERS':
+        return None
+    allowed = throttle_recipients(entry.target_ids)
+    if len(allowed) < len(entry.target_ids):
+        if not allowed:
+            return 'throttled'
+        entry.target_ids = allowed
+    return None
+
+
+def _deliver(entry):
+    """
+    Send one outbox entry. Raises on Firebase errors so the caller can retry.
+    """
+    from .services import send_push_notification, notify_batch_students, notify_all_students
+
+    kwargs = {
+        'title': entry.title,
+        'body': entry.body,
+        'data': entry.data,
+        'click_action': entry.click_action,
+        'fail_silently': False,
+    }
+    if entry.audience == 'BATCHES':
+        return notify_batch_students(entry.target_ids, **kwargs)
+    if entry.audience == 'ALL_STUDENTS':
+        return notify_all_students(**kwargs)
+    return send_push_notification(entry.target_ids, **kwargs)
+
+
+def _retry_delay(attempts):
+    """
+    Exponential backoff: base * 2^(attempts - 1), capped.
+    """
+    base = getattr(settings, 'NOTIFICATION_OUTBOX_BACKOFF_SECONDS', 30)
+    cap = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_BACKOFF_SECONDS', 3600)
+    return timedelta(seconds=min(cap, base * (2 ** max(attempts - 1, 0))))
+
+
+def process_outbox(limit=None, entry_ids=None):
+    """
+    Deliver due outbox entries. Returns a dict with sent/retried/failed/
+    suppressed counts.
+    """
+    limit = limit or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 50)
+    max_attempts = getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+    stats = {'sent': 0, 'retried': 0, 'failed': 0, 'suppressed': 0}
+
+    for entry in _claim_entries(limit, entry_ids):
+        entry.attempts += 1
+        try:
+            suppressed = _apply_limits(entry) if entry.attempts == 1 else None
+            if not suppressed:
+                _deliver(entry)
+        except Exception as e:
+            entry.last_error = str(e)[:1000]
+            if entry.attempts >= max_attempts:
+                entry.status = 'FAILED'
+                stats['failed'] += 1
+                logger.error(f"Giving up on notification {entry.pk} after {entry.attempts} attempts: {e}")
+            else:
+                entry.next_attempt_at = timezone.now() + _retry_delay(entry.attempts)
+                stats['retried'] += 1
+                logger.warning(f"Notification {entry.pk} failed (attempt {entry.attempts}), retrying: {e}")
+        else:
+            if suppressed:
+                entry.status = 'SUPPRESSED'
+                entry.last_error = f'Suppressed: {suppressed}'
+                stats['suppressed'] += 1
+            else:
+                entry.status = 'SENT'
+                entry.sent_at = timezone.now()
+                stats['sent'] += 1
+
+        entry.save(update_fields=[
+            'audience', 'target_ids', 'status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'
+        ])
+
+    return stats
@@ -1,11 +1,21 @@
 import firebase_admin
 from firebase_admin import credentials, messaging
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .models import FCMToken
+from .audience import user_tokens, batch_tokens, all_student_tokens, invalidate_audience_cache
+from .topics import ALL_STUDENTS_TOPIC, batch_topic
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Firebase Cloud Messaging supports batching up to 500 tokens per call
+FCM_MULTICAST_LIMIT = 500
+
 def _initialize_firebase():
     """
     Initialize Firebase Admin SDK if not already initialized.
@@ -20,112 +30,281 @@ def _initialize_firebase():
             return False
     return True
 
-def send_push_notification(user_ids, title, body, data=None, click_action=None):
+def get_transport():
+    """
+    Instantiate the push transport configured in settings.NOTIFICATION_TRANSPORT.
+    """
+    return import_string(getattr(
+        settings, 'NOTIFICATION_TRANSPORT', 'notifications.transports.FirebaseTransport'
+    ))()
+
+def send_push_notification(user_ids, title, body, data=None, click_action=None, fail_silently=True, transport=None):
     """
     Send push notifications to a list of users.
     Handles multiple devices per user and removes invalid tokens.
+    With fail_silently=False, Firebase errors are raised so the outbox worker can retry.
+    """
+    return _send_to_tokens(
+        lambda: user_tokens(user_ids), f"users: {user_ids}",
+        title, body, data, click_action, fail_silently, transport
+    )
+
+def _send_to_tokens(resolve_tokens, audience_label, title, body, data, click_action, fail_silently, transport):
     """
-    if not _initialize_firebase():
+    Resolve an audience to tokens (only once the transport is ready) and fan out.
+    """
+    transport = transport or get_transport()
+    if not transport.is_ready():
+        if not fail_silently:
+            raise RuntimeError("Firebase Admin SDK is not initialized.")
         return False
 
-    # Get all active tokens for these users
-    tokens_queryset = FCMToken.objects.filter(
-        user_id__in=user_ids,
-        is_active=True
-    )
-    
-    if not tokens_queryset.exists():
-        logger.warning(f"No active tokens found for users: {user_ids}")
+    tokens_list = resolve_tokens()
+    if not tokens_list:
+        logger.warning(f"No active tokens found for {audience_label}")
         return False
 
-    tokens_list = list(tokens_queryset.values_list('token', flat=True))
-    
-    # Firebase Cloud Messaging supports batching up to 500 tokens per call
-    batch_size = 500
-    for i in range(0, len(tokens_list), batch_size):
-        batch = tokens_list[i:i + batch_size]
-        
-        # Prepare message
-        # We include notification info in BOTH 'notification' and 'data' blocks
-        # to ensure maximum compatibility with different mobile browsers and background states.
-        message_data = data or {}
-        message_data.update({
-            'title': title,
-            'body': body,
-            'url': click_action or "/"
-        })
-
-        message = messaging.MulticastMessage(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            data=message_data,
-            tokens=batch,
-            android=messaging.AndroidConfig(
-                priority='high',
-                notification=messaging.AndroidNotification(
-                    icon='stock_ticker_update',
-                    color='#4f46e5',
-                    sound='default',
-                    tag='academy_update'
-                ),
+    dispatch_multicast(tokens_list, title, body, data, click_action, fail_silently=fail_silently, transport=transport)
+    return True
+
+def _message_fields(title, body, data=None, click_action=None):
+    """
+    Notification, data and platform blocks shared by multicast and topic messages.
+    """
+    # We include notification info in BOTH 'notification' and 'data' blocks
+    # to ensure maximum compatibility with different mobile browsers and background states.
+    message_data = dict(data or {})
+    message_data.update({
+        'title': title,
+        'body': body,
+        'url': click_action or "/"
+    })
+
+    return dict(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        data=message_data,
+        android=messaging.AndroidConfig(
+            priority='high',
+            notification=messaging.AndroidNotification(
+                icon='stock_ticker_update',
+                color='#4f46e5',
+                sound='default',
+                tag='academy_update'
             ),
-            webpush=messaging.WebpushConfig(
-                headers={
-                    'Urgency': 'high'
-                },
-                notification=messaging.WebpushNotification(
-                    icon='/static/images/icon-192x192.png',
-                    badge='/static/images/icon-192x192.png',
-                    tag='academy_update',
-                    renotify=True,
-                )
+        ),
+        webpush=messaging.WebpushConfig(
+            headers={
+                'Urgency': 'high'
+            },
+            notification=messaging.WebpushNotification(
+                icon='/static/images/icon-192x192.png',
+                badge='/static/images/icon-192x192.png',
+                tag='academy_update',
+                renotify=True,
             )
         )
+    )
+
+def build_multicast_message(tokens, title, body, data=None, click_action=None):
+    """
+    Build the FCM multicast message for one slice of tokens.
+    """
+    return messaging.MulticastMessage(tokens=tokens, **_message_fields(title, body, data, click_action))
+
+def send_to_topics(topics, title, body, data=None, click_action=None, fail_silently=True, transport=None):
+    """
+    Send one message per FCM topic, whatever the audience size.
+    """
+    transport = transport or get_transport()
+    if not transport.is_ready():
+        if not fail_silently:
+            raise RuntimeError("Firebase Admin SDK is not initialized.")
+        return False
 
+    for topic in topics:
         try:
-            response = messaging.send_each_for_multicast(message)
-            _handle_batch_response(response, batch)
-            logger.info(f"Successfully sent {response.success_count} notifications.")
+            transport.send(messaging.Message(topic=topic, **_message_fields(title, body, data, click_action)))
         except Exception as e:
-            logger.error(f"Error sending multicast message: {e}")
-
+            logger.error(f"Error sending to topic {topic}: {e}")
+            if not fail_silently:
+                raise
+    logger.info(f"Sent notification to topics: {', '.join(topics)}")
     return True
 
+def dispatch_multicast(tokens, title, body, data=None, click_action=None, fail_silently=True,
+                       transport=None, concurrency=None):
+    """
+    Fan a notification out to `tokens` in 500-token slices, sending up to
+    `concurrency` slices at once (settings.NOTIFICATION_FANOUT_CONCURRENCY).
+    Invalid tokens from every slice are deactivated in a single UPDATE.
+    Returns a dict with success/failure/deactivated counts.
+
+    With fail_silently=False an error is raised only when no slice was sent:
+    a retry resends the whole audience, so after a partial failure it would
+    notify the delivered slices twice. Partial failures are logged instead.
+    """
+    transport = transport or get_transport()
+    concurrency = concurrency or getattr(settings, 'NOTIFICATION_FANOUT_CONCURRENCY', 4)
+    slices = [tokens[i:i + FCM_MULTICAST_LIMIT] for i in range(0, len(tokens), FCM_MULTICAST_LIMIT)]
+    stats = {'success': 0, 'failure': 0, 'deactivated': 0}
+    if not slices:
+        return stats
+
+    invalid_tokens = []
+    errors = []
+    # Only the network calls run in the pool; all database work stays on this thread.
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(slices)))) as pool:
+        futures = {
+            pool.submit(transport.send_multicast, build_multicast_message(batch, title, body, data, click_action)): batch
+            for batch in slices
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                response = future.result()
+            except Exception as e:
+                logger.error(f"Error sending multicast message: {e}")
+                stats['failure'] += len(batch)
+                errors.append(e)
+                continue
+            stats['success'] += response.success_count
+            stats['failure'] += response.failure_count
+            invalid_tokens.extend(_handle_batch_response(response, batch))
+
+    if invalid_tokens:
+        logger.info(f"Deactivating {len(invalid_tokens)} invalid tokens.")
+        stats['deactivated'] = FCMToken.objects.filter(
+            token_hash__in=[FCMToken.hash_token(token) for token in invalid_tokens]
+        ).update(
+            is_active=False, topics_synced=False
+        )
+        invalidate_audience_cache()
+
+    logger.info(f"Successfully sent {stats['success']} notifications in {len(slices)} batches.")
+    if errors and len(errors) < len(slices):
+        logger.error(f"{len(errors)} of {len(slices)} batches failed and will not be retried.")
+    elif errors and not fail_silently:
+        raise errors[0]
+    return stats
+
 def _handle_batch_response(response, tokens):
     """
-    Cleanup invalid/expired tokens based on Firebase response.
+    Collect invalid/expired tokens from a Firebase response.
     """
+    invalid_tokens = []
     if response.failure_count > 0:
-        responses = response.responses
-        invalid_tokens = []
-        for idx, resp in enumerate(responses):
+        for idx, resp in enumerate(response.responses):
             if not resp.success:
                 # Common errors: Unregistered, InvalidArgument, etc.
                 # If unregistered, the token is no longer valid.
                 err_code = resp.exception.code if hasattr(resp.exception, 'code') else str(resp.exception)
                 if err_code in ['messaging/registration-token-not-registered', 'messaging/invalid-registration-token']:
                     invalid_tokens.append(tokens[idx])
-        
-        if invalid_tokens:
-            logger.info(f"Deactivating {len(invalid_tokens)} invalid tokens.")
-            FCMToken.objects.filter(token__in=invalid_tokens).update(is_active=False)
+    return invalid_tokens
 
-def notify_batch_students(batch_ids, title, body, data=None, click_action=None):
+def notify_batch_students(batch_ids, title, body, data=None, click_action=None, fail_silently=True, transport=None):
     """
     Helper to notify all students in specific batches.
     """
-    from core.models import User
-    users = User.objects.filter(student_profile__batch_id__in=batch_ids, is_student=True)
-    user_ids = list(users.values_list('id', flat=True))
-    return send_push_notification(user_ids, title, body, data, click_action)
+    if settings.NOTIFICATION_USE_TOPICS:
+        return send_to_topics(
+            [batch_topic(batch_id) for batch_id in sorted(set(batch_ids))],
+            title, body, data, click_action, fail_silently, transport
+        )
+    return _send_to_tokens(
+        lambda: batch_tokens(batch_ids), f"batches: {batch_ids}",
+        title, body, data, click_action, fail_silently, transport
+    )
 
-def notify_all_students(title, body, data=None, click_action=None):
+def notify_all_students(title, body, data=None, click_action=None, fail_silently=True, transport=None):
     """
     Helper to notify all registered students.
     """
-    from core.models import User
-    users = User.objects.filter(is_student=True)
-    user_ids = list(users.values_list('id', flat=True))
-    return send_push_notification(user_ids, title, body, data, click_action)
+    if settings.NOTIFICATION_USE_TOPICS:
+        return send_to_topics([ALL_STUDENTS_TOPIC], title, body, data, click_action, fail_silently, transport)
+    return _send_to_tokens(
+        all_student_tokens, "all students",
+        title, body, data, click_action, fail_silently, transport
+    )
+
+# --- DEDUPLICATION & RATE LIMITING ---
+
+SUPPRESSED_COUNTER_KEY = 'notifications:suppressed:{reason}'
+
+def _count_suppressed(reason, amount=1):
+    key = SUPPRESSED_COUNTER_KEY.format(reason=reason)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, timeout=None)
+
+def suppression_stats():
+    """
+    How many notifications were dropped as duplicates or by the hourly cap.
+    """
+    return {
+        reason: cache.get(SUPPRESSED_COUNTER_KEY.format(reason=reason), 0)
+        for reason in ('duplicate', 'throttled')
+    }
+
+def notification_dedup_key(audience, target_ids, category, object_id=None, title='', body=''):
+    """
+    Digest identifying "the same notification": audience, targets, category,
+    object and the text shown. Stored on the outbox entry and checked when it
+    is delivered. The text is part of the key so a correction (e.g. an exam
+    moved to another date) is never dropped as a repeat of the original.
+    """
+    targets = ','.join(str(i) for i in sorted(target_ids))
+    return hashlib.sha1(f"{audience}|{targets}|{category}|{object_id}|{title}|{body}".encode()).hexdigest()
+
+def is_duplicate_notification(dedup_key, entry_id):
+    """
+    True if another outbox entry with `dedup_key` was delivered within
+    settings.NOTIFICATION_DEDUP_WINDOW_SECONDS; otherwise claims the window
+    for `entry_id`. The worker calls this right before delivery, so only
+    committed notifications ever claim a window.
+    """
+    key = f'notifications:dedup:{dedup_key}'
+    if cache.add(key, entry_id, timeout=settings.NOTIFICATION_DEDUP_WINDOW_SECONDS) or cache.get(key) == entry_id:
+        return False
+    _count_suppressed('duplicate')
+    logger.info(f"Suppressed duplicate notification {entry_id} ({dedup_key})")
+    return True
+
+def _claim_slot(key):
+    cache.add(key, 0, timeout=3600)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The counter expired between add and incr
+        cache.set(key, 1, timeout=3600)
+        return 1
+
+def throttle_recipients(user_ids):
+    """
+    Count one notification this hour for each user and return those still
+    within settings.NOTIFICATION_HOURLY_CAP. Each slot is claimed with an
+    atomic cache.incr, so concurrent senders can't push a user past the cap.
+    """
+    cap = settings.NOTIFICATION_HOURLY_CAP
+    user_ids = list(user_ids)
+    if not cap:
+        return user_ids
+
+    hour = int(time.time() // 3600)
+    keys = {f'notifications:cap:{user_id}:{hour}': user_id for user_id in user_ids}
+    # Users already at the cap are skipped without another increment
+    counts = cache.get_many(list(keys))
+    allowed = [
+        user_id for key, user_id in keys.items()
+        if counts.get(key, 0) < cap and _claim_slot(key) <= cap
+    ]
+
+    if len(allowed) < len(keys):
+        _count_suppressed('throttled', len(keys) - len(allowed))
+        logger.info(f"Hourly cap suppressed {len(keys) - len(allowed)} recipients")
+    return allowed
@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.contrib.auth.signals import user_logged_out
 from django.dispatch import receiver
 from django.conf import settings
@@ -8,27 +8,31 @@ from core.models import Announcement
 from assignments.models import Assignment
 from exams.models import Exam
 from notifications.models import FCMToken
-from notifications.services import (
-    send_push_notification, 
-    notify_batch_students, 
-    notify_all_students
-)
+from notifications.audience import invalidate_audience_cache
+from notifications.topics import mark_tokens_for_resync
+from students.models import StudentProfile
+from notifications.outbox import enqueue_notification, coalesce_user_notification
 
 import logging
 
 logger = logging.getLogger(__name__)
 
 # --- SYSTEM TRIGGERS ---
+# Receivers only queue notifications; delivery happens in run_notification_worker
+# so saves never wait on Firebase.
 
 @receiver(post_save, sender=StudyMaterial)
 def notify_new_material(sender, instance, created, **kwargs):
     if created:
-        batch_id = instance.batch.id
-        notify_batch_students(
+        batch_id = instance.batch_id
+        enqueue_notification(
+            'BATCHES',
             [batch_id],
             title="New Study Material",
             body=f"{instance.title} has been uploaded for {instance.subject.name if instance.subject else ''}.",
-            click_action="/materials/"
+            click_action="/materials/",
+            category='material',
+            object_id=instance.pk
         )
 
 @receiver(post_save, sender=Announcement)
@@ -38,58 +42,109 @@ def notify_new_announcement(sender, instance, created, **kwargs):
     Batch specific ones are handled by m2m_changed below.
     """
     if created and instance.target_type == 'ALL':
-        notify_all_students(
+        enqueue_notification(
+            'ALL_STUDENTS',
+            [],
             title=f"Announcement: {instance.title}",
             body=instance.content[:100],
-            click_action="/announcements/"
+            click_action="/announcements/",
+            category='announcement',
+            object_id=instance.pk
         )
 
 @receiver(m2m_changed, sender=Announcement.target_batches.through)
 def notify_batch_announcement(sender, instance, action, **kwargs):
     if action == "post_add" and instance.target_type == 'BATCH':
         batch_ids = list(instance.target_batches.values_list('id', flat=True))
-        notify_batch_students(
+        enqueue_notification(
+            'BATCHES',
             batch_ids,
             title=f"Batch Update: {instance.title}",
             body=instance.content[:100],
-            click_action="/announcements/"
+            click_action="/announcements/",
+            category='announcement',
+            object_id=instance.pk
         )
 
 @receiver(post_save, sender=Assignment)
 def notify_new_assignment(sender, instance, created, **kwargs):
     if created:
-        notify_batch_students(
-            [instance.batch.id],
+        enqueue_notification(
+            'BATCHES',
+            [instance.batch_id],
             title="New Assignment",
             body=f"{instance.title} - Due: {instance.due_date.strftime('%b %d')}",
-            click_action=f"/assignments/{instance.pk}/"
+            click_action=f"/assignments/{instance.pk}/",
+            category='assignment',
+            object_id=instance.pk
         )
 
 @receiver(post_save, sender=Exam)
 def notify_exam_schedule(sender, instance, created, **kwargs):
     title = "New Exam Scheduled" if created else "Exam Schedule Updated"
-    notify_batch_students(
-        [instance.batch.id],
+    enqueue_notification(
+        'BATCHES',
+        [instance.batch_id],
         title=title,
         body=f"{instance.title} is set for {instance.date.strftime('%b %d, %Y')}.",
-        click_action="/exams/"
+        click_action="/exams/",
+        category='exam',
+        object_id=instance.pk
     )
 
 from attendance.models import AttendanceRecord
+from attendance.signals import attendance_marked
 
 @receiver(post_save, sender=AttendanceRecord)
 def notify_attendance_alert(sender, instance, created, **kwargs):
     """
-    Notify student ONLY if they are marked ABSENT.
+    Notify student ONLY when their status changes to ABSENT.
+    Alerts raised in one transaction (e.g. a whole mark_attendance submit)
+    are coalesced into a single multicast after commit.
     """
-    if instance.status == 'ABSENT':
-        send_push_notification(
-            [instance.student.id],
+    previous_status = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if instance.status == 'ABSENT' and previous_status != 'ABSENT':
+        coalesce_user_notification(
+            instance.student_id,
             title="Attendance Alert",
             body=f"You were marked ABSENT for {instance.batch.name} on {instance.date}.",
             click_action="/attendance/my-attendance/"
         )
 
+@receiver(attendance_marked)
+def notify_attendance_alerts_bulk(sender, batch, date, changes, **kwargs):
+    """
+    Same alert for records saved through the bulk marking path.
+    """
+    for student_id, (previous_status, status) in changes.items():
+        if status == 'ABSENT' and previous_status != 'ABSENT':
+            coalesce_user_notification(
+                student_id,
+                title="Attendance Alert",
+                body=f"You were marked ABSENT for {batch.name} on {date}.",
+                click_action="/attendance/my-attendance/"
+            )
+
+# --- AUDIENCE CACHE INVALIDATION ---
+
+@receiver(post_save, sender=FCMToken)
+@receiver(post_delete, sender=FCMToken)
+def invalidate_audience_on_token_change(sender, instance, **kwargs):
+    invalidate_audience_cache()
+
+@receiver(post_save, sender=StudentProfile)
+def invalidate_audience_on_batch_change(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_loaded_batch_id', None) != instance.batch_id:
+        invalidate_audience_cache()
+        mark_tokens_for_resync(user_id=instance.user_id)
+    instance._loaded_batch_id = instance.batch_id
+
+@receiver(post_delete, sender=StudentProfile)
+def invalidate_audience_on_profile_delete(sender, instance, **kwargs):
+    invalidate_audience_cache()
+    mark_tokens_for_resync(user_id=instance.user_id)
+
 # --- SECURITY TRIGGERS ---
 
 @receiver(user_logged_out)
@@ -99,5 +154,6 @@ def deactivate_fcm_tokens_on_logout(sender, request, user, **kwargs):
     to prevent unauthorized notifications on shared devices.
     """
     if user:
-        FCMToken.objects.filter(user=user).update(is_active=False)
+        FCMToken.objects.filter(user=user).update(is_active=False, topics_synced=False)
+        invalidate_audience_cache()
         logger.info(f"Deactivated FCM tokens for user: {user.username} on logout.")
@@ -1,3 +1,547 @@
-from django.test import TestCase
+import io
+import json
+import time
+from datetime import date, timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from core.models import User
+from batches.models import Batch
+from exams.models import Exam
+from students.models import StudentProfile
+from .audience import AUDIENCE_VERSION_KEY, all_student_tokens, batch_tokens, invalidate_audience_cache
+from .models import FCMToken, NotificationOutbox
+from .outbox import _claim_entries, _retry_delay, coalesce_user_notification, enqueue_notification, process_outbox
+from .services import dispatch_multicast, notify_batch_students, notify_all_students, suppression_stats
+from .topics import sync_topic_subscriptions, TOPIC_BATCH_LIMIT
+from .heartbeats import HEARTBEAT_FLUSHING_KEY, flush_token_heartbeats, record_token_heartbeat
+from .transports import FakeTransport
 
-# Create your tests here.
+
+class FailingTransport(FakeTransport):
+    def send_multicast(self, message):
+        raise ConnectionError('FCM unavailable')
+
+
+class FirstSliceFailingTransport(FakeTransport):
+    def send_multicast(self, message):
+        if message.tokens[0] == 'token-0':
+            raise ConnectionError('FCM unavailable')
+        return super().send_multicast(message)
+
+
+class FakeRedis:
+    """
+    The hash commands the heartbeat buffer uses, on plain dicts.
+    """
+    def __init__(self):
+        self.hashes = {}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[str(field).encode()] = str(value).encode()
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def exists(self, key):
+        return int(key in self.hashes)
+
+    def rename(self, key, new_key):
+        self.hashes[new_key] = self.hashes.pop(key)
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+
+@override_settings(NOTIFICATION_USE_TOPICS=True, NOTIFICATION_OUTBOX_EAGER=False)
+class TopicSubscriptionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.transport = FakeTransport()
+        self.batch_a = Batch.objects.create(name='Batch A', start_date=date.today())
+        self.batch_b = Batch.objects.create(name='Batch B', start_date=date.today())
+
+    def _student(self, username, batch, token):
+        user = User.objects.create(username=username, is_student=True)
+        StudentProfile.objects.create(user=user, batch=batch)
+        FCMToken.objects.create(user=user, token=token)
+        return user
+
+    def test_sync_subscribes_tokens_to_batch_and_all_students_topics(self):
+        self._student('s1', self.batch_a, 'token-1')
+        self._student('s2', self.batch_b, 'token-2')
+
+        sync_topic_subscriptions(transport=self.transport)
+
+        self.assertEqual(self.transport.topics[f'batch-{self.batch_a.id}'], {'token-1'})
+        self.assertEqual(self.transport.topics[f'batch-{self.batch_b.id}'], {'token-2'})
+        self.assertEqual(self.transport.topics['all-students'], {'token-1', 'token-2'})
+        self.assertFalse(FCMToken.objects.filter(topics_synced=False).exists())
+
+    def test_sync_is_incremental(self):
+        self._student('s1', self.batch_a, 'token-1')
+        sync_topic_subscriptions(transport=self.transport)
+        calls = len(self.transport.topic_calls)
+
+        stats = sync_topic_subscriptions(transport=self.transport)
+
+        self.assertEqual(stats['processed'], 0)
+        self.assertEqual(len(self.transport.topic_calls), calls)
+
+    def test_batch_change_moves_subscription(self):
+        user = self._student('s1', self.batch_a, 'token-1')
+        sync_topic_subscriptions(transport=self.transport)
+
+        profile = StudentProfile.objects.get(user=user)
+        profile.batch = self.batch_b
+        profile.save()
+        sync_topic_subscriptions(transport=self.transport)
+
+        self.assertEqual(self.transport.topics[f'batch-{self.batch_a.id}'], set())
+        self.assertEqual(self.transport.topics[f'batch-{self.batch_b.id}'], {'token-1'})
+        self.assertEqual(
+            sorted(FCMToken.objects.get(token='token-1').topics),
+            ['all-students', f'batch-{self.batch_b.id}']
+        )
+
+    def test_subscriptions_are_sent_in_chunks_of_1000(self):
+        users = User.objects.bulk_create(
+            [User(username=f'bulk{i}', is_student=True) for i in range(TOPIC_BATCH_LIMIT + 5)]
+        )
+        StudentProfile.objects.bulk_create([StudentProfile(user=u, batch=self.batch_a) for u in users])
+        FCMToken.objects.bulk_create([
+            FCMToken(user=u, token=f'bulk-token-{u.id}', token_hash=FCMToken.hash_token(f'bulk-token-{u.id}'))
+            for u in users
+        ])
+
+        sync_topic_subscriptions(transport=self.transport)
+
+        batch_calls = [
+            len(tokens) for action, topic, tokens in self.transport.topic_calls
+            if topic == f'batch-{self.batch_a.id}'
+        ]
+        self.assertEqual(batch_calls, [TOPIC_BATCH_LIMIT, 5])
+
+    def test_batch_notification_sends_one_message_per_topic(self):
+        for i in range(3):
+            self._student(f's{i}', self.batch_a, f'token-{i}')
+
+        notify_batch_students([self.batch_a.id, self.batch_b.id], 'Title', 'Body', transport=self.transport)
+        notify_all_students('Title', 'Body', transport=self.transport)
+
+        self.assertEqual(
+            [message.topic for message in self.transport.messages],
+            [f'batch-{self.batch_a.id}', f'batch-{self.batch_b.id}', 'all-students']
+        )
+
+    def test_logout_deactivation_unsubscribes(self):
+        user = self._student('s1', self.batch_a, 'token-1')
+        sync_topic_subscriptions(transport=self.transport)
+
+        self.client.force_login(user)
+        self.client.post('/logout/')
+        sync_topic_subscriptions(transport=self.transport)
+
+        self.assertEqual(self.transport.topics['all-students'], set())
+        self.assertEqual(FCMToken.objects.get(token='token-1').topics, [])
+
+
+class SaveTokenHeartbeatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='s1', is_student=True)
+        self.client.force_login(self.user)
+        self.payload = {'token': 'token-1', 'device_id': 'ua', 'device_type': 'WEB', 'browser': 'Chrome'}
+
+    def _save(self):
+        return self.client.post(
+            '/notifications/save-token/', json.dumps(self.payload), content_type='application/json'
+        )
+
+    def test_unchanged_recent_token_skips_the_write(self):
+        self._save()
+        token = FCMToken.objects.get(token='token-1')
+        updated_at = token.updated_at
+
+        response = self._save()
+
+        self.assertEqual(response.json()['message'], 'Token already registered')
+        self.assertEqual(FCMToken.objects.get(pk=token.pk).updated_at, updated_at)
+
+    def test_heartbeat_is_written_directly_without_a_shared_cache(self):
+        self._save()
+        stale = timezone.now() - timedelta(hours=1)
+        FCMToken.objects.update(last_used_at=stale)
+
+        self._save()
+
+        self.assertGreater(FCMToken.objects.get(token='token-1').last_used_at, stale)
+        self.assertEqual(flush_token_heartbeats(), 0)
+
+    @override_settings(REDIS_URL='redis://test')
+    def test_buffered_heartbeats_are_flushed_with_their_own_timestamps(self):
+        redis = FakeRedis()
+        self._save()
+        other = FCMToken.objects.create(user=self.user, token='token-2')
+        stale = timezone.now() - timedelta(hours=1)
+        FCMToken.objects.update(last_used_at=stale)
+
+        with mock.patch('notifications.heartbeats._client', redis):
+            response = self._save()
+            self.assertEqual(response.json()['message'], 'Token already registered')
+            self.assertEqual(FCMToken.objects.get(token='token-1').last_used_at, stale)
+            earlier = timezone.now() - timedelta(hours=3)
+            record_token_heartbeat(other.pk, earlier)
+            # Left behind by a flush that stopped before its UPDATE
+            redis.hashes[HEARTBEAT_FLUSHING_KEY] = {str(other.pk).encode(): str((earlier - timedelta(hours=1)).timestamp()).encode()}
+
+            self.assertEqual(flush_token_heartbeats(), 1)
+            self.assertEqual(FCMToken.objects.get(pk=other.pk).last_used_at, earlier - timedelta(hours=1))
+            self.assertEqual(flush_token_heartbeats(), 2)
+            self.assertEqual(flush_token_heartbeats(), 0)
+
+        self.assertEqual(FCMToken.objects.get(pk=other.pk).last_used_at, earlier)
+        self.assertGreater(FCMToken.objects.get(token='token-1').last_used_at, earlier)
+        self.assertEqual(redis.hashes, {})
+
+    def test_changed_device_details_are_written(self):
+        self._save()
+        self.payload['browser'] = 'Firefox'
+
+        self._save()
+
+        self.assertEqual(FCMToken.objects.get(token='token-1').browser, 'Firefox')
+
+
+@override_settings(
+    NOTIFICATION_OUTBOX_EAGER=False,
+    NOTIFICATION_USE_TOPICS=False,
+    NOTIFICATION_TRANSPORT='notifications.transports.FakeTransport',
+    NOTIFICATION_HOURLY_CAP=2,
+)
+class NotificationLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.batch = Batch.objects.create(name='b', start_date=date.today())
+        self.students = []
+        for i in range(3):
+            user = User.objects.create(username=f's{i}', is_student=True)
+            StudentProfile.objects.create(user=user, batch=self.batch)
+            self.students.append(user.pk)
+
+    def _deliver(self, *args, **kwargs):
+        entry = enqueue_notification(*args, **kwargs)
+        process_outbox()
+        entry.refresh_from_db()
+        return entry
+
+    def test_rolled_back_notifications_do_not_claim_the_dedup_window(self):
+        with transaction.atomic():
+            enqueue_notification('BATCHES', [self.batch.pk], 'Exam', 'Body', category='exam', object_id=1)
+            transaction.set_rollback(True)
+
+        first = self._deliver('BATCHES', [self.batch.pk], 'Exam', 'Body', category='exam', object_id=1)
+        repeat = self._deliver('BATCHES', [self.batch.pk], 'Exam', 'Body', category='exam', object_id=1)
+        other = self._deliver('BATCHES', [self.batch.pk], 'Exam', 'Body', category='exam', object_id=2)
+
+        self.assertEqual((first.status, repeat.status, other.status), ('SENT', 'SUPPRESSED', 'SENT'))
+        self.assertEqual(suppression_stats()['duplicate'], 1)
+
+    def test_edited_exam_date_is_not_dropped_as_a_duplicate(self):
+        exam = Exam.objects.create(batch=self.batch, title='Maths', date=date(2026, 3, 1), total_marks=100)
+        exam.date = date(2026, 3, 8)
+        exam.save()
+        # Saved again without changes: the identical update is dropped
+        exam.save()
+        process_outbox()
+
+        sent = NotificationOutbox.objects.filter(status='SENT').order_by('pk')
+        self.assertEqual(
+            [entry.body for entry in sent], ['Maths is set for Mar 01, 2026.', 'Maths is set for Mar 08, 2026.']
+        )
+        self.assertEqual(NotificationOutbox.objects.filter(status='SUPPRESSED').count(), 1)
+
+    def test_hourly_cap_is_counted_per_student(self):
+        first, second, third = self.students
+        for _ in range(2):
+            self._deliver('USERS', [first], 'Personal', 'Body')
+
+        # The capped student is dropped from a user list; the others still get it
+        entry = self._deliver('USERS', [first, second, third], 'Alert', 'Body')
+        self.assertEqual((entry.status, entry.audience, entry.target_ids), ('SENT', 'USERS', [second, third]))
+        entry = self._deliver('USERS', [second, third], 'Alert 2', 'Body')
+        self.assertEqual((entry.status, entry.target_ids), ('SENT', [second, third]))
+
+        entry = self._deliver('USERS', [first, second, third], 'Alert 3', 'Body')
+        self.assertEqual((entry.status, entry.last_error), ('SUPPRESSED', 'Suppressed: throttled'))
+        self.assertEqual(suppression_stats(), {'duplicate': 0, 'throttled': 4})
+        self.assertEqual(NotificationOutbox.objects.filter(status='SENT').count(), 4)
+
+    def test_broadcasts_are_not_capped_or_narrowed(self):
+        for _ in range(2):
+            self._deliver('USERS', self.students, 'Personal', 'Body')
+
+        with self.assertNumQueries(8):
+            # Insert, claim (4), audience tokens, status update, reload; no student lookup
+            entry = self._deliver('BATCHES', [self.batch.pk], 'Material', 'Body')
+        self.assertEqual((entry.status, entry.audience, entry.target_ids), ('SENT', 'BATCHES', [self.batch.pk]))
+        entry = self._deliver('ALL_STUDENTS', [], 'Announcement', 'Body')
+        self.assertEqual((entry.status, entry.audience), ('SENT', 'ALL_STUDENTS'))
+        self.assertEqual(suppression_stats()['throttled'], 0)
+
+
+@override_settings(
+    NOTIFICATION_OUTBOX_EAGER=False,
+    NOTIFICATION_USE_TOPICS=False,
+    NOTIFICATION_HOURLY_CAP=0,
+    NOTIFICATION_TRANSPORT='notifications.transports.FakeTransport',
+    NOTIFICATION_OUTBOX_MAX_ATTEMPTS=3,
+    NOTIFICATION_OUTBOX_BACKOFF_SECONDS=30,
+    NOTIFICATION_OUTBOX_MAX_BACKOFF_SECONDS=100,
+)
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='s1', is_student=True)
+        FCMToken.objects.create(user=self.user, token='token-1')
+
+    def test_entries_are_only_queued_with_a_committed_change(self):
+        with transaction.atomic():
+            enqueue_notification('USERS', [self.user.pk], 'Rolled back', 'Body')
+            coalesce_user_notification(self.user.pk, 'Rolled back alert', 'Body')
+            transaction.set_rollback(True)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+        # Per-user alerts from one transaction become one entry after commit
+        other = User.objects.create(username='s2', is_student=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                coalesce_user_notification(self.user.pk, 'Alert', 'Body')
+                coalesce_user_notification(other.pk, 'Alert', 'Body')
+                self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(list(NotificationOutbox.objects.values_list('title', 'target_ids')), [
+            ('Alert', sorted([self.user.pk, other.pk]))
+        ])
+
+    def test_claimed_entries_are_leased_and_sent(self):
+        entry = enqueue_notification('USERS', [self.user.pk], 'Title', 'Body')
+        self.assertEqual([claimed.pk for claimed in _claim_entries(10)], [entry.pk])
+        # Leased: another worker polling now gets nothing
+        self.assertEqual(_claim_entries(10), [])
+
+        NotificationOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_outbox(), {'sent': 1, 'retried': 0, 'failed': 0, 'suppressed': 0})
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ('SENT', 1))
+        self.assertIsNotNone(entry.sent_at)
+
+    @override_settings(NOTIFICATION_TRANSPORT='notifications.tests.FailingTransport')
+    def test_failed_sends_back_off_then_give_up(self):
+        self.assertEqual([_retry_delay(n).seconds for n in (1, 2, 3, 4)], [30, 60, 100, 100])
+        entry = enqueue_notification('USERS', [self.user.pk], 'Title', 'Body')
+
+        for attempt in (1, 2):
+            before = timezone.now()
+            self.assertEqual(process_outbox()['retried'], 1)
+            entry.refresh_from_db()
+            self.assertEqual((entry.status, entry.attempts, entry.last_error), ('PENDING', attempt, 'FCM unavailable'))
+            self.assertGreaterEqual(entry.next_attempt_at, before + _retry_delay(attempt))
+            # Not due yet
+            self.assertEqual(process_outbox(), {'sent': 0, 'retried': 0, 'failed': 0, 'suppressed': 0})
+            NotificationOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+
+        self.assertEqual(process_outbox()['failed'], 1)
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ('FAILED', 3))
+
+    def test_worker_once_runs_every_job(self):
+        entry = enqueue_notification('USERS', [self.user.pk], 'Title', 'Body')
+        out = io.StringIO()
+        call_command('run_notification_worker', '--once', stdout=out)
+        self.assertIn('drain_notification_outbox, flush_token_heartbeats, flush_attendance_check_ins', out.getvalue())
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'SENT')
+
+
+class CleanupTokensTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='s1', is_student=True)
+        now = timezone.now()
+        self.tokens = {}
+        for name, is_active, updated_days, used_days in [
+            ('old-inactive', False, 31, 31),
+            ('recent-inactive', False, 29, 29),
+            ('stale', True, 91, 91),
+            ('in-use', True, 91, 1),
+        ]:
+            token = FCMToken.objects.create(user=self.user, token=name, is_active=is_active)
+            # auto_now would overwrite updated_at on save()
+            FCMToken.objects.filter(pk=token.pk).update(
+                updated_at=now - timedelta(days=updated_days), last_used_at=now - timedelta(days=used_days)
+            )
+            self.tokens[name] = token.pk
+
+    def _cleanup(self, *args):
+        out = io.StringIO()
+        call_command('cleanup_tokens', '--sleep', '0', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_tokens_outside_the_retention_windows(self):
+        version = cache.get(AUDIENCE_VERSION_KEY)
+        out = self._cleanup()
+        self.assertIn('Cleaned up 1 inactive tokens and 1 stale tokens', out)
+        self.assertEqual(
+            set(FCMToken.objects.values_list('token', flat=True)), {'recent-inactive', 'in-use'}
+        )
+        self.assertNotEqual(cache.get(AUDIENCE_VERSION_KEY), version)
+
+        self.assertIn('Cleaned up 1 inactive tokens and 0 stale tokens', self._cleanup('--inactive-days', '7'))
+        self.assertEqual(list(FCMToken.objects.values_list('token', flat=True)), ['in-use'])
+
+    def test_max_runtime_stops_and_the_next_run_resumes(self):
+        out = self._cleanup('--max-runtime', '0')
+        self.assertIn('Stopped at --max-runtime', out)
+        self.assertEqual(FCMToken.objects.count(), 4)
+
+        out = self._cleanup()
+        self.assertNotIn('Stopped', out)
+        self.assertEqual(FCMToken.objects.count(), 2)
+
+
+class DispatchMulticastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='s1', is_student=True)
+        self.tokens = [f'token-{i}' for i in range(1201)]
+
+    def test_tokens_are_sent_in_500_token_slices(self):
+        transport = FakeTransport()
+        stats = dispatch_multicast(self.tokens, 'Title', 'Body', transport=transport)
+        self.assertEqual(sorted(len(message.tokens) for message in transport.messages), [201, 500, 500])
+        self.assertEqual(stats, {'success': 1201, 'failure': 0, 'deactivated': 0})
+
+    def test_slices_are_sent_concurrently(self):
+        transport = FakeTransport(latency=0.2)
+        started = time.monotonic()
+        dispatch_multicast(self.tokens + self.tokens, 'Title', 'Body', transport=transport, concurrency=5)
+        self.assertEqual(transport.calls, 5)
+        self.assertLess(time.monotonic() - started, 0.6)
+
+    def test_invalid_tokens_from_every_slice_are_deactivated_at_once(self):
+        for token in ('token-3', 'token-700', 'token-1200', 'token-5'):
+            FCMToken.objects.create(user=self.user, token=token)
+        transport = FakeTransport(invalid_tokens={'token-3', 'token-700', 'token-1200'})
+        stats = dispatch_multicast(self.tokens, 'Title', 'Body', transport=transport)
+        self.assertEqual(stats, {'success': 1198, 'failure': 3, 'deactivated': 3})
+        self.assertEqual(list(FCMToken.objects.filter(is_active=True).values_list('token', flat=True)), ['token-5'])
+
+    def test_partial_failure_is_logged_not_raised(self):
+        transport = FirstSliceFailingTransport()
+        with self.assertLogs('notifications.services', 'ERROR') as logs:
+            stats = dispatch_multicast(self.tokens, 'Title', 'Body', fail_silently=False, transport=transport)
+        self.assertEqual(stats, {'success': 701, 'failure': 500, 'deactivated': 0})
+        self.assertIn('1 of 3 batches failed', logs.output[-1])
+
+        # Nothing was delivered, so a retry cannot duplicate anything
+        with self.assertRaises(ConnectionError):
+            dispatch_multicast(self.tokens[:500], 'Title', 'Body', fail_silently=False, transport=transport)
+
+
+@override_settings(REDIS_URL='redis://test', NOTIFICATION_OUTBOX_EAGER=False)
+class AudienceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.batch = Batch.objects.create(name='Batch A', start_date=date.today())
+        self.other = Batch.objects.create(name='Batch B', start_date=date.today())
+        self.user = User.objects.create(username='s1', is_student=True)
+        StudentProfile.objects.create(user=self.user, batch=self.batch)
+        FCMToken.objects.create(user=self.user, token='token-1')
+
+    def assertInvalidates(self, change):
+        batch_tokens([self.batch.pk])
+        version = cache.get(AUDIENCE_VERSION_KEY)
+        change()
+        self.assertNotEqual(cache.get(AUDIENCE_VERSION_KEY), version)
+
+    def test_cached_audience_is_served_until_invalidated(self):
+        self.assertEqual(batch_tokens([self.batch.pk]), ['token-1'])
+        self.assertEqual(all_student_tokens(), ['token-1'])
+        FCMToken.objects.update(is_active=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(batch_tokens([self.batch.pk]), ['token-1'])
+            self.assertEqual(all_student_tokens(), ['token-1'])
+        invalidate_audience_cache()
+        self.assertEqual((batch_tokens([self.batch.pk]), all_student_tokens()), ([], []))
+
+    @override_settings(REDIS_URL=None)
+    def test_no_cache_without_a_shared_cache(self):
+        self.assertEqual(batch_tokens([self.batch.pk]), ['token-1'])
+        FCMToken.objects.update(is_active=False)
+        self.assertEqual((batch_tokens([self.batch.pk]), all_student_tokens()), ([], []))
+
+    def test_token_save_and_delete_invalidate(self):
+        self.assertInvalidates(lambda: FCMToken.objects.create(user=self.user, token='token-2'))
+        self.assertInvalidates(lambda: FCMToken.objects.get(token='token-2').delete())
+
+    def test_batch_move_invalidates(self):
+        def move():
+            profile = StudentProfile.objects.get(user=self.user)
+            profile.batch = self.other
+            profile.save()
+        self.assertInvalidates(move)
+        self.assertEqual((batch_tokens([self.batch.pk]), batch_tokens([self.other.pk])), ([], ['token-1']))
+
+    def test_logout_invalidates(self):
+        self.client.force_login(self.user)
+        self.assertInvalidates(lambda: self.client.post('/logout/'))
+        self.assertEqual(batch_tokens([self.batch.pk]), [])
+
+    def test_invalid_token_deactivation_invalidates(self):
+        transport = FakeTransport(invalid_tokens={'token-1'})
+        self.assertInvalidates(lambda: dispatch_multicast(['token-1'], 'Title', 'Body', transport=transport))
+        self.assertEqual(batch_tokens([self.batch.pk]), [])
+
+
+@override_settings(
+    NOTIFICATION_OUTBOX_EAGER=False,
+    NOTIFICATION_TRANSPORT='notifications.transports.FakeTransport',
+)
+class SendFeeRemindersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.batch = Batch.objects.create(name='Batch A', start_date=date.today())
+        self.other = Batch.objects.create(name='Batch B', start_date=date.today())
+        long_ago = date.today() - timedelta(days=100)
+        for username, batch, joined, tokens in [
+            ('late-a', self.batch, long_ago, ['a-1', 'a-2']),
+            ('late-b', self.other, long_ago, ['b-1']),
+            ('new-a', self.batch, date.today(), ['n-1']),
+        ]:
+            user = User.objects.create(username=username, is_student=True)
+            StudentProfile.objects.create(user=user, batch=batch, date_of_join=joined)
+            for token in tokens:
+                FCMToken.objects.create(user=user, token=token)
+
+    def _remind(self, *args):
+        out = io.StringIO()
+        call_command('send_fee_reminders', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reminds_every_overdue_student_device(self):
+        out = self._remind()
+        self.assertIn('2 students overdue, 3 devices, 3 delivered, 0 failed', out)
+
+    def test_dry_run_sends_nothing(self):
+        with mock.patch('notifications.transports.FakeTransport.send_multicast') as send:
+            out = self._remind('--dry-run')
+        send.assert_not_called()
+        self.assertIn('[dry run] 2 students overdue, 3 devices would be notified', out)
+
+    def test_batch_option_limits_the_audience(self):
+        self.assertIn('1 students overdue, 2 devices, 2 delivered', self._remind('--batch', str(self.batch.pk)))
+        out = self._remind('--dry-run', '--batch', str(self.batch.pk), '--batch', str(self.other.pk))
+        self.assertIn('2 students overdue, 3 devices', out)
@@ -0,0 +1,123 @@
+import logging
+from collections import defaultdict
+
+from .models import FCMToken
+
+logger = logging.getLogger(__name__)
+
+ALL_STUDENTS_TOPIC = 'all-students'
+# FCM accepts at most 1000 registration tokens per (un)subscribe call
+TOPIC_BATCH_LIMIT = 1000
+
+
+def batch_topic(batch_id):
+    return f'batch-{batch_id}'
+
+
+def desired_topics(is_active, is_student, batch_id):
+    """
+    Topics a token should be subscribed to, given its owner.
+    """
+    if not is_active or not is_student:
+        return []
+    topics = [ALL_STUDENTS_TOPIC]
+    if batch_id:
+        topics.append(batch_topic(batch_id))
+    return topics
+
+
+def mark_tokens_for_resync(**filters):
+    """
+    Flag matching tokens so the next sync re-checks their subscriptions.
+    """
+    return FCMToken.objects.filter(**filters).update(topics_synced=False)
+
+
+def sync_topic_subscriptions(transport=None, limit=5000, after_pk=0, full=False):
+    """
+    Bring the topic subscriptions of out-of-sync tokens in line with their
+    owner's batch. Tokens are grouped per topic and (un)subscribed in calls of
+    up to 1000; results are written back with one bulk_update.
+    Only the diff against the recorded topics is sent, unless `full` is set,
+    in which case every token is re-subscribed to its topics and unsubscribed
+    from all others (repairs drift on the FCM side).
+    Returns a dict with processed/subscribed/unsubscribed/failed counts and
+    the last primary key seen, for paging through large tables.
+    """
+    from batches.models import Batch
+    from .services import get_transport
+
+    transport = transport or get_transport()
+    stats = {'processed': 0, 'subscribed': 0, 'unsubscribed': 0, 'failed': 0, 'last_pk': after_pk}
+    if not transport.is_ready():
+        return stats
+
+    tokens = list(
+        FCMToken.objects.filter(topics_synced=False, pk__gt=after_pk)
+        .select_related('user__student_profile')
+        .order_by('pk')[:limit]
+    )
+    if not tokens:
+        return stats
+    stats['processed'] = len(tokens)
+    stats['last_pk'] = tokens[-1].pk
+
+    known_topics = set()
+    if full:
+        known_topics = {ALL_STUDENTS_TOPIC} | {
+            batch_topic(batch_id) for batch_id in Batch.objects.values_list('id', flat=True)
+        }
+
+    subscribe = defaultdict(list)
+    unsubscribe = defaultdict(list)
+    targets = {}
+    for fcm_token in tokens:
+        profile = getattr(fcm_token.user, 'student_profile', None)
+        wanted = desired_topics(
+            fcm_token.is_active,
+            fcm_token.user.is_student,
+            profile.batch_id if profile else None,
+        )
+        current = set(fcm_token.topics or [])
+        targets[fcm_token.pk] = set(wanted)
+        to_subscribe = set(wanted) if full else set(wanted) - current
+        to_unsubscribe = (known_topics | current) - set(wanted)
+        for topic in to_subscribe:
+            subscribe[topic].append(fcm_token)
+        for topic in to_unsubscribe:
+            unsubscribe[topic].append(fcm_token)
+
+    # Whole calls that errored are retried on the next sync; tokens FCM rejected
+    # individually keep their recorded topics until they change again.
+    failed = set()
+    rejected = defaultdict(set)
+    for action, plan, call in (
+        ('subscribed', subscribe, transport.subscribe_to_topic),
+        ('unsubscribed', unsubscribe, transport.unsubscribe_from_topic),
+    ):
+        for topic, members in plan.items():
+            for i in range(0, len(members), TOPIC_BATCH_LIMIT):
+                chunk = members[i:i + TOPIC_BATCH_LIMIT]
+                try:
+                    response = call([t.token for t in chunk], topic)
+                except Exception as e:
+                    logger.error(f"Topic {action} call for {topic} failed: {e}")
+                    failed.update(t.pk for t in chunk)
+                    continue
+                stats[action] += response.success_count
+                for error in response.errors:
+                    rejected[chunk[error.index].pk].add(topic)
+
+    for fcm_token in tokens:
+        if fcm_token.pk in failed:
+            continue
+        current = set(fcm_token.topics or [])
+        wanted = targets[fcm_token.pk]
+        skipped = rejected.get(fcm_token.pk, set())
+        fcm_token.topics = sorted((wanted - skipped) | (current & skipped))
+        fcm_token.topics_synced = True
+    FCMToken.objects.bulk_update(tokens, ['topics', 'topics_synced'])
+
+    stats['failed'] = len(failed) + len(rejected)
+    logger.info(f"Topic sync: {stats}")
+    return stats
@@ -0,0 +1,101 @@
+import threading
+import time
+import uuid
+
+from firebase_admin import messaging
+
+
+class FirebaseTransport:
+    """
+    Delivers multicast messages through the Firebase Admin SDK.
+    """
+
+    def is_ready(self):
+        from .services import _initialize_firebase
+        return _initialize_firebase()
+
+    def send_multicast(self, message):
+        return messaging.send_each_for_multicast(message)
+
+    def send(self, message):
+        return messaging.send(message)
+
+    def subscribe_to_topic(self, tokens, topic):
+        return messaging.subscribe_to_topic(tokens, topic)
+
+    def unsubscribe_from_topic(self, tokens, topic):
+        return messaging.unsubscribe_from_topic(tokens, topic)
+
+
+class FakeFCMError(Exception):
+    """
+    Mimics the error Firebase reports for an unregistered token.
+    """
+    code = 'messaging/registration-token-not-registered'
+
+
+class FakeTransport:
+    """
+    Local stand-in for FCM. Never touches the network.
+    Each call sleeps `latency` seconds to simulate the round-trip, and any token
+    in `invalid_tokens` is reported as unregistered. Topic subscriptions are
+    kept in `topics` (topic -> set of tokens). Useful for tests and for
+    benchmarking fan-out throughput (see `manage.py benchmark_fanout`).
+    """
+
+    def __init__(self, latency=0.0, invalid_tokens=()):
+        self.latency = latency
+        self.invalid_tokens = set(invalid_tokens)
+        self.calls = 0
+        self.messages = []
+        self.topic_calls = []
+        self.topics = {}
+        self._lock = threading.Lock()
+
+    def is_ready(self):
+        return True
+
+    def send_multicast(self, message):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            self.messages.append(message)
+
+        responses = []
+        for token in message.tokens:
+            if token in self.invalid_tokens:
+                responses.append(messaging.SendResponse(None, FakeFCMError(token)))
+            else:
+                responses.append(messaging.SendResponse({'name': f'fake/{uuid.uuid4().hex}'}, None))
+        return messaging.BatchResponse(responses)
+
+    def send(self, message):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            self.messages.append(message)
+        return f'fake/{uuid.uuid4().hex}'
+
+    def _manage_topic(self, action, tokens, topic):
+        with self._lock:
+            self.topic_calls.append((action, topic, list(tokens)))
+            subscribers = self.topics.setdefault(topic, set())
+            results = []
+            for token in tokens:
+                if token in self.invalid_tokens:
+                    results.append({'error': 'NOT_FOUND'})
+                    continue
+                if action == 'subscribe':
+                    subscribers.add(token)
+                else:
+                    subscribers.discard(token)
+                results.append({})
+        return messaging.TopicManagementResponse({'results': results})
+
+    def subscribe_to_topic(self, tokens, topic):
+        return self._manage_topic('subscribe', tokens, topic)
+
+    def unsubscribe_from_topic(self, tokens, topic):
+        return self._manage_topic('unsubscribe', tokens, topic)
@@ -1,7 +1,9 @@
 from django.http import JsonResponse
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from .models import FCMToken
+from .heartbeats import record_token_heartbeat
 import json
 
 @login_required
@@ -23,18 +25,48 @@ def save_fcm_token(request):
                 return JsonResponse({'status': 'error', 'message': 'Token missing'}, status=400)
 
             from django.utils import timezone
-            
-            # Using update_or_create on the token string as it is unique
+            from datetime import timedelta
+
+            now = timezone.now()
+            token_hash = FCMToken.hash_token(token)
+            existing = FCMToken.objects.filter(token_hash=token_hash).only(
+                'user_id', 'device_id', 'device_type', 'browser', 'is_active', 'last_used_at'
+            ).first()
+
+            # Heartbeat for an unchanged, recently used token: skip the write and
+            # let flush_token_heartbeats bump last_used_at in bulk later (needs REDIS_URL).
+            if (
+                existing
+                and existing.user_id == request.user.id
+                and existing.is_active
+                and (existing.device_id, existing.device_type, existing.browser) == (device_id, device_type, browser)
+                and existing.last_used_at
+                and now - existing.last_used_at < timedelta(seconds=settings.NOTIFICATION_TOKEN_WRITE_INTERVAL_SECONDS)
+            ):
+                record_token_heartbeat(existing.pk, now)
+                return JsonResponse({
+                    'status': 'success',
+                    'message': 'Token already registered',
+                    'created': False
+                })
+
+            defaults = {
+                'token': token,
+                'user': request.user,
+                'device_id': device_id,
+                'device_type': device_type,
+                'browser': browser,
+                'is_active': True,
+                'last_used_at': now
+            }
+            # New, reactivated or re-owned tokens need their topic subscriptions synced
+            if not existing or existing.user_id != request.user.id or not existing.is_active:
+                defaults['topics_synced'] = False
+
+            # Using update_or_create on the token digest as it is unique
             fcm_token, created = FCMToken.objects.update_or_create(
-                token=token,
-                defaults={
-                    'user': request.user,
-                    'device_id': device_id,
-                    'device_type': device_type,
-                    'browser': browser,
-                    'is_active': True,
-                    'last_used_at': timezone.now()
-                }
+                token_hash=token_hash,
+                defaults=defaults
             )
 
             return JsonResponse({
@@ -0,0 +1,127 @@
+/**
+ * Offline attendance queue (IndexedDB), shared by the mark attendance page
+ * and the service worker.
+ * - Submissions carry a client-generated key, so replays are harmless
+ * - flush() sends the whole queue to /attendance/sync/ in a few JSON requests
+ * - Entries are dropped once the server has answered for their key, or has
+ *   rejected their request outright (4xx); network failures, expired
+ *   sessions and 5xx keep them queued
+ */
+
+(function (scope) {
+  const DB_NAME = 'academy-offline';
+  const STORE = 'attendance-submissions';
+  const SYNC_TAG = 'attendance-sync';
+  const SYNC_URL = '/attendance/sync/';
+  const MAX_PER_REQUEST = 50;  // settings.ATTENDANCE_SYNC_MAX_SUBMISSIONS
+
+  function openDb() {
+    return new Promise((resolve, reject) => {
+      const request = indexedDB.open(DB_NAME, 1);
+      request.onupgradeneeded = () => request.result.createObjectStore(STORE, { keyPath: 'key' });
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    });
+  }
+
+  function withStore(mode, fn) {
+    return openDb().then(db => new Promise((resolve, reject) => {
+      const tx = db.transaction(STORE, mode);
+      const result = fn(tx.objectStore(STORE));
+      tx.oncomplete = () => { db.close(); resolve(result && result.result !== undefined ? result.result : result); };
+      tx.onerror = () => { db.close(); reject(tx.error); };
+    }));
+  }
+
+  function newKey() {
+    if (scope.crypto && scope.crypto.randomUUID) return scope.crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+  }
+
+  function add(submission) {
+    return withStore('readwrite', store => store.put(submission));
+  }
+
+  function all() {
+    return withStore('readonly', store => store.getAll());
+  }
+
+  function remove(keys) {
+    return withStore('readwrite', store => keys.forEach(key => store.delete(key)));
+  }
+
+  // The server answered but did not accept the request (status 0: login redirect)
+  class SyncError extends Error {
+    constructor(status, message) {
+      super(message);
+      this.status = status;
+    }
+
+    get rejected() {
+      return this.status >= 400 && this.status < 500;
+    }
+  }
+
+  function errorFor(response) {
+    if (response.type === 'opaqueredirect') {
+      return Promise.resolve(new SyncError(0, 'Your session has expired. Sign in again and resubmit.'));
+    }
+    return response.json()
+      .then(data => data.message, () => null)
+      .then(message => new SyncError(
+        response.status,
+        message || (response.status === 403
+          ? 'You are not allowed to mark attendance, or the page has expired. Reload it and try again.'
+          : 'The server could not save the attendance (error ' + response.status + ').')
+      ));
+  }
+
+  // Rejects with a SyncError when the server answers with an error, and with
+  // fetch's own TypeError only when the network is unreachable
+  function send(submissions, csrfToken) {
+    return fetch(SYNC_URL, {
+      method: 'POST',
+      credentials: 'same-origin',
+      redirect: 'manual',
+      headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken },
+      body: JSON.stringify({
+        submissions: submissions.map(({ key, batch, date, statuses }) => ({ key, batch, date, statuses }))
+      })
+    }).then(response => {
+      if (!response.ok) return errorFor(response).then(error => { throw error; });
+      return response.json();
+    });
+  }
+
+  // Replay everything queued; resolves with {key: result} for what was sent
+  function flush() {
+    return all().then(async queued => {
+      const answered = {};
+      for (let i = 0; i < queued.length; i += MAX_PER_REQUEST) {
+        const chunk = queued.slice(i, i + MAX_PER_REQUEST);
+        let results;
+        try {
+          results = (await send(chunk, chunk[chunk.length - 1].csrfToken)).results;
+        } catch (error) {
+          // A rejected request will never succeed on replay; report and drop it
+          if (!(error instanceof SyncError && error.rejected)) throw error;
+          results = Object.fromEntries(chunk.map(({ key }) => [key, error.message]));
+        }
+        Object.assign(answered, results);
+        await remove(Object.keys(results));
+      }
+      return answered;
+    });
+  }
+
+  // Ask for a Background Sync replay; without support, replay when back online
+  function requestSync() {
+    if (!('serviceWorker' in navigator)) return Promise.resolve();
+    return navigator.serviceWorker.ready.then(reg => {
+      if (reg.sync) return reg.sync.register(SYNC_TAG);
+      scope.addEventListener('online', () => flush().catch(() => {}), { once: true });
+    });
+  }
+
+  scope.AttendanceQueue = { SYNC_TAG, SyncError, newKey, add, all, flush, send, requestSync };
+})(self);
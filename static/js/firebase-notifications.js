@@ -7,10 +7,56 @@ const getMessaging = () => {
     return window.fcm_messaging || null;
 };
 
+// Re-register an unchanged token with the server at most this often
+const TOKEN_HEARTBEAT_MS = 24 * 60 * 60 * 1000;
+const REGISTRATION_KEY = 'fcm_registration';
+
+/**
+ * True if this token (for this login session) was not sent to the server
+ * recently. window.fcmSession changes on every login, so a token deactivated
+ * at logout is always re-registered.
+ */
+function needsRegistration(token) {
+    try {
+        const saved = JSON.parse(localStorage.getItem(REGISTRATION_KEY) || 'null');
+        return !saved
+            || saved.token !== token
+            || saved.session !== (window.fcmSession || '')
+            || Date.now() - saved.at > TOKEN_HEARTBEAT_MS;
+    } catch (err) {
+        return true;
+    }
+}
+
+function rememberRegistration(token) {
+    try {
+        localStorage.setItem(REGISTRATION_KEY, JSON.stringify({
+            token: token,
+            session: window.fcmSession || '',
+            at: Date.now()
+        }));
+    } catch (err) {
+        // Storage unavailable (private mode); we'll simply register again next time
+    }
+}
+
+// sw-ready, the load fallback and the student init can all fire on one page;
+// share a single in-flight setup between them.
+let pushSetupInFlight = null;
+
+function setupPushNotifications() {
+    if (!pushSetupInFlight) {
+        pushSetupInFlight = registerPushNotifications().finally(() => {
+            pushSetupInFlight = null;
+        });
+    }
+    return pushSetupInFlight;
+}
+
 /**
  * Handle FCM Token Retrieval and Server Sync
  */
-async function setupPushNotifications() {
+async function registerPushNotifications() {
     try {
         const messaging = getMessaging();
         if (!messaging) {
@@ -46,7 +92,11 @@ async function setupPushNotifications() {
 
             if (token) {
                 console.log('FCM Token:', token);
-                await sendTokenToServer(token);
+                if (needsRegistration(token)) {
+                    await sendTokenToServer(token);
+                } else {
+                    console.log('Token already registered recently, skipping server sync.');
+                }
             } else {
                 console.warn('No registration token available. Request permission to generate one.');
             }
@@ -86,6 +136,9 @@ async function sendTokenToServer(token) {
         });
         const data = await response.json();
         console.log('Server response:', data);
+        if (response.ok && data.status === 'success') {
+            rememberRegistration(token);
+        }
     } catch (err) {
         console.error('Failed to send token to server:', err);
     }
@@ -1,6 +1,45 @@
+from datetime import timedelta
 from django.db import models
+from django.db.models import BooleanField, Case, CharField, F, Max, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, Greatest
 from django.conf import settings
 from django.utils import timezone
+from core.expressions import DaysBetween
+
+class StudentProfileQuerySet(models.QuerySet):
+    def with_fee_status(self, today=None):
+        """
+        Annotate each profile with its fee position, computed in SQL:
+        last_payment_date, due_date (FEE_CYCLE_DAYS after joining or the last
+        payment, whichever is later), days_overdue (0 when not due), is_due and
+        a display status. Filter with .filter(is_due=True) for overdue students.
+        """
+        from fees.models import FEE_CYCLE_DAYS
+
+        today = today or timezone.now().date()
+        cutoff = today - timedelta(days=FEE_CYCLE_DAYS)
+        # A join + MAX keeps the SQL small; every annotation below reuses it
+        # instead of repeating a correlated subquery.
+        return self.annotate(
+            last_payment_date=Max('user__feepayment__date')
+        ).annotate(
+            cycle_start=Greatest('date_of_join', Coalesce('last_payment_date', 'date_of_join'))
+        ).annotate(
+            due_date=Cast(F('cycle_start') + timedelta(days=FEE_CYCLE_DAYS), models.DateField()),
+            is_due=Case(When(cycle_start__lt=cutoff, then=Value(True)), default=Value(False), output_field=BooleanField()),
+            days_overdue=Case(When(cycle_start__lt=cutoff, then=DaysBetween('cycle_start', Value(cutoff))), default=Value(0)),
+            status=Case(
+                When(cycle_start__gte=cutoff, last_payment_date__isnull=True, then=Value('New Student')),
+                When(cycle_start__gte=cutoff, then=Value('Paid')),
+                When(last_payment_date__isnull=True, then=Value('Overdue (Never Paid)')),
+                default=Concat(
+                    Value('Overdue ('),
+                    Cast(DaysBetween('last_payment_date', Value(today)), CharField()),
+                    Value(' days)')
+                ),
+                output_field=CharField()
+            ),
+        )
 
 class StudentProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='student_profile')
@@ -15,5 +54,14 @@ class StudentProfile(models.Model):
     )
     fee_status = models.CharField(max_length=10, choices=FEE_STATUS_CHOICES, default='Pending')
 
+    objects = StudentProfileQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored batch so signals can detect batch moves
+        instance._loaded_batch_id = instance.__dict__.get('batch_id')
+        return instance
+
     def __str__(self):
         return f"{self.user.username} - {self.batch.name if self.batch else 'No Batch'}"
@@ -1,3 +1,73 @@
-from django.test import TestCase
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from core.models import User
+from fees.models import FeePayment
+from .models import StudentProfile
+
+TODAY = date(2026, 6, 15)
+
+
+@override_settings(NOTIFICATION_OUTBOX_EAGER=False)
+class WithFeeStatusTests(TestCase):
+    def _student(self, username, joined_days_ago, paid_days_ago=None):
+        user = User.objects.create(username=username, is_student=True)
+        StudentProfile.objects.create(user=user, date_of_join=TODAY - timedelta(days=joined_days_ago))
+        if paid_days_ago is not None:
+            FeePayment.objects.create(student=user, amount=500, date=TODAY - timedelta(days=paid_days_ago))
+        return user
+
+    def _fee_status(self, user):
+        return StudentProfile.objects.with_fee_status(TODAY).values(
+            'last_payment_date', 'due_date', 'is_due', 'days_overdue', 'status'
+        ).get(user=user)
+
+    def test_never_paid(self):
+        self.assertEqual(self._fee_status(self._student('late', 100)), {
+            'last_payment_date': None,
+            'due_date': TODAY - timedelta(days=70),
+            'is_due': True,
+            'days_overdue': 70,
+            'status': 'Overdue (Never Paid)',
+        })
+        self.assertEqual(self._fee_status(self._student('new', 10))['status'], 'New Student')
+
+    def test_paid_within_the_cycle(self):
+        self.assertEqual(self._fee_status(self._student('paid', 100, paid_days_ago=10)), {
+            'last_payment_date': TODAY - timedelta(days=10),
+            'due_date': TODAY + timedelta(days=20),
+            'is_due': False,
+            'days_overdue': 0,
+            'status': 'Paid',
+        })
+
+    def test_overdue_since_the_last_payment(self):
+        user = self._student('overdue', 100, paid_days_ago=60)
+        FeePayment.objects.create(student=user, amount=500, date=TODAY - timedelta(days=45))
+        self.assertEqual(self._fee_status(user), {
+            'last_payment_date': TODAY - timedelta(days=45),
+            'due_date': TODAY - timedelta(days=15),
+            'is_due': True,
+            'days_overdue': 15,
+            'status': 'Overdue (45 days)',
+        })
+
+    def test_joined_after_the_last_payment(self):
+        # Re-enrolled: the cycle starts from the join date, not the old payment
+        self.assertEqual(self._fee_status(self._student('rejoined', 10, paid_days_ago=50)), {
+            'last_payment_date': TODAY - timedelta(days=50),
+            'due_date': TODAY + timedelta(days=20),
+            'is_due': False,
+            'days_overdue': 0,
+            'status': 'Paid',
+        })
+        self.assertTrue(self._fee_status(self._student('lapsed', 40, paid_days_ago=50))['is_due'])
+
+    def test_filter_on_is_due(self):
+        self._student('late', 100)
+        self._student('paid', 100, paid_days_ago=10)
+        self.assertEqual(
+            list(StudentProfile.objects.with_fee_status(TODAY).filter(is_due=True).values_list('user__username', flat=True)),
+            ['late']
+        )
@@ -2,6 +2,7 @@
    UNIFIED SERVICE WORKER
    - Caching (Static Assets)
    - Firebase Cloud Messaging (Background Notifications)
+   - Offline attendance queue (Background Sync)
 ------------------------------------------------------------------ */
 
 // 1. FIREBASE SETUP
@@ -65,9 +66,10 @@ self.addEventListener('push', (event) => {
 });
 
 // 2. CACHING LOGIC
-const CACHE_NAME = 'shoeb-academy-v5'; // Busting cache
+const CACHE_NAME = 'shoeb-academy-v6'; // Busting cache
 const STATIC_ASSETS = [
     '/static/css/style.css',
+    '/static/js/attendance-queue.js',
     '/static/images/shoeb_sir_academy_logo.jpg',
     '/static/images/icon-192x192.png',
     '/static/images/icon-512x512.png'
@@ -112,7 +114,32 @@ self.addEventListener('fetch', event => {
     }
 });
 
-// 3. NOTIFICATION CLICK
+// 3. OFFLINE ATTENDANCE SYNC
+// Submissions the mark attendance page couldn't send are queued in IndexedDB
+// and replayed here, in one batched request, once the browser is back online.
+importScripts('/static/js/attendance-queue.js');
+
+self.addEventListener('sync', (event) => {
+    if (event.tag !== AttendanceQueue.SYNC_TAG) return;
+    event.waitUntil(
+        AttendanceQueue.flush().then((results) => {
+            const values = Object.values(results);
+            const applied = values.filter(result => result === 'applied').length;
+            const failed = values.filter(result => result !== 'applied' && result !== 'duplicate').length;
+            if (!applied && !failed) return;
+            return self.registration.showNotification(failed ? 'Attendance not saved' : 'Attendance synced', {
+                body: failed
+                    ? `${failed} saved attendance submission(s) were rejected. Open the page and mark them again.`
+                    : `${applied} saved attendance submission(s) uploaded.`,
+                icon: '/static/images/icon-192x192.png',
+                tag: 'attendance-sync',
+                data: { url: '/attendance/' }
+            });
+        })
+    );
+});
+
+// 4. NOTIFICATION CLICK
 self.addEventListener('notificationclick', (event) => {
     event.notification.close();
     